@@ -12,6 +12,8 @@ import mysql.connector
 from fastapi import Depends
 from datetime import date
 from fastapi.middleware.cors import CORSMiddleware
+from comun.metricas import instalar_metricas
+from comun.trazas import instalar_trazas
 from patentes_vehiculares_chile import validar_patente, detectar_tipo_patente, limpiar_patente
 
 #########################################################
@@ -47,6 +49,11 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base de datos declarativa
 Base = declarative_base()
 
+# Métricas de rendimiento en GET /metrics (latencia por ruta, consultas SQL y pool de conexiones)
+instalar_metricas(app, {"principal": engine})
+# Trazas distribuidas (continúa la traza del backend con un span por solicitud y por consulta SQL)
+instalar_trazas(app, "aach", [engine])
+
 #########################################################
 # Modelo de Base de Datos (ORM)
 #########################################################
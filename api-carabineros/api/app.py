@@ -14,6 +14,8 @@ from dotenv import load_dotenv
 import pymysql
 import mysql.connector
 from fastapi.middleware.cors import CORSMiddleware
+from comun.metricas import instalar_metricas
+from comun.trazas import instalar_trazas
 from patentes_vehiculares_chile import validar_patente
 from datetime import datetime
 
@@ -51,6 +53,11 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base de datos declarativa
 Base = declarative_base()
 
+# Métricas de rendimiento en GET /metrics (latencia por ruta, consultas SQL y pool de conexiones)
+instalar_metricas(app, {"principal": engine})
+# Trazas distribuidas (continúa la traza del backend con un span por solicitud y por consulta SQL)
+instalar_trazas(app, "carabineros", [engine])
+
 ####################################################
 # Modelo de datos para la tabla encargos de patente
 ####################################################
@@ -5,6 +5,8 @@ from xmlrpc.client import Boolean
 from requests import Session
 from fastapi import FastAPI, HTTPException, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from comun.metricas import instalar_metricas
+from comun.trazas import instalar_trazas
 from pydantic import BaseModel
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean as SQLBoolean  # ✅ Agregado DateTime y Boolean
 from sqlalchemy.ext.declarative import declarative_base
@@ -111,6 +113,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas de rendimiento en GET /metrics (latencia por ruta, consultas SQL y pool de conexiones)
+instalar_metricas(app, {"principal": engine})
+# Trazas distribuidas (continúa la traza del backend con un span por solicitud y por consulta SQL)
+instalar_trazas(app, "mtt", [engine])
+
 # Configuramos la sesión de la base de datos
 def get_db():
     db = SessionLocal()
@@ -1,5 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from comun.metricas import instalar_metricas
+from comun.trazas import instalar_trazas
 from pydantic import BaseModel
 from typing import List, Optional
 from sqlalchemy import create_engine, Column, Integer, String, Date, Enum
@@ -67,6 +69,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas de rendimiento en GET /metrics (latencia por ruta, consultas SQL y pool de conexiones)
+instalar_metricas(app, {"principal": engine})
+# Trazas distribuidas (continúa la traza del backend con un span por solicitud y por consulta SQL)
+instalar_trazas(app, "prt", [engine])
+
 # Endpoint de saludo
 @app.get("/")
 def read_root():
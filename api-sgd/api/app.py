@@ -2,7 +2,7 @@
 from fastapi import FastAPI, HTTPException, Depends
 from pydantic import BaseModel, validator
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Time, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Time, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 import os
@@ -11,26 +11,23 @@ import pymysql
 import mysql.connector
 from patentes_vehiculares_chile import validar_patente
 from fastapi.middleware.cors import CORSMiddleware
+from comun.metricas import instalar_metricas
+from comun.trazas import instalar_trazas
 from rut_chile import rut_chile
+from fastapi.concurrency import run_in_threadpool
 import re
 
 # Librerías para manejo de seguridad y autenticación
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-import secrets
-from sqlalchemy import and_, text
+from comun.tokens import create_access_token
+from comun.autenticacion import verificador_contrasenas, normalizar_rut, AutenticacionSaturadaError
 
 #########################################################
 # Configuración de seguridad
 #########################################################
 
-SECRET_KEY = secrets.token_urlsafe(32)
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 #########################################################
 # Funciones de validación personalizadas
 #########################################################
@@ -48,28 +45,6 @@ def validar_contrasena(contrasena: str) -> bool:
     
     return True
 
-# Función para encriptar contraseñas
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-# Función para verificar el token JWT
-def verify_token(token: str, credentials_exception):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        rut: str = payload.get("sub")
-        if rut is None:
-            raise credentials_exception
-        return rut
-    except JWTError:
-        raise credentials_exception
-
 ##############################
 # Instancia de FastAPI
 ##############################
@@ -104,6 +79,11 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base de datos declarativa
 Base = declarative_base()
 
+# Métricas de rendimiento en GET /metrics (latencia por ruta, consultas SQL y pool de conexiones)
+instalar_metricas(app, {"principal": engine})
+# Trazas distribuidas (continúa la traza del backend con un span por solicitud y por consulta SQL)
+instalar_trazas(app, "sgd", [engine])
+
 #####################################################################
 # Modelo de datos para la tabla SGD (Secretaría de Gobierno Digital)
 #####################################################################
@@ -117,6 +97,9 @@ class SGDModel(Base):
     nombre = Column(String(100), nullable=False)
     email = Column(String(100), nullable=False, unique=True)
 
+    # Índice para buscar al usuario por RUT al validar la clave única
+    __table_args__ = (Index("idx_sgd_rut", "rut"),)
+
 #######################################
 # Función para crear las tablas
 #######################################
@@ -125,6 +108,9 @@ def create_tables():
     """Create database tables if they don't exist"""
     try:
         Base.metadata.create_all(bind=engine)
+        # create_all no agrega índices a tablas que ya existían
+        for indice in SGDModel.__table__.indexes:
+            indice.create(bind=engine, checkfirst=True)
         print("Database tables created successfully")
     except Exception as e:
         print(f"Error creating tables: {e}")
@@ -201,9 +187,20 @@ class TokenModel(BaseModel):
 def read_root():
    return {"message": "API de la secretaría de gobierno digital"}
 
+def _buscar_usuario(rut: str) -> Optional[SGDModel]:
+    """Busca al usuario por RUT normalizado (columna indexada)"""
+    with SessionLocal() as db:
+        return db.query(SGDModel).filter(SGDModel.rut == rut).first()
+
+def _actualizar_contrasena(id: int, contrasena_hash: str):
+    """Guarda el hash nuevo de la contraseña (migración desde texto plano o cambio de costo)"""
+    with SessionLocal() as db:
+        db.query(SGDModel).filter(SGDModel.id == id).update({SGDModel.contrasena: contrasena_hash})
+        db.commit()
+
 # POST para consultar validez de clave única
 @app.post("/validar_clave_unica", response_model=TokenModel)
-def validar_clave_unica(credentials: CredencialesLogin, db: Session = Depends(get_db)):
+async def validar_clave_unica(credentials: CredencialesLogin):
     """Valida la clave única de un usuario"""
     
     try:
@@ -219,23 +216,32 @@ def validar_clave_unica(credentials: CredencialesLogin, db: Session = Depends(ge
         if not validar_contrasena(credentials.contrasena):
             raise HTTPException(status_code=400, detail="Contraseña inválida")
         
-        # Buscar usuario en la base de datos
+        # Buscar usuario en la base de datos (solo por RUT, la contraseña se verifica aparte)
         try:
-            user = db.query(SGDModel).filter(
-                and_(
-                    text("BINARY rut = :rut"),
-                    text("BINARY contrasena = :contrasena")
-                ).params(
-                    {"rut": credentials.rut, "contrasena": credentials.contrasena}
-                )
-            ).first()
+            user = await run_in_threadpool(_buscar_usuario, normalizar_rut(credentials.rut))
         except Exception as db_error:
             print(f"Error de base de datos: {db_error}")
             raise HTTPException(status_code=500, detail="Error interno del servidor")
         
-        if not user:
+        # Verificar la contraseña (bcrypt en el pool de autenticación, texto plano heredado se migra).
+        # Si el RUT no existe se verifica contra un hash ficticio para no revelarlo por el tiempo de respuesta
+        try:
+            if not user:
+                await verificador_contrasenas.verificar_inexistente(credentials.contrasena)
+                raise HTTPException(status_code=404, detail="Usuario no encontrado o contraseña incorrecta")
+            valida, nuevo_hash = await verificador_contrasenas.verificar(credentials.contrasena, user.contrasena)
+        except AutenticacionSaturadaError:
+            raise HTTPException(status_code=503, detail="Demasiadas validaciones simultáneas, intente nuevamente", headers={"Retry-After": "1"})
+        if not valida:
             raise HTTPException(status_code=404, detail="Usuario no encontrado o contraseña incorrecta")
 
+        if nuevo_hash:
+            try:
+                await run_in_threadpool(_actualizar_contrasena, user.id, nuevo_hash)
+            except Exception as db_error:
+                # La validación es correcta aunque no se pueda migrar la contraseña
+                print(f"Error actualizando contraseña: {db_error}")
+
         # Generar token JWT
         try:
             access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
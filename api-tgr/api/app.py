@@ -7,7 +7,7 @@ import random
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Time, Boolean, and_, text
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Time, Boolean, Index, and_, text, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
 import os
@@ -17,6 +17,8 @@ import mysql.connector
 from fastapi import Depends
 from datetime import date
 from fastapi.middleware.cors import CORSMiddleware
+from comun.metricas import instalar_metricas
+from comun.trazas import instalar_trazas
 import re
 
 # Librerías para validar formatos
@@ -35,43 +37,17 @@ from patentes_vehiculares_chile import (
 from rut_chile import rut_chile
 
 # Librerías para manejo de seguridad y autenticación
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-import secrets
+from comun.tokens import create_access_token
+from fastapi.concurrency import run_in_threadpool
+from comun.autenticacion import verificador_contrasenas, normalizar_rut, AutenticacionSaturadaError
 
 #########################################################
 # Configuración de seguridad
 #########################################################
 
-SECRET_KEY = secrets.token_urlsafe(32)
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Función para encriptar contraseñas
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-# Función para verificar el token JWT
-def verify_token(token: str, credentials_exception):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        rut: str = payload.get("sub")
-        if rut is None:
-            raise credentials_exception
-        return rut
-    except JWTError:
-        raise credentials_exception
-
 #########################################################
 # Instancia de FastAPI
 #########################################################
@@ -105,6 +81,11 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base de datos declarativa
 Base = declarative_base()
 
+# Métricas de rendimiento en GET /metrics (latencia por ruta, consultas SQL y pool de conexiones)
+instalar_metricas(app, {"principal": engine})
+# Trazas distribuidas (continúa la traza del backend con un span por solicitud y por consulta SQL)
+instalar_trazas(app, "tgr", [engine])
+
 #########################################################
 # Modelo de Base de Datos (ORM)
 #########################################################
@@ -136,6 +117,9 @@ class PermisoCirculacion(Base):
     equipamiento = Column(String(100), nullable=False)
     codigo_sii = Column(String(20), nullable=False)
     tasacion = Column(Integer, nullable=False)
+
+    # Índice para obtener el último permiso de cada PPU
+    __table_args__ = (Index("idx_permiso_ppu_fecha", "ppu", "fecha_emision"),)
     
 class Credenciales(Base):
     __tablename__ = 'credenciales'
@@ -146,6 +130,9 @@ class Credenciales(Base):
     contrasena = Column(String(100), nullable=False)
     rol = Column(String(20), nullable=False)  # Puede ser 'usuario' o 'administrador'
 
+    # Índice para buscar al fiscalizador por RUT al iniciar sesión
+    __table_args__ = (Index("idx_credenciales_rut", "rut"),)
+
 class Tarjetas(Base):
     __tablename__ = 'tarjetas'
     
@@ -160,6 +147,9 @@ class Tarjetas(Base):
     cvv = Column(Integer, nullable=False)
     saldo = Column(Integer, nullable=False)
 
+    # Índice para buscar las tarjetas de un RUT al iniciar sesión
+    __table_args__ = (Index("idx_tarjetas_rut", "rut"),)
+
 class UpdateFechaRequest(BaseModel):
     id: int
     fecha_expiracion: date  # Nueva fecha de expiración en formato ISO 8601
@@ -168,6 +158,10 @@ class UpdateFechaRequest(BaseModel):
 # Crear las tablas en la base de datos
 #########################################################
 Base.metadata.create_all(bind=engine)
+# create_all no agrega índices a tablas que ya existían
+for tabla in Base.metadata.sorted_tables:
+    for indice in tabla.indexes:
+        indice.create(bind=engine, checkfirst=True)
 
 #########################################################
 # Crear una sesión de base de datos
@@ -235,6 +229,17 @@ class PermisoCirculacionUploadModel(BaseModel):
     codigo_sii: str
     tasacion: int
 
+# Cantidad máxima de PPUs por consulta masiva
+MAX_PPUS_CONSULTA = int(os.getenv("MAX_PPUS_CONSULTA", "5000"))
+
+class ConsultaPermisosRequest(BaseModel):
+    ppus: List[str]
+
+class ConsultaPermisosResponse(BaseModel):
+    permisos: List[PermisoCirculacionModel]
+    no_encontrados: List[str]
+    invalidos: List[str]
+
 class CredencialesModel(BaseModel):
     id: int
     rut: str
@@ -326,6 +331,45 @@ def get_permiso_circulacion(ppu: str, db: Session = Depends(get_db)):
         tasacion=permiso.tasacion
     )
 
+# POST - Endpoint para consultar el último Permiso de Circulación de varias PPU en una sola consulta
+@app.post("/consultar_permisos", response_model=ConsultaPermisosResponse)
+def get_permisos_circulacion(consulta: ConsultaPermisosRequest, db: Session = Depends(get_db)):
+    if len(consulta.ppus) > MAX_PPUS_CONSULTA:
+        raise HTTPException(status_code=400, detail=f"Se permiten como máximo {MAX_PPUS_CONSULTA} PPU por consulta")
+    # Separar PPU válidas e inválidas (sin repetir)
+    ppus = []
+    invalidos = []
+    for ppu in dict.fromkeys(consulta.ppus):
+        if validar_patente(ppu):
+            ppus.append(ppu)
+        else:
+            invalidos.append(ppu)
+    if not ppus:
+        return ConsultaPermisosResponse(permisos=[], no_encontrados=[], invalidos=invalidos)
+    # Numerar los permisos de cada PPU desde el más reciente y quedarse con el primero
+    orden = func.row_number().over(
+        partition_by=PermisoCirculacion.ppu,
+        order_by=(PermisoCirculacion.fecha_emision.desc(), PermisoCirculacion.id.desc())
+    ).label("orden")
+    ultimos = (
+        db.query(PermisoCirculacion.id.label("id"), orden)
+        .filter(PermisoCirculacion.ppu.in_(ppus))
+        .subquery()
+    )
+    permisos = (
+        db.query(PermisoCirculacion)
+        .join(ultimos, PermisoCirculacion.id == ultimos.c.id)
+        .filter(ultimos.c.orden == 1)
+        .all()
+    )
+    columnas = PermisoCirculacionModel.model_fields.keys()
+    encontrados = {permiso.ppu.upper() for permiso in permisos}
+    return ConsultaPermisosResponse(
+        permisos=[PermisoCirculacionModel(**{c: getattr(permiso, c) for c in columnas}) for permiso in permisos],
+        no_encontrados=[ppu for ppu in ppus if ppu.upper() not in encontrados],
+        invalidos=invalidos
+    )
+
 # GET - Endpoint para consultar el Permiso de Circulación a través del ID
 @app.get("/consultar_permiso_id/{id}", response_model=PermisoCirculacionModel)
 def get_permiso_circulacion_id(id: int, db: Session = Depends(get_db)):
@@ -393,9 +437,46 @@ def cargar_permiso_circulacion(permiso: PermisoCirculacionUploadModel, db: Sessi
         tasacion=nuevo_permiso.tasacion
     )
 
+def _buscar_credenciales(rut: str) -> Optional[Credenciales]:
+    """Busca al fiscalizador por RUT normalizado (columna indexada)"""
+    with SessionLocal() as db:
+        return db.query(Credenciales).filter(Credenciales.rut == rut).first()
+
+def _buscar_tarjetas(rut: str) -> List[Tarjetas]:
+    """Tarjetas registradas a nombre del RUT normalizado (columna indexada)"""
+    with SessionLocal() as db:
+        return db.query(Tarjetas).filter(Tarjetas.rut == rut).all()
+
+def _actualizar_hash(columna, id: int, nuevo_hash: str):
+    """Guarda el hash nuevo de una contraseña (migración desde texto plano o cambio de costo)"""
+    with SessionLocal() as db:
+        db.query(columna.class_).filter(columna.class_.id == id).update({columna: nuevo_hash})
+        db.commit()
+
+async def _verificar(contrasena: str, almacenada: str, columna, id: int) -> bool:
+    """Verifica la contraseña en el pool de autenticación y migra el hash si corresponde"""
+    try:
+        valida, nuevo_hash = await verificador_contrasenas.verificar(contrasena, almacenada)
+    except AutenticacionSaturadaError:
+        raise HTTPException(status_code=503, detail="Demasiados inicios de sesión simultáneos, intente nuevamente", headers={"Retry-After": "1"})
+    if nuevo_hash:
+        try:
+            await run_in_threadpool(_actualizar_hash, columna, id, nuevo_hash)
+        except Exception as e:
+            # El inicio de sesión es válido aunque no se pueda migrar la contraseña
+            print(f"Error actualizando contraseña: {e}")
+    return valida
+
+async def _verificar_inexistente(contrasena: str) -> bool:
+    """Verificación contra un hash ficticio cuando el RUT no existe (mismo tiempo de respuesta que un RUT registrado)"""
+    try:
+        return await verificador_contrasenas.verificar_inexistente(contrasena)
+    except AutenticacionSaturadaError:
+        raise HTTPException(status_code=503, detail="Demasiados inicios de sesión simultáneos, intente nuevamente", headers={"Retry-After": "1"})
+
 # POST - Endpoint para validar las credenciales de fiscalizador
 @app.post("/validar_credenciales/", response_model=TokenModel)
-def validar_credenciales(credenciales: LoginModel, db: Session = Depends(get_db)):
+async def validar_credenciales(credenciales: LoginModel):
     # Verificar que el RUT y la contraseña no estén vacíos
     if not credenciales.rut or not credenciales.contrasena:
         raise HTTPException(status_code=400, detail="RUT y contraseña son obligatorios")
@@ -408,17 +489,12 @@ def validar_credenciales(credenciales: LoginModel, db: Session = Depends(get_db)
     # Verificar que el RUT tenga un formato válido
     if not rut_chile.is_valid_rut(credenciales.rut) or "-" not in credenciales.rut:
         raise HTTPException(status_code=400, detail="RUT inválido")
-    # Verificar las credenciales en la base de datos
-    usuario = db.query(Credenciales).filter(
-        and_(
-            text("BINARY rut = :rut"),
-            text("BINARY contrasena = :contrasena")
-        ).params(
-            {"rut": credenciales.rut, "contrasena": credenciales.contrasena}
-        )
-    ).first()
+    # Buscar al fiscalizador solo por RUT y verificar la contraseña fuera de la base de datos
+    usuario = await run_in_threadpool(_buscar_credenciales, normalizar_rut(credenciales.rut))
     # Si las credenciales son incorrectas, lanzar una excepción HTTP 401
     if not usuario:
+        await _verificar_inexistente(credenciales.contrasena)
+    if not usuario or not await _verificar(credenciales.contrasena, usuario.contrasena, Credenciales.contrasena, usuario.id):
         raise HTTPException(status_code=401, detail="Credenciales inválidas", headers={"WWW-Authenticate": "Bearer"})
     # Si las credenciales son correctas, creamos el token de acceso
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -543,7 +619,7 @@ def obtener_tipo_tarjeta(numero_tarjeta: str, rut: str, db: Session = Depends(ge
 
 # POST - Endpoint para iniciar sesión con rut y clave de tarjeta
 @app.post("/login_tarjeta/", response_model=TokenModel)
-def login_tarjeta(credenciales: LoginModel, db: Session = Depends(get_db)):
+async def login_tarjeta(credenciales: LoginModel):
     # Verificar que el RUT y la contraseña no estén vacíos
     if not credenciales.rut or not credenciales.contrasena:
         raise HTTPException(status_code=400, detail="RUT y contraseña son obligatorios")
@@ -556,15 +632,15 @@ def login_tarjeta(credenciales: LoginModel, db: Session = Depends(get_db)):
     # Verificar que el RUT tenga un formato válido
     if not rut_chile.is_valid_rut(credenciales.rut) or "-" not in credenciales.rut:
         raise HTTPException(status_code=400, detail="RUT inválido")
-    # Verificar las credenciales en la base de datos
-    usuario = db.query(Tarjetas).filter(
-        and_(
-            text("BINARY rut = :rut"),
-            text("BINARY clave = :clave"),
-        ).params(
-            {"rut": credenciales.rut, "clave": credenciales.contrasena}
-        )
-    ).first()
+    # Buscar las tarjetas del RUT y verificar la clave contra cada una (un RUT puede tener varias)
+    usuario = None
+    tarjetas = await run_in_threadpool(_buscar_tarjetas, normalizar_rut(credenciales.rut))
+    if not tarjetas:
+        await _verificar_inexistente(credenciales.contrasena)
+    for tarjeta in tarjetas:
+        if await _verificar(credenciales.contrasena, tarjeta.clave, Tarjetas.clave, tarjeta.id):
+            usuario = tarjeta
+            break
     # Si las credenciales son incorrectas, lanzar una excepción HTTP 401
     if not usuario:
         raise HTTPException(status_code=401, detail="Credenciales inválidas", headers={"WWW-Authenticate": "Bearer"})
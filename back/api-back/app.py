@@ -2,7 +2,8 @@
 # Router para los endpoints del Backend
 #################################################################
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Date, Time, Boolean
@@ -15,6 +16,8 @@ import mysql.connector
 from fastapi import Depends
 from datetime import date
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from fastapi.concurrency import run_in_threadpool
 from patentes_vehiculares_chile import (
     validar_patente,
     detectar_tipo_patente,
@@ -27,7 +30,52 @@ from patentes_vehiculares_chile import (
     generar_rut
 )
 
-app = FastAPI(root_path="/back")
+from config.http_client import clientes_http
+from config.event_loop import configurar_threadpool, monitor_event_loop, LOOP_MONITOR
+from config.buffer_logs import buffer_logs
+from config.gemini import cliente_gemini
+from config.memoria_chatbot import memoria_chatbot
+from comun.autenticacion import verificador_contrasenas
+from config.resiliencia import CircuitoAbiertoError, PlazoAgotadoError, CB_ABIERTO_SEGUNDOS
+from config.http_client import AgenciaSaturadaError, AGENCIA_ESPERA_MAX
+from config.admision import AdmisionMiddleware
+from comun.metricas import instalar_metricas
+from comun.trazas import instalar_trazas, exportador_trazas
+
+#################################################################
+# Inicio y término de la aplicación
+#################################################################
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear las tablas que no existan y aplicar las migraciones pendientes
+    create_tables()
+    aplicar_migraciones()
+    # Threadpool acotado para endpoints síncronos y trabajo bloqueante
+    configurar_threadpool()
+    # Detección de bloqueos del event loop (solo en modo debug)
+    if LOOP_MONITOR:
+        monitor_event_loop.iniciar()
+    # Clientes HTTP compartidos (pool de conexiones por agencia)
+    await clientes_http.iniciar()
+    # Cliente compartido de Gemini (chatbot)
+    await cliente_gemini.iniciar()
+    # Escritura diferida de logs (solo si LOGS_BUFFER_ENABLED=true)
+    buffer_logs.iniciar()
+    yield
+    # Escribir los logs pendientes antes de terminar
+    await run_in_threadpool(buffer_logs.detener)
+    await clientes_http.cerrar()
+    await cliente_gemini.cerrar()
+    await memoria_chatbot.cerrar()
+    verificador_contrasenas.cerrar()
+    await run_in_threadpool(exportador_trazas.detener)
+    monitor_event_loop.detener()
+
+app = FastAPI(root_path="/back", lifespan=lifespan)
+
+# Carriles de prioridad (se agrega antes que CORS para que los rechazos 503 también lleven los headers CORS)
+app.add_middleware(AdmisionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,27 +85,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Errores de resiliencia no manejados por el router: la agencia está fallando o saturada (503) o no respondió a tiempo (504)
+@app.exception_handler(CircuitoAbiertoError)
+async def circuito_abierto_handler(request: Request, exc: CircuitoAbiertoError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(int(CB_ABIERTO_SEGUNDOS))})
+
+@app.exception_handler(AgenciaSaturadaError)
+async def agencia_saturada_handler(request: Request, exc: AgenciaSaturadaError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(max(1, int(AGENCIA_ESPERA_MAX)))})
+
+@app.exception_handler(PlazoAgotadoError)
+async def plazo_agotado_handler(request: Request, exc: PlazoAgotadoError):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 #################################################################
 # Conexión a la base de datos
 #################################################################
 
-load_dotenv()
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_name = os.getenv("DB_NAME")
-DATABASE_URL = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-# Base de datos declarativa
-Base = declarative_base()
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Engine, sesiones y get_db compartidos por todos los routers
+from config.database import engine, engine_analitico, SessionLocal, Base, get_db, create_tables
+from config.migraciones import aplicar_migraciones
 
 #################################################################
 # Incluimos las rutas de los endpoints
@@ -85,6 +132,9 @@ from routers.create_logs import create_logs
 from routers.guardar_vehiculo import guardar_vehiculo
 from routers.mis_permisos_emitidos import mis_permisos_emitidos
 from routers.chatbot import chatbot
+from routers.fiscalizar import fiscalizar
+from routers.estado import estado
+from routers.exportar_datos import exportar_datos
 
 app.include_router(calcular_metricas.router)
 app.include_router(consultar_encargo.router)
@@ -108,3 +158,17 @@ app.include_router(create_logs.router)
 app.include_router(guardar_vehiculo.router)
 app.include_router(mis_permisos_emitidos.router)
 app.include_router(chatbot.router)
+app.include_router(fiscalizar.router)
+app.include_router(estado.router)
+app.include_router(exportar_datos.router)
+
+#################################################################
+# Métricas de rendimiento (GET /metrics) y trazas
+#################################################################
+
+# Se agrega al final para que el middleware quede por fuera de la admisión y mida también las solicitudes rechazadas
+instalar_metricas(app, {"principal": engine, "analitico": engine_analitico})
+
+# Trazas distribuidas (span por solicitud, por consulta SQL y por llamada a una agencia); se agrega
+# al final para que el header X-Request-ID vaya también en las solicitudes rechazadas por la admisión
+instalar_trazas(app, "back", [engine, engine_analitico])
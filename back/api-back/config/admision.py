@@ -0,0 +1,127 @@
+# Control de admisión por carriles de prioridad
+# Los controles en ruta de app-fiscalizadores comparten proceso con las consultas
+# pesadas del panel de decisiones, las exportaciones y el chatbot. Cada solicitud
+# se asigna a un carril según su ruta y cada carril es un compartimento propio
+# (config.compartimentos) con su límite de solicitudes simultáneas y su cola:
+# - critico: fiscalización y consultas de documentos de un vehículo.
+# - bajo: métricas, navegadores de logs, exportaciones, carga masiva y chatbot.
+# - normal: todo lo demás.
+# Cuando el backend está saturado (más de ADMISION_SATURACION solicitudes en
+# curso) el carril bajo deja de encolar y rechaza de inmediato, así la capacidad
+# que queda es para los carriles de mayor prioridad. Las rutas /estado y /metrics
+# no pasan por la admisión.
+
+import os
+import json
+from contextlib import AsyncExitStack
+
+from config.compartimentos import Compartimento, CompartimentoLlenoError
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+ADMISION_ENABLED = os.getenv("ADMISION_ENABLED", "true").lower() == "true"
+ADMISION_SATURACION = int(os.getenv("ADMISION_SATURACION", "150"))   # Solicitudes en curso que activan el descarte
+ADMISION_RETRY_AFTER = os.getenv("ADMISION_RETRY_AFTER", "2")
+
+# Carril -> (máximo simultáneas, máximo en cola, espera máxima en segundos)
+# Se sobrescriben con ADMISION_<CARRIL>_MAX_CONCURRENTES, _MAX_EN_COLA y _ESPERA_MAX
+CARRILES_POR_DEFECTO = {
+    "critico": (200, 400, 5),
+    "normal": (100, 200, 3),
+    "bajo": (8, 16, 2),
+}
+
+# Prefijos de ruta por carril (se revisan en orden; la primera coincidencia gana)
+RUTAS_CARRIL = [
+    ("bajo", ("/calcular-metricas", "/consultar_logs_", "/exportar/", "/chatbot", "/logs_fiscalizacion/bulk")),
+    ("critico", ("/fiscalizar/", "/consultar_encargo/", "/consultar_permiso_circulacion", "/consultar_revision_tecnica/",
+                 "/consultar_soap/", "/consultar_multas/", "/consultar_patente/", "/consultar-multas-rpi/", "/logs_fiscalizacion/")),
+]
+RUTAS_SIN_ADMISION = ("/estado/", "/metrics")
+
+def _crear_carriles() -> dict:
+    carriles = {}
+    for nombre, (concurrentes, en_cola, espera) in CARRILES_POR_DEFECTO.items():
+        prefijo = f"ADMISION_{nombre.upper()}"
+        carriles[nombre] = Compartimento(
+            nombre,
+            int(os.getenv(f"{prefijo}_MAX_CONCURRENTES", concurrentes)),
+            int(os.getenv(f"{prefijo}_MAX_EN_COLA", en_cola)),
+            float(os.getenv(f"{prefijo}_ESPERA_MAX", espera)),
+        )
+    return carriles
+
+def carril_ruta(ruta: str):
+    """Carril de una ruta (sin el root_path), o None si no pasa por la admisión"""
+    if ruta.startswith(RUTAS_SIN_ADMISION):
+        return None
+    for carril, prefijos in RUTAS_CARRIL:
+        if ruta.startswith(prefijos):
+            return carril
+    return "normal"
+
+class ControlAdmision:
+    """Carriles de prioridad y descarte de la carga de baja prioridad en saturación"""
+
+    def __init__(self):
+        self.carriles = _crear_carriles()
+
+    def en_curso(self) -> int:
+        return sum(c.en_curso + c.en_cola for c in self.carriles.values())
+
+    def turno(self, carril: str):
+        compartimento = self.carriles[carril]
+        if carril == "bajo" and self.en_curso() >= ADMISION_SATURACION:
+            # Saturado: la baja prioridad no espera, solo entra si hay un turno libre
+            return compartimento.turno(esperar=False)
+        return compartimento.turno()
+
+    def estadisticas(self) -> dict:
+        return {
+            "habilitada": ADMISION_ENABLED,
+            "saturacion": ADMISION_SATURACION,
+            "en_curso": self.en_curso(),
+            "carriles": {nombre: c.estadisticas() for nombre, c in self.carriles.items()},
+        }
+
+# Instancia única para toda la aplicación
+control_admision = ControlAdmision()
+
+class AdmisionMiddleware:
+    """Middleware ASGI que ejecuta cada solicitud HTTP dentro del turno de su carril"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ADMISION_ENABLED or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        ruta = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and ruta.startswith(root_path):
+            ruta = ruta[len(root_path):]
+        carril = carril_ruta(ruta)
+        if carril is None:
+            return await self.app(scope, receive, send)
+        async with AsyncExitStack() as pila:
+            # Solo se rechaza si no se obtiene el turno; los errores de la aplicación
+            # salen del bloque y el turno se libera con su información
+            try:
+                await pila.enter_async_context(control_admision.turno(carril))
+            except CompartimentoLlenoError:
+                return await self._rechazar(carril, send)
+            await self.app(scope, receive, send)
+
+    async def _rechazar(self, carril: str, send):
+        cuerpo = json.dumps({"detail": f"Servicio saturado (carril {carril}), intente nuevamente"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"retry-after", ADMISION_RETRY_AFTER.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
@@ -107,6 +107,7 @@ RPI = f"{API_MTT}/multas_pasajero"
 # Permiso de circulación
 PERMISO_CIRCULACION = f"{API_TGR}/consultar_permiso"
 PERMISO_CIRCULACION_ID = f"{API_TGR}/consultar_permiso_id"
+PERMISOS_CIRCULACION_LOTE = f"{API_TGR}/consultar_permisos"  # Último permiso de varias PPU (POST)
 
 # Encargo de patente
 ENCARGO_PATENTE = f"{API_CARABINEROS}/encargo_patente"
@@ -115,6 +116,20 @@ ENCARGO_PATENTE = f"{API_CARABINEROS}/encargo_patente"
 TASACION_FISCAL = f"{API_SII}/tasacion_fiscal"
 FACTURA_VENTA = f"{API_SII}/factura_venta_num_chasis"
 
+# ============================================================
+# TIMEOUTS POR AGENCIA (SEGUNDOS)
+# ============================================================
+# Tiempo máximo de espera por cada API externa. Pueden ser sobrescritos
+# con variables de entorno (ej: TIMEOUT_TGR=3.5)
+TIMEOUT_AACH = float(os.getenv("TIMEOUT_AACH", "5"))
+TIMEOUT_CARABINEROS = float(os.getenv("TIMEOUT_CARABINEROS", "5"))
+TIMEOUT_MTT = float(os.getenv("TIMEOUT_MTT", "5"))
+TIMEOUT_PRT = float(os.getenv("TIMEOUT_PRT", "5"))
+TIMEOUT_SII = float(os.getenv("TIMEOUT_SII", "5"))
+TIMEOUT_SGD = float(os.getenv("TIMEOUT_SGD", "5"))
+TIMEOUT_TGR = float(os.getenv("TIMEOUT_TGR", "5"))
+TIMEOUT_SRCEI = float(os.getenv("TIMEOUT_SRCEI", "5"))
+
 # ============================================================
 # DEBUG
 # ============================================================
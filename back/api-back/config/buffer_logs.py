@@ -0,0 +1,232 @@
+# Escritura diferida (write-behind) de los logs de consultas y fiscalizaciones
+# Son las escrituras más frecuentes del sistema. En modo buffer el endpoint solo
+# valida el log, le asigna un UUID y lo deja en una cola; un hilo escritor lo
+# inserta junto a otros con INSERT de múltiples filas cuando se junta un lote o
+# pasa el intervalo máximo. Así la latencia de la solicitud no depende del commit
+# de MySQL.
+#
+# Si un lote sigue fallando después de los reintentos se escribe por tipo de log
+# y luego fila por fila: una fila inválida no arrastra al resto del lote. Solo las
+# filas que no se pueden insertar van al archivo de logs rechazados
+# (LOGS_BUFFER_RECHAZADOS, una línea JSON por fila) para revisarlas y reintentarlas.
+
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError, InterfaceError
+
+from config.database import SessionLocal
+from config.models import LogConsultaPropietario, LogFiscalizacion
+from config.rollups import registrar_consultas, registrar_fiscalizaciones
+from config.cache import cache_metricas
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+LOGS_BUFFER_ENABLED = os.getenv("LOGS_BUFFER_ENABLED", "false").lower() == "true"
+LOGS_BUFFER_MAX_COLA = int(os.getenv("LOGS_BUFFER_MAX_COLA", "10000"))
+LOGS_BUFFER_LOTE = int(os.getenv("LOGS_BUFFER_LOTE", "500"))                       # Filas por INSERT
+LOGS_BUFFER_INTERVALO_MS = float(os.getenv("LOGS_BUFFER_INTERVALO_MS", "200"))     # Espera máxima para juntar un lote
+LOGS_BUFFER_REINTENTOS = int(os.getenv("LOGS_BUFFER_REINTENTOS", "3"))
+LOGS_BUFFER_RECHAZADOS = os.getenv("LOGS_BUFFER_RECHAZADOS", "logs_rechazados.jsonl")  # Filas que no se pudieron insertar
+
+# Tipo de log -> (modelo, actualización de rollups, scope de métricas)
+TIPOS_LOG = {
+    "consulta": (LogConsultaPropietario, registrar_consultas, "consultas"),
+    "fiscalizacion": (LogFiscalizacion, registrar_fiscalizaciones, "fiscalizacion"),
+}
+
+class ColaLlenaError(Exception):
+    """La cola del buffer está llena (contrapresión)"""
+
+class BufferLogs:
+    """Cola acotada de logs pendientes y el hilo que los escribe por lotes"""
+
+    def __init__(self, habilitado: bool = LOGS_BUFFER_ENABLED):
+        self.habilitado = habilitado
+        self._cola = queue.Queue(maxsize=LOGS_BUFFER_MAX_COLA)
+        self._detener = threading.Event()
+        self._hilo = None
+        self.encolados = 0
+        self.rechazados = 0
+        self.escritos = 0
+        self.descartados = 0
+        self.lotes = 0
+        self.lotes_divididos = 0
+        self.errores = 0
+        self.escritura_ultima_ms = 0.0
+        self.escritura_maxima_ms = 0.0
+        self._escritura_total_ms = 0.0
+
+    def iniciar(self):
+        if not self.habilitado or (self._hilo and self._hilo.is_alive()):
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="buffer-logs", daemon=True)
+        self._hilo.start()
+        logger.info(f"Buffer de logs activo (lote {LOGS_BUFFER_LOTE}, intervalo {LOGS_BUFFER_INTERVALO_MS:.0f} ms)")
+
+    def detener(self, timeout: float = 30):
+        """Escribe los logs pendientes y detiene el hilo escritor"""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout)
+        if self._hilo.is_alive():
+            logger.error(f"El buffer de logs no terminó de vaciarse ({self._cola.qsize()} logs pendientes)")
+        self._hilo = None
+
+    def encolar(self, tipo: str, datos: dict) -> str:
+        """
+        Agrega un log a la cola y retorna su UUID. Si la cola está llena lanza
+        ColaLlenaError de inmediato (no bloquea el hilo de la solicitud).
+        """
+        fila = dict(datos, id_cliente=str(uuid.uuid4()))
+        try:
+            self._cola.put_nowait((tipo, fila))
+        except queue.Full:
+            self.rechazados += 1
+            raise ColaLlenaError()
+        self.encolados += 1
+        return fila["id_cliente"]
+
+    def _tomar_lote(self) -> list:
+        """Espera el primer log y junta más hasta completar el lote o el intervalo"""
+        intervalo = LOGS_BUFFER_INTERVALO_MS / 1000
+        try:
+            lote = [self._cola.get(timeout=intervalo)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + intervalo
+        while len(lote) < LOGS_BUFFER_LOTE:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _ejecutar(self):
+        # Al detener se sigue escribiendo hasta vaciar la cola
+        while not (self._detener.is_set() and self._cola.empty()):
+            lote = self._tomar_lote()
+            if lote:
+                self._escribir(lote)
+
+    def _insertar(self, por_tipo: dict):
+        """Inserta las filas de cada tipo y actualiza los rollups en una sola transacción"""
+        db = SessionLocal()
+        try:
+            for tipo, filas in por_tipo.items():
+                modelo, registrar_rollups, _ = TIPOS_LOG[tipo]
+                db.execute(insert(modelo), filas)
+                registrar_rollups(db, filas)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _registrar_escritos(self, por_tipo: dict):
+        """Cuenta las filas escritas e invalida las métricas de sus días"""
+        for tipo, filas in por_tipo.items():
+            self.escritos += len(filas)
+            scope = TIPOS_LOG[tipo][2]
+            for dia in {fila["fecha"].date() for fila in filas}:
+                cache_metricas.invalidar(scope, dia)
+
+    def _escribir(self, lote: list):
+        por_tipo = {}
+        for tipo, fila in lote:
+            por_tipo.setdefault(tipo, []).append(fila)
+
+        for intento in range(1, LOGS_BUFFER_REINTENTOS + 1):
+            inicio = time.perf_counter()
+            try:
+                self._insertar(por_tipo)
+            except Exception as e:
+                self.errores += 1
+                logger.error(f"Error escribiendo lote de {len(lote)} logs (intento {intento}): {str(e)}")
+                if intento < LOGS_BUFFER_REINTENTOS:
+                    time.sleep(min(0.5 * intento, 2))
+                continue
+
+            duracion = (time.perf_counter() - inicio) * 1000
+            self.lotes += 1
+            self.escritura_ultima_ms = duracion
+            self.escritura_maxima_ms = max(self.escritura_maxima_ms, duracion)
+            self._escritura_total_ms += duracion
+            self._registrar_escritos(por_tipo)
+            return
+
+        # El lote completo sigue fallando: se escribe por tipo y luego fila por fila
+        self.lotes_divididos += 1
+        for tipo, filas in por_tipo.items():
+            try:
+                self._insertar({tipo: filas})
+            except Exception as e:
+                logger.error(f"Error escribiendo {len(filas)} logs de {tipo}, se escriben fila por fila: {str(e)}")
+                self._escribir_filas(tipo, filas)
+            else:
+                self._registrar_escritos({tipo: filas})
+
+    def _escribir_filas(self, tipo: str, filas: list):
+        for i, fila in enumerate(filas):
+            try:
+                self._insertar({tipo: [fila]})
+            except (OperationalError, InterfaceError) as e:
+                # Base de datos no disponible: no se insiste fila por fila
+                self._rechazar(tipo, filas[i:], e)
+                return
+            except Exception as e:
+                self._rechazar(tipo, [fila], e)
+            else:
+                self._registrar_escritos({tipo: [fila]})
+
+    def _rechazar(self, tipo: str, filas: list, error: Exception):
+        """Guarda en el archivo de rechazados las filas que no se pudieron insertar"""
+        self.descartados += len(filas)
+        logger.error(f"{len(filas)} logs de {tipo} no se pudieron insertar ({str(error)}), se guardan en {LOGS_BUFFER_RECHAZADOS}")
+        try:
+            with open(LOGS_BUFFER_RECHAZADOS, "a", encoding="utf-8") as archivo:
+                for fila in filas:
+                    archivo.write(json.dumps({
+                        "tipo": tipo,
+                        "fila": fila,
+                        "error": str(error).splitlines()[0] if str(error) else type(error).__name__,
+                        "fecha_rechazo": datetime.now(),
+                    }, default=str, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"No se pudo escribir {LOGS_BUFFER_RECHAZADOS}: {str(e)}; filas perdidas: {filas}")
+
+    def estadisticas(self) -> dict:
+        return {
+            "habilitado": self.habilitado,
+            "en_cola": self._cola.qsize(),
+            "max_cola": LOGS_BUFFER_MAX_COLA,
+            "encolados": self.encolados,
+            "rechazados": self.rechazados,
+            "escritos": self.escritos,
+            "descartados": self.descartados,
+            "archivo_rechazados": LOGS_BUFFER_RECHAZADOS,
+            "lotes": self.lotes,
+            "lotes_divididos": self.lotes_divididos,
+            "errores": self.errores,
+            "escritura_ultima_ms": round(self.escritura_ultima_ms, 1),
+            "escritura_maxima_ms": round(self.escritura_maxima_ms, 1),
+            "escritura_promedio_ms": round(self._escritura_total_ms / self.lotes, 1) if self.lotes else 0.0,
+        }
+
+# Instancia única para toda la aplicación
+buffer_logs = BufferLogs()
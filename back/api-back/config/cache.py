@@ -0,0 +1,269 @@
+# Caché en memoria de las respuestas de las APIs externas
+# Las consultas por PPU a TGR, PRT, AACH, SRCEI y Carabineros se repiten mucho
+# (propietarios recargando "Mis Documentos", fiscalizadores revisando la misma
+# patente) y la información cambia poco. Se guardan las respuestas 200 y 404
+# con expulsión LRU y un tiempo de vida (TTL) por agencia o por documento.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "10000"))
+
+# TTL por defecto (segundos), puede sobrescribirse por agencia (ej: CACHE_TTL_PRT=600)
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_TTL_AGENCIA = {
+    "CARABINEROS": float(os.getenv("CACHE_TTL_CARABINEROS", "60")),   # Encargos por robo: TTL corto
+}
+
+# TTL de las respuestas 404 (caché negativa)
+CACHE_TTL_404 = float(os.getenv("CACHE_TTL_404", "60"))
+
+# TTL máximo de un documento con fecha de vencimiento (por defecto 24 horas)
+CACHE_TTL_MAX = float(os.getenv("CACHE_TTL_MAX", "86400"))
+
+# Campo con la fecha de vencimiento de cada tipo de documento
+CAMPOS_VENCIMIENTO = {
+    "permiso": "fecha_expiracion",
+    "soap": "rige_hasta",
+    "revision": "fecha_vencimiento",
+}
+
+def ttl_agencia(agencia: str) -> float:
+    return CACHE_TTL_AGENCIA.get(agencia, float(os.getenv(f"CACHE_TTL_{agencia}", CACHE_TTL)))
+
+def ttl_documento(agencia: str, documento: str, data) -> float:
+    """
+    Calcula el TTL de un documento. Si el documento tiene fecha de vencimiento
+    se guarda hasta el final de ese día (máximo CACHE_TTL_MAX); si no la tiene o ya
+    venció se usa el TTL de la agencia.
+    """
+    campo = CAMPOS_VENCIMIENTO.get(documento)
+    if campo and isinstance(data, dict) and data.get(campo):
+        try:
+            vencimiento = date.fromisoformat(str(data.get(campo))[:10])
+            fin_vigencia = datetime.combine(vencimiento + timedelta(days=1), datetime.min.time())
+            restante = (fin_vigencia - datetime.now()).total_seconds()
+            if restante > 0:
+                return min(restante, CACHE_TTL_MAX)
+        except ValueError:
+            pass
+    return ttl_agencia(agencia)
+
+class CacheRespuestas:
+    """
+    Caché LRU con expiración por entrada.
+    Las claves son (agencia, url) y los valores (status_code, content, content_type).
+    Es segura entre hilos: las invalidaciones se hacen desde endpoints síncronos
+    que corren en el threadpool.
+    """
+
+    def __init__(self, max_entradas: int = CACHE_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.aciertos_negativos = 0
+        self.expiradas = 0
+        self.expulsadas = 0
+        self.invalidadas = 0
+
+    def obtener(self, agencia: str, url: str):
+        clave = (agencia, url)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            expira, valor = entrada
+            if expira <= time.monotonic():
+                del self._entradas[clave]
+                self.expiradas += 1
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            if valor[0] == 404:
+                self.aciertos_negativos += 1
+            return valor
+
+    def guardar(self, agencia: str, url: str, valor: tuple, ttl: float):
+        if ttl <= 0:
+            return
+        clave = (agencia, url)
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + ttl, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.expulsadas += 1
+
+    def invalidar(self, agencia: str = None, identificador: str = None) -> int:
+        """
+        Elimina las entradas de una agencia y/o de un identificador (PPU o id),
+        que corresponde al último segmento de la URL. Retorna cuántas se eliminaron.
+        """
+        sufijo = f"/{identificador}".upper() if identificador is not None else None
+        with self._lock:
+            claves = [
+                clave for clave in self._entradas
+                if (agencia is None or clave[0] == agencia)
+                and (sufijo is None or clave[1].upper().endswith(sufijo))
+            ]
+            for clave in claves:
+                del self._entradas[clave]
+            self.invalidadas += len(claves)
+        return len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "habilitada": CACHE_ENABLED,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "aciertos": self.aciertos,
+                "aciertos_negativos": self.aciertos_negativos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "expiradas": self.expiradas,
+                "expulsadas": self.expulsadas,
+                "invalidadas": self.invalidadas,
+            }
+
+# Instancia única para toda la aplicación
+cache_respuestas = CacheRespuestas()
+
+#####################################################
+# Caché de resultados de calcular_metricas
+#####################################################
+# Varios usuarios del panel abren los mismos rangos una y otra vez. Los resultados
+# se guardan por (scope, period_type, from_date, to_date):
+# - Rangos cerrados (terminan antes de hoy): expiran a los CACHE_METRICAS_TTL_CERRADO
+#   segundos. Cubre las escrituras con fecha pasada hechas en otra réplica (carga
+#   masiva, permisos con fecha anterior), que solo invalidan la caché local.
+# - Rangos que incluyen hoy: expiran a los CACHE_METRICAS_TTL segundos.
+# Al registrar un log o permiso se invalidan los rangos de ese scope que
+# contienen su fecha.
+CACHE_METRICAS_MAX_ENTRADAS = int(os.getenv("CACHE_METRICAS_MAX_ENTRADAS", "500"))
+CACHE_METRICAS_TTL = float(os.getenv("CACHE_METRICAS_TTL", "300"))
+CACHE_METRICAS_TTL_CERRADO = float(os.getenv("CACHE_METRICAS_TTL_CERRADO", "3600"))
+
+# Días invalidados que se recuerdan para descartar resultados calculados en paralelo
+MAX_DIAS_INVALIDADOS = 10000
+
+class CacheMetricas:
+    """Caché LRU de resultados de métricas con invalidación por fecha escrita"""
+
+    def __init__(self, max_entradas: int = CACHE_METRICAS_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        # Contador de invalidaciones. Se recuerda la última invalidación de cada
+        # (scope, día): un resultado calculado antes de una escritura en uno de los
+        # días de su rango no se guarda (podría no incluirla). Las escrituras en
+        # otros días u otros scopes no lo afectan.
+        self._generacion = 0
+        self._dias_invalidados = {}       # (scope, día) -> generación
+        self._scopes_invalidados = {}     # scope -> generación (invalidación de todo el scope)
+        self._generacion_minima = 0       # Límite por los días olvidados (y por limpiar)
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidadas = 0
+        self.descartadas = 0
+
+    def generacion(self) -> int:
+        return self._generacion
+
+    def obtener(self, clave: tuple):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] <= time.monotonic():
+                if entrada is not None:
+                    del self._entradas[clave]
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[3]
+
+    def _invalidado_desde(self, scope: str, desde: date, hasta: date, generacion: int) -> bool:
+        """True si hubo una invalidación del scope en el rango después de la generación indicada"""
+        if generacion < self._generacion_minima or self._scopes_invalidados.get(scope, -1) > generacion:
+            return True
+        return any(
+            g > generacion and s == scope and desde <= dia <= hasta
+            for (s, dia), g in self._dias_invalidados.items()
+        )
+
+    def guardar(self, clave: tuple, desde: date, hasta: date, resultado, generacion: int):
+        ttl = CACHE_METRICAS_TTL_CERRADO if hasta < date.today() else CACHE_METRICAS_TTL
+        with self._lock:
+            if generacion != self._generacion and self._invalidado_desde(clave[0], desde, hasta, generacion):
+                self.descartadas += 1
+                return
+            self._entradas[clave] = (time.monotonic() + ttl, desde, hasta, resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, scope: str, fecha=None) -> int:
+        """Elimina los resultados del scope cuyo rango contiene la fecha (o todos si no se indica)"""
+        dia = fecha.date() if isinstance(fecha, datetime) else fecha
+        with self._lock:
+            self._generacion += 1
+            if dia is None:
+                self._scopes_invalidados[scope] = self._generacion
+            else:
+                self._dias_invalidados.pop((scope, dia), None)
+                self._dias_invalidados[(scope, dia)] = self._generacion
+                if len(self._dias_invalidados) > MAX_DIAS_INVALIDADOS:
+                    # Se olvida el día invalidado hace más tiempo; los cálculos iniciados
+                    # antes de esa invalidación ya no se pueden guardar
+                    mas_antiguo, olvidada = next(iter(self._dias_invalidados.items()))
+                    del self._dias_invalidados[mas_antiguo]
+                    self._generacion_minima = olvidada
+            claves = [
+                clave for clave, (_, desde, hasta, _) in self._entradas.items()
+                if clave[0] == scope and (dia is None or desde <= dia <= hasta)
+            ]
+            for clave in claves:
+                del self._entradas[clave]
+            self.invalidadas += len(claves)
+        return len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+            self._generacion_minima = self._generacion
+            self._dias_invalidados.clear()
+            self._scopes_invalidados.clear()
+            self._entradas.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+                "invalidadas": self.invalidadas,
+                "descartadas": self.descartadas,
+                "ttl_cerrado": CACHE_METRICAS_TTL_CERRADO,
+            }
+
+# Instancia única para toda la aplicación
+cache_metricas = CacheMetricas()
@@ -0,0 +1,65 @@
+# Agrupación de solicitudes idénticas en vuelo ("single-flight")
+# En peaks de renovación y operativos de fiscalización llegan muchas consultas
+# por la misma PPU o RUT en pocos milisegundos. En vez de que cada una llame a la
+# agencia, solo la primera realiza la solicitud y las demás esperan y comparten
+# su resultado (o su error).
+
+import os
+import asyncio
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+COALESCING_ENABLED = os.getenv("COALESCING_ENABLED", "true").lower() == "true"
+
+class SolicitudesEnVuelo:
+    """
+    Mantiene una tarea por clave (agencia + endpoint + PPU/RUT) mientras la
+    solicitud está en curso. La tarea se ejecuta aparte de quien la originó, de
+    modo que si ese cliente se desconecta los demás igual reciben la respuesta.
+    """
+
+    def __init__(self):
+        self._en_vuelo = {}
+        self.llamadas = 0       # Solicitudes recibidas
+        self.originadas = 0     # Solicitudes realmente enviadas a la agencia
+        self.agrupadas = 0      # Solicitudes que esperaron una ya en curso (ahorradas)
+        self.max_esperando = 0  # Máximo de solicitudes compartiendo una misma respuesta
+
+    async def ejecutar(self, clave, funcion):
+        """Ejecuta funcion() una sola vez por clave mientras esté en curso"""
+        self.llamadas += 1
+        entrada = self._en_vuelo.get(clave)
+        if entrada is None:
+            self.originadas += 1
+            tarea = asyncio.ensure_future(funcion())
+            entrada = [tarea, 1]
+            self._en_vuelo[clave] = entrada
+            tarea.add_done_callback(lambda t: self._terminar(clave, t))
+        else:
+            self.agrupadas += 1
+            entrada[1] += 1
+            self.max_esperando = max(self.max_esperando, entrada[1])
+        return await asyncio.shield(entrada[0])
+
+    def _terminar(self, clave, tarea):
+        entrada = self._en_vuelo.get(clave)
+        if entrada is not None and entrada[0] is tarea:
+            del self._en_vuelo[clave]
+        # Marcar la excepción como recuperada aunque todos los que esperaban se hayan ido
+        if not tarea.cancelled():
+            tarea.exception()
+
+    def estadisticas(self) -> dict:
+        return {
+            "habilitado": COALESCING_ENABLED,
+            "en_vuelo": len(self._en_vuelo),
+            "llamadas": self.llamadas,
+            "originadas": self.originadas,
+            "ahorradas": self.agrupadas,
+            "tasa_ahorro": round(self.agrupadas / self.llamadas, 4) if self.llamadas else 0.0,
+            "max_esperando": self.max_esperando,
+        }
+
+# Instancia única para toda la aplicación
+solicitudes_en_vuelo = SolicitudesEnVuelo()
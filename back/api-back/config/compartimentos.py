@@ -0,0 +1,74 @@
+# Compartimentos (bulkheads) para aislar cargas de trabajo dentro del backend
+# Un Compartimento limita cuántas operaciones de un tipo se ejecutan a la vez y
+# cuántas pueden esperar turno. Si la cola está llena, o no se obtiene turno a
+# tiempo, se rechaza la operación (CompartimentoLlenoError) en vez de acumularla:
+# así una carga lenta (una agencia caída, un reporte anual del panel) agota solo
+# su propio compartimento y no los recursos que usan las demás.
+# Se usa para la concurrencia por agencia (config.http_client) y para los
+# carriles de prioridad de las solicitudes (config.admision).
+
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+class CompartimentoLlenoError(Exception):
+    """No hay turno disponible en el compartimento"""
+
+class Compartimento:
+    """Límite de operaciones simultáneas con una cola de espera acotada"""
+
+    def __init__(self, nombre: str, max_concurrentes: int, max_en_cola: int, espera_max: float):
+        self.nombre = nombre
+        self.max_concurrentes = max_concurrentes
+        self.max_en_cola = max_en_cola
+        self.espera_max = espera_max
+        self._semaforo = asyncio.Semaphore(max_concurrentes)
+        self.en_curso = 0
+        self.en_cola = 0
+        self.max_en_cola_observada = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+        self._espera_total_ms = 0.0
+
+    def rechazar(self):
+        self.rechazadas += 1
+        raise CompartimentoLlenoError(f"Compartimento {self.nombre} saturado")
+
+    @asynccontextmanager
+    async def turno(self, esperar: bool = True):
+        """Espera un turno (o rechaza si la cola está llena, la espera es muy larga o esperar=False y no hay turno libre)"""
+        if not self._semaforo.locked():
+            # Hay turno libre: se toma sin pasar por la cola
+            await self._semaforo.acquire()
+        else:
+            if not esperar or self.en_cola >= self.max_en_cola:
+                self.rechazar()
+            inicio = time.perf_counter()
+            self.en_cola += 1
+            self.max_en_cola_observada = max(self.max_en_cola_observada, self.en_cola)
+            try:
+                await asyncio.wait_for(self._semaforo.acquire(), self.espera_max)
+            except asyncio.TimeoutError:
+                self.rechazar()
+            finally:
+                self.en_cola -= 1
+            self._espera_total_ms += (time.perf_counter() - inicio) * 1000
+        self.admitidas += 1
+        self.en_curso += 1
+        try:
+            yield
+        finally:
+            self.en_curso -= 1
+            self._semaforo.release()
+
+    def estadisticas(self) -> dict:
+        return {
+            "max_concurrentes": self.max_concurrentes,
+            "max_en_cola": self.max_en_cola,
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "max_en_cola_observada": self.max_en_cola_observada,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+            "espera_promedio_ms": round(self._espera_total_ms / self.admitidas, 1) if self.admitidas else 0.0,
+        }
@@ -0,0 +1,144 @@
+# Conexión única a la base de datos del backend (back_db)
+# Todos los routers comparten el mismo engine (un solo pool de conexiones por
+# proceso), la misma base declarativa y la misma dependencia get_db.
+
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+load_dotenv()
+
+# ============================================================
+# URL DE CONEXIÓN
+# ============================================================
+db_user = os.getenv("DB_USER")
+db_password = os.getenv("DB_PASSWORD")
+db_host = os.getenv("DB_HOST")
+db_name = os.getenv("DB_NAME")
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
+)
+
+# ============================================================
+# POOL DE CONEXIONES
+# ============================================================
+# Máximo de conexiones por proceso = DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))   # Segundos antes de renovar una conexión
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Mostrar las sentencias SQL en consola (solo para desarrollo)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+def _crear_engine(url: str):
+    if url.startswith("sqlite"):
+        # SQLite (pruebas locales) no usa QueuePool
+        return create_engine(url, echo=DB_ECHO)
+    return create_engine(
+        url,
+        echo=DB_ECHO,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+engine = _crear_engine(DATABASE_URL)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# ============================================================
+# ENGINE PARA LECTURAS EN STREAMING (EXPORTACIONES)
+# ============================================================
+# mysql-connector no soporta cursores del lado del servidor en SQLAlchemy, por lo
+# que las exportaciones usan el driver PyMySQL (SSCursor): las filas se leen a
+# medida que se envían, sin cargar el resultado completo en memoria.
+DB_STREAM_POOL_SIZE = int(os.getenv("DB_STREAM_POOL_SIZE", "2"))
+_engine_streaming = None
+
+def get_engine_streaming():
+    """Engine con cursores del lado del servidor, creado al primer uso"""
+    global _engine_streaming
+    if _engine_streaming is None:
+        url = DATABASE_URL.replace("mysql+mysqlconnector://", "mysql+pymysql://", 1)
+        if url.startswith("sqlite"):
+            _engine_streaming = engine
+        else:
+            _engine_streaming = create_engine(
+                url,
+                echo=DB_ECHO,
+                pool_size=DB_STREAM_POOL_SIZE,
+                max_overflow=0,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+    return _engine_streaming
+
+# ============================================================
+# ENGINE PARA CONSULTAS ANALÍTICAS
+# ============================================================
+# Las métricas del panel de decisiones y los navegadores de logs recorren tablas
+# completas y pueden ocupar una conexión por varios segundos. Usan un pool propio
+# y pequeño, así un reporte pesado espera conexiones de este pool y no agota las
+# que necesitan los endpoints transaccionales (fiscalización, permisos, logs).
+DB_ANALITICA_POOL_SIZE = int(os.getenv("DB_ANALITICA_POOL_SIZE", "3"))
+DB_ANALITICA_MAX_OVERFLOW = int(os.getenv("DB_ANALITICA_MAX_OVERFLOW", "2"))
+DB_ANALITICA_POOL_TIMEOUT = float(os.getenv("DB_ANALITICA_POOL_TIMEOUT", "10"))
+
+if DATABASE_URL.startswith("sqlite"):
+    engine_analitico = engine
+else:
+    engine_analitico = create_engine(
+        DATABASE_URL,
+        echo=DB_ECHO,
+        pool_size=DB_ANALITICA_POOL_SIZE,
+        max_overflow=DB_ANALITICA_MAX_OVERFLOW,
+        pool_timeout=DB_ANALITICA_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+SessionAnalitica = sessionmaker(autocommit=False, autoflush=False, bind=engine_analitico)
+
+def estadisticas_pool(engine_pool) -> dict:
+    """Uso del pool de conexiones de un engine (SQLite no tiene QueuePool)"""
+    pool = engine_pool.pool
+    estadisticas = {"tipo": type(pool).__name__}
+    for atributo in ("size", "checkedout", "checkedin", "overflow"):
+        metodo = getattr(pool, atributo, None)
+        if callable(metodo):
+            estadisticas[atributo] = metodo()
+    return estadisticas
+
+# Base de datos declarativa (metadata común para todas las tablas del backend)
+Base = declarative_base()
+
+# Dependencia para obtener la sesión de la base de datos
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependencia para las consultas analíticas (métricas y navegadores de logs)
+def get_db_analitica():
+    db = SessionAnalitica()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def create_tables():
+    """Crea las tablas que no existan (no detiene la app si la base de datos no está disponible)"""
+    # Importar los modelos para registrarlos en la metadata
+    import config.models  # noqa: F401
+    try:
+        Base.metadata.create_all(bind=engine)
+        print("Tablas creadas/actualizadas correctamente")
+    except Exception as e:
+        print(f"Error creando tablas: {e}")
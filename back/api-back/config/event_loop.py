@@ -0,0 +1,107 @@
+# Configuración del event loop y del threadpool del backend
+# - Limita el número de hilos que FastAPI usa para ejecutar los endpoints síncronos
+#   (def) y el trabajo bloqueante enviado con run_in_threadpool.
+# - Modo debug que detecta y reporta bloqueos del event loop (ej: una llamada
+#   bloqueante dentro de un endpoint async def).
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+import anyio.to_thread
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# THREADPOOL
+# ============================================================
+# Cantidad máxima de hilos para trabajo bloqueante (por defecto anyio usa 40)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+def configurar_threadpool():
+    """Ajusta el límite de hilos del threadpool compartido de anyio/FastAPI"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
+# ============================================================
+# DETECCIÓN DE BLOQUEOS DEL EVENT LOOP
+# ============================================================
+# LOOP_MONITOR=true activa la detección (pensado para desarrollo/debug)
+# LOOP_STALL_THRESHOLD_MS: duración mínima de un bloqueo para ser reportado
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "false").lower() == "true"
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "100"))
+
+class MonitorEventLoop:
+    """
+    Detecta bloqueos del event loop.
+
+    Una tarea del loop registra un "latido" periódico y un hilo vigilante revisa
+    que el latido se mantenga al día. Si el loop lleva más del umbral sin latir,
+    se registra en el log el stack del hilo del loop (lo que lo está bloqueando).
+    Además se activa el modo debug de asyncio, que reporta los callbacks lentos.
+    """
+
+    def __init__(self, umbral_ms: float = LOOP_STALL_THRESHOLD_MS):
+        self.umbral = umbral_ms / 1000
+        self.intervalo = max(self.umbral / 4, 0.005)
+        self.bloqueos = 0
+        self.bloqueo_maximo_ms = 0.0
+        self._ultimo_latido = time.monotonic()
+        self._hilo_loop = None
+        self._tarea = None
+        self._vigilante = None
+        self._detener = threading.Event()
+
+    async def _latir(self):
+        while True:
+            self._ultimo_latido = time.monotonic()
+            await asyncio.sleep(self.intervalo)
+
+    def _vigilar(self):
+        reportado = False
+        while not self._detener.wait(self.intervalo):
+            retraso = time.monotonic() - self._ultimo_latido
+            if retraso > self.umbral:
+                if not reportado:
+                    # Primer aviso del bloqueo: registrar qué está ejecutando el loop
+                    reportado = True
+                    self.bloqueos += 1
+                    frame = sys._current_frames().get(self._hilo_loop)
+                    stack = "".join(traceback.format_stack(frame)) if frame else "(stack no disponible)"
+                    logger.warning(f"Event loop bloqueado por más de {self.umbral * 1000:.0f} ms:\n{stack}")
+                self.bloqueo_maximo_ms = max(self.bloqueo_maximo_ms, retraso * 1000)
+            elif reportado:
+                reportado = False
+                logger.warning(f"Event loop liberado (bloqueo máximo registrado: {self.bloqueo_maximo_ms:.0f} ms)")
+
+    def iniciar(self):
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.umbral
+        self._hilo_loop = threading.get_ident()
+        self._ultimo_latido = time.monotonic()
+        self._tarea = loop.create_task(self._latir())
+        self._detener.clear()
+        self._vigilante = threading.Thread(target=self._vigilar, name="monitor-event-loop", daemon=True)
+        self._vigilante.start()
+        logger.info(f"Monitor de event loop activo (umbral {self.umbral * 1000:.0f} ms)")
+
+    def detener(self):
+        self._detener.set()
+        if self._tarea:
+            self._tarea.cancel()
+            self._tarea = None
+
+    def estadisticas(self) -> dict:
+        return {
+            "activo": self._tarea is not None,
+            "umbral_ms": self.umbral * 1000,
+            "bloqueos": self.bloqueos,
+            "bloqueo_maximo_ms": round(self.bloqueo_maximo_ms, 1),
+        }
+
+# Instancia única para toda la aplicación
+monitor_event_loop = MonitorEventLoop()
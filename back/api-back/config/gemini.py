@@ -0,0 +1,199 @@
+# Cliente compartido para la API de Gemini (chatbot)
+# Se usa la API REST de Gemini con un único httpx.AsyncClient para toda la
+# aplicación, igual que con las agencias (config.http_client): no se reconfigura
+# ni se crea un modelo nuevo en cada consulta y la conexión TLS se reutiliza.
+# La URL base es configurable (GEMINI_BASE_URL), lo que permite apuntar a un
+# servidor falso local (config.gemini_falso) en desarrollo y pruebas.
+#
+# Las llamadas al modelo tardan segundos. Para que un peak de consultas no tome
+# todos los recursos hay un máximo de llamadas simultáneas y una cola acotada de
+# espera: si la cola está llena, o no se obtiene turno a tiempo, se rechaza la
+# consulta (GeminiSaturadoError) en vez de acumularla.
+
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_MODELO = os.getenv("GEMINI_MODELO", "gemini-2.5-flash")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+GEMINI_MAX_CONCURRENTES = int(os.getenv("GEMINI_MAX_CONCURRENTES", "4"))  # Llamadas simultáneas al modelo
+GEMINI_MAX_EN_COLA = int(os.getenv("GEMINI_MAX_EN_COLA", "32"))           # Consultas esperando turno
+GEMINI_ESPERA_MAX = float(os.getenv("GEMINI_ESPERA_MAX", "15"))           # Segundos máximos esperando turno
+
+class GeminiError(Exception):
+    """Error de configuración o respuesta de error de la API de Gemini"""
+
+class GeminiSaturadoError(Exception):
+    """No hay turno disponible para llamar al modelo (contrapresión)"""
+
+def _texto(datos: dict) -> str:
+    """Extrae el texto de una respuesta (o de un fragmento del stream) de generateContent"""
+    partes = []
+    for candidato in datos.get("candidates") or []:
+        for parte in (candidato.get("content") or {}).get("parts") or []:
+            partes.append(parte.get("text", ""))
+    return "".join(partes)
+
+def _detalle_error(response: httpx.Response) -> str:
+    try:
+        return response.json()["error"]["message"]
+    except Exception:
+        return response.text[:200]
+
+class ClienteGemini:
+    """Cliente HTTP de Gemini con límite de llamadas simultáneas"""
+
+    def __init__(self):
+        self._cliente = None
+        self._semaforo = asyncio.Semaphore(GEMINI_MAX_CONCURRENTES)
+        self.en_curso = 0
+        self.en_cola = 0
+        self.solicitudes = 0
+        self.completadas = 0
+        self.rechazadas = 0
+        self.errores = 0
+        self._espera_total_ms = 0.0
+        self._primer_token_total_ms = 0.0
+        self._primeros_tokens = 0
+        self._respuesta_total_ms = 0.0
+
+    def _crear_cliente(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=GEMINI_BASE_URL,
+            timeout=httpx.Timeout(GEMINI_TIMEOUT, connect=5),
+            limits=httpx.Limits(max_connections=GEMINI_MAX_CONCURRENTES, max_keepalive_connections=GEMINI_MAX_CONCURRENTES),
+        )
+
+    async def iniciar(self):
+        if self._cliente is None:
+            self._cliente = self._crear_cliente()
+
+    async def cerrar(self):
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._cliente is None:
+            self._cliente = self._crear_cliente()
+        return self._cliente
+
+    def _headers(self) -> dict:
+        key = os.getenv("GEMINI_API_KEY")
+        if not key:
+            raise GeminiError("GEMINI_API_KEY no configurada en variables de entorno")
+        return {"x-goog-api-key": key}
+
+    def _cuerpo(self, prompt: str, instrucciones: str = None) -> dict:
+        cuerpo = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if instrucciones:
+            cuerpo["systemInstruction"] = {"parts": [{"text": instrucciones}]}
+        return cuerpo
+
+    @asynccontextmanager
+    async def _turno(self):
+        """Espera un turno para llamar al modelo (o rechaza si la cola está llena o la espera es muy larga)"""
+        self.solicitudes += 1
+        if self.en_cola >= GEMINI_MAX_EN_COLA:
+            self.rechazadas += 1
+            raise GeminiSaturadoError()
+        inicio = time.perf_counter()
+        self.en_cola += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), GEMINI_ESPERA_MAX)
+        except asyncio.TimeoutError:
+            self.rechazadas += 1
+            raise GeminiSaturadoError()
+        finally:
+            self.en_cola -= 1
+        self._espera_total_ms += (time.perf_counter() - inicio) * 1000
+        self.en_curso += 1
+        try:
+            yield
+        finally:
+            self.en_curso -= 1
+            self._semaforo.release()
+
+    async def generar(self, prompt: str, instrucciones: str = None) -> str:
+        """Genera la respuesta completa"""
+        headers = self._headers()
+        async with self._turno():
+            inicio = time.perf_counter()
+            try:
+                response = await self._http().post(
+                    f"/v1beta/models/{GEMINI_MODELO}:generateContent",
+                    json=self._cuerpo(prompt, instrucciones),
+                    headers=headers,
+                )
+            except httpx.HTTPError as e:
+                self.errores += 1
+                raise GeminiError(f"Error al comunicarse con Gemini: {str(e)}")
+            if response.status_code != 200:
+                self.errores += 1
+                raise GeminiError(f"Error de Gemini ({response.status_code}): {_detalle_error(response)}")
+            self.completadas += 1
+            self._respuesta_total_ms += (time.perf_counter() - inicio) * 1000
+            return _texto(response.json()).strip()
+
+    async def generar_stream(self, prompt: str, instrucciones: str = None):
+        """Genera la respuesta por partes (Server-Sent Events de streamGenerateContent)"""
+        headers = self._headers()
+        async with self._turno():
+            inicio = time.perf_counter()
+            primer_token = True
+            try:
+                async with self._http().stream(
+                    "POST",
+                    f"/v1beta/models/{GEMINI_MODELO}:streamGenerateContent",
+                    params={"alt": "sse"},
+                    json=self._cuerpo(prompt, instrucciones),
+                    headers=headers,
+                ) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        self.errores += 1
+                        raise GeminiError(f"Error de Gemini ({response.status_code}): {_detalle_error(response)}")
+                    async for linea in response.aiter_lines():
+                        if not linea.startswith("data:"):
+                            continue
+                        texto = _texto(json.loads(linea[5:]))
+                        if not texto:
+                            continue
+                        if primer_token:
+                            primer_token = False
+                            self._primeros_tokens += 1
+                            self._primer_token_total_ms += (time.perf_counter() - inicio) * 1000
+                        yield texto
+            except httpx.HTTPError as e:
+                self.errores += 1
+                raise GeminiError(f"Error al comunicarse con Gemini: {str(e)}")
+            self.completadas += 1
+            self._respuesta_total_ms += (time.perf_counter() - inicio) * 1000
+
+    def estadisticas(self) -> dict:
+        atendidas = self.solicitudes - self.rechazadas
+        return {
+            "modelo": GEMINI_MODELO,
+            "max_concurrentes": GEMINI_MAX_CONCURRENTES,
+            "max_en_cola": GEMINI_MAX_EN_COLA,
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "solicitudes": self.solicitudes,
+            "completadas": self.completadas,
+            "rechazadas": self.rechazadas,
+            "errores": self.errores,
+            "espera_promedio_ms": round(self._espera_total_ms / atendidas, 1) if atendidas else 0.0,
+            "primer_token_promedio_ms": round(self._primer_token_total_ms / self._primeros_tokens, 1) if self._primeros_tokens else 0.0,
+            "respuesta_promedio_ms": round(self._respuesta_total_ms / self.completadas, 1) if self.completadas else 0.0,
+        }
+
+# Instancia única para toda la aplicación
+cliente_gemini = ClienteGemini()
@@ -0,0 +1,53 @@
+# Servidor falso de la API de Gemini para desarrollo y pruebas de carga del chatbot
+# Implementa generateContent y streamGenerateContent (SSE) con una latencia
+# configurable y responde repitiendo el mensaje recibido, sin consumir cuota.
+#
+# Uso:
+#   uvicorn config.gemini_falso:app --port 8100
+#   GEMINI_BASE_URL=http://localhost:8100 GEMINI_API_KEY=falsa uvicorn app:app
+
+import os
+import json
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+GEMINI_FALSO_LATENCIA_MS = float(os.getenv("GEMINI_FALSO_LATENCIA_MS", "500"))     # Antes del primer token
+GEMINI_FALSO_TOKEN_MS = float(os.getenv("GEMINI_FALSO_TOKEN_MS", "30"))            # Entre fragmentos del stream
+
+app = FastAPI()
+
+def _respuesta(cuerpo: dict) -> tuple:
+    """Texto de respuesta y cantidad aproximada de tokens del prompt (4 caracteres por token)"""
+    prompt = "".join(p.get("text", "") for c in cuerpo.get("contents", []) for p in c.get("parts", []))
+    instrucciones = "".join(p.get("text", "") for p in (cuerpo.get("systemInstruction") or {}).get("parts", []))
+    lineas = [l for l in prompt.splitlines() if l.startswith("Usuario:")] or prompt.strip().splitlines() or [""]
+    texto = f"<p>Respuesta de prueba a: {lineas[-1].removeprefix('Usuario:').strip()}</p>"
+    return texto, (len(prompt) + len(instrucciones)) // 4
+
+def _fragmento(texto: str, tokens_prompt: int = None) -> dict:
+    datos = {"candidates": [{"content": {"role": "model", "parts": [{"text": texto}]}}]}
+    if tokens_prompt is not None:
+        datos["usageMetadata"] = {"promptTokenCount": tokens_prompt}
+    return datos
+
+@app.post("/v1beta/models/{modelo}:generateContent")
+async def generate_content(modelo: str, request: Request):
+    texto, tokens_prompt = _respuesta(await request.json())
+    await asyncio.sleep(GEMINI_FALSO_LATENCIA_MS / 1000)
+    return _fragmento(texto, tokens_prompt)
+
+@app.post("/v1beta/models/{modelo}:streamGenerateContent")
+async def stream_generate_content(modelo: str, request: Request):
+    texto, tokens_prompt = _respuesta(await request.json())
+
+    async def eventos():
+        await asyncio.sleep(GEMINI_FALSO_LATENCIA_MS / 1000)
+        palabras = texto.split(" ")
+        for i, palabra in enumerate(palabras):
+            fragmento = palabra if i == len(palabras) - 1 else palabra + " "
+            yield f"data: {json.dumps(_fragmento(fragmento, tokens_prompt if i == 0 else None))}\r\n\r\n"
+            await asyncio.sleep(GEMINI_FALSO_TOKEN_MS / 1000)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream")
@@ -0,0 +1,252 @@
+# Clientes HTTP compartidos para las llamadas a las APIs externas
+# Se crea un cliente asíncrono por agencia al iniciar la aplicación y se reutiliza
+# durante toda su vida, de modo que las conexiones (y los handshakes TLS) se
+# mantienen abiertas entre solicitudes (keep-alive).
+# Todas las llamadas pasan por config.resiliencia (plazo, circuito, reintentos y
+# cobertura por agencia) dentro del compartimento de su agencia: una agencia lenta
+# solo puede ocupar AGENCIA_MAX_CONCURRENTES llamadas a la vez, y las que excedan
+# la cola se rechazan (AgenciaSaturadaError -> 503) sin afectar a las demás.
+# La latencia de cada llamada se registra en comun.metricas por agencia, y cada
+# llamada es un span de comun.trazas que propaga la traza a la agencia (traceparent).
+
+import os
+import time
+import httpx
+from contextlib import AsyncExitStack
+
+from config.cache import CACHE_ENABLED, CACHE_TTL_404, cache_respuestas, ttl_documento
+from config.coalescing import COALESCING_ENABLED, solicitudes_en_vuelo
+from config.resiliencia import resiliencia
+from config.compartimentos import Compartimento, CompartimentoLlenoError
+from comun.metricas import registrar_llamada_saliente
+from comun.trazas import span, headers_propagacion
+
+from config.apis import (
+    API_AACH, API_CARABINEROS, API_MTT, API_PRT, API_SII, API_SGD, API_TGR, API_SRCEI,
+    TIMEOUT_AACH, TIMEOUT_CARABINEROS, TIMEOUT_MTT, TIMEOUT_PRT, TIMEOUT_SII,
+    TIMEOUT_SGD, TIMEOUT_TGR, TIMEOUT_SRCEI
+)
+
+# ============================================================
+# HTTP/2
+# ============================================================
+# HTTP/2 requiere el paquete "h2" (httpx[http2]). Si no está instalado se usa HTTP/1.1
+try:
+    import h2  # noqa: F401
+    HTTP2_DISPONIBLE = True
+except ImportError:
+    HTTP2_DISPONIBLE = False
+
+HTTP2 = os.getenv("HTTP2", "true").lower() == "true" and HTTP2_DISPONIBLE
+
+# ============================================================
+# LÍMITES DEL POOL DE CONEXIONES
+# ============================================================
+# Valores globales, pueden sobrescribirse por agencia con el sufijo de la agencia
+# (ej: HTTP_MAX_CONNECTIONS_TGR=100)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+
+# Agencias disponibles: nombre -> (URL base, timeout en segundos)
+AGENCIAS = {
+    "AACH": (API_AACH, TIMEOUT_AACH),
+    "CARABINEROS": (API_CARABINEROS, TIMEOUT_CARABINEROS),
+    "MTT": (API_MTT, TIMEOUT_MTT),
+    "PRT": (API_PRT, TIMEOUT_PRT),
+    "SII": (API_SII, TIMEOUT_SII),
+    "SGD": (API_SGD, TIMEOUT_SGD),
+    "TGR": (API_TGR, TIMEOUT_TGR),
+    "SRCEI": (API_SRCEI, TIMEOUT_SRCEI),
+}
+
+def _config_agencia(nombre: str, variable: str, por_defecto, tipo=int):
+    """Lee la configuración específica de una agencia o usa el valor global"""
+    return tipo(os.getenv(f"{variable}_{nombre}", por_defecto))
+
+# ============================================================
+# COMPARTIMENTOS POR AGENCIA
+# ============================================================
+# Llamadas simultáneas, en espera y segundos de espera máxima por agencia
+# (sobrescribibles por agencia, ej: AGENCIA_MAX_CONCURRENTES_SRCEI=16)
+AGENCIA_MAX_CONCURRENTES = int(os.getenv("AGENCIA_MAX_CONCURRENTES", "32"))
+AGENCIA_MAX_EN_COLA = int(os.getenv("AGENCIA_MAX_EN_COLA", "64"))
+AGENCIA_ESPERA_MAX = float(os.getenv("AGENCIA_ESPERA_MAX", "1"))
+
+class AgenciaSaturadaError(CompartimentoLlenoError, httpx.TransportError):
+    """El compartimento de la agencia está lleno (se trata como un error de transporte)"""
+
+def _plazo(kwargs: dict):
+    """Timeout explícito de una llamada (ej: timeout=30.0), que extiende el plazo de la agencia"""
+    timeout = kwargs.get("timeout")
+    return timeout if isinstance(timeout, (int, float)) else None
+
+def _url_clave(url: str, params=None) -> str:
+    """
+    URL que identifica una solicitud en la caché y en la agrupación: incluye los
+    parámetros de consulta (ordenados), así dos llamadas con distintos "params" no
+    comparten la respuesta.
+    """
+    if not params:
+        return url
+    return str(httpx.URL(url).copy_merge_params(sorted(httpx.QueryParams(params).multi_items())))
+
+async def _propagar_traza(request: httpx.Request):
+    """Agrega el header traceparent del span de la llamada a cada intento enviado a la agencia"""
+    request.headers.update(headers_propagacion())
+
+class ClientesHTTP:
+    """Conjunto de clientes httpx.AsyncClient, uno por agencia"""
+
+    def __init__(self):
+        self._clientes = {}
+        self.compartimentos = {
+            nombre: Compartimento(
+                nombre,
+                _config_agencia(nombre, "AGENCIA_MAX_CONCURRENTES", AGENCIA_MAX_CONCURRENTES),
+                _config_agencia(nombre, "AGENCIA_MAX_EN_COLA", AGENCIA_MAX_EN_COLA),
+                _config_agencia(nombre, "AGENCIA_ESPERA_MAX", AGENCIA_ESPERA_MAX, float),
+            )
+            for nombre in AGENCIAS
+        }
+
+    def _crear_cliente(self, nombre: str) -> httpx.AsyncClient:
+        base_url, timeout = AGENCIAS[nombre]
+        limites = httpx.Limits(
+            max_connections=_config_agencia(nombre, "HTTP_MAX_CONNECTIONS", HTTP_MAX_CONNECTIONS),
+            max_keepalive_connections=_config_agencia(nombre, "HTTP_MAX_KEEPALIVE", HTTP_MAX_KEEPALIVE),
+            keepalive_expiry=_config_agencia(nombre, "HTTP_KEEPALIVE_EXPIRY", HTTP_KEEPALIVE_EXPIRY, float),
+        )
+        return httpx.AsyncClient(
+            base_url=base_url,
+            limits=limites,
+            timeout=httpx.Timeout(timeout, connect=min(HTTP_CONNECT_TIMEOUT, timeout)),
+            http2=HTTP2,
+            event_hooks={"request": [_propagar_traza]},
+        )
+
+    async def iniciar(self):
+        """Crea los clientes de todas las agencias (se llama al iniciar la app)"""
+        for nombre in AGENCIAS:
+            if nombre not in self._clientes:
+                self._clientes[nombre] = self._crear_cliente(nombre)
+
+    async def cerrar(self):
+        """Cierra todas las conexiones abiertas (se llama al detener la app)"""
+        for cliente in self._clientes.values():
+            await cliente.aclose()
+        self._clientes = {}
+
+    def cliente(self, agencia: str) -> httpx.AsyncClient:
+        """Retorna el cliente de una agencia, creándolo si aún no existe"""
+        agencia = agencia.upper()
+        if agencia not in AGENCIAS:
+            raise ValueError(f"Agencia desconocida: {agencia}")
+        if agencia not in self._clientes:
+            self._clientes[agencia] = self._crear_cliente(agencia)
+        return self._clientes[agencia]
+
+    async def _en_compartimento(self, agencia: str, metodo: str, url: str, funcion, idempotente: bool, plazo):
+        """Ejecuta la llamada con resiliencia dentro del compartimento de la agencia"""
+        with span(f"{metodo} {agencia}", "cliente", agencia=agencia, **{"http.url": str(url)}) as llamada:
+            async with AsyncExitStack() as pila:
+                # Solo el rechazo al tomar el turno es saturación; los errores de la
+                # llamada salen tal cual (y el turno se libera con su información)
+                try:
+                    await pila.enter_async_context(self.compartimentos[agencia].turno())
+                except CompartimentoLlenoError:
+                    raise AgenciaSaturadaError(f"Agencia {agencia} saturada")
+                response = await self._medir(agencia, funcion, idempotente, plazo)
+            if llamada is not None:
+                llamada.atributos["http.status_code"] = response.status_code
+            return response
+
+    async def _medir(self, agencia: str, funcion, idempotente: bool, plazo):
+        """Ejecuta la llamada registrando su latencia"""
+        inicio = time.perf_counter()
+        status = "error"
+        try:
+            response = await resiliencia.ejecutar(agencia, funcion, idempotente=idempotente, plazo=plazo)
+            status = response.status_code
+            return response
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            registrar_llamada_saliente(agencia, status, time.perf_counter() - inicio)
+
+    def estadisticas_compartimentos(self) -> dict:
+        return {nombre: c.estadisticas() for nombre, c in self.compartimentos.items()}
+
+    async def get(self, agencia: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Realiza un GET a una agencia. "url" puede ser relativa a la URL base de la
+        agencia o una URL completa de config.apis (ej: PERMISO_CIRCULACION).
+        Es idempotente: se puede reintentar y cubrir con una segunda solicitud.
+        """
+        agencia = agencia.upper()
+        cliente = self.cliente(agencia)
+        return await self._en_compartimento(agencia, "GET", url, lambda: cliente.get(url, **kwargs), True, _plazo(kwargs))
+
+    async def get_agrupado(self, agencia: str, url: str, params=None) -> httpx.Response:
+        """
+        GET que agrupa las solicitudes idénticas en curso (config.coalescing): si ya
+        hay una solicitud a la misma URL y parámetros de la agencia, se espera su
+        respuesta en vez de enviar otra. Solo acepta "params": los headers o un
+        timeout propio cambiarían la respuesta compartida (para eso usar get).
+        """
+        agencia = agencia.upper()
+        if not COALESCING_ENABLED:
+            return await self.get(agencia, url, params=params)
+        clave = (agencia, _url_clave(url, params))
+        return await solicitudes_en_vuelo.ejecutar(clave, lambda: self.get(agencia, url, params=params))
+
+    async def get_cacheado(self, agencia: str, url: str, documento: str = None, params=None) -> httpx.Response:
+        """
+        GET que pasa por la caché de respuestas (config.cache). Se guardan las
+        respuestas 200 (con TTL según "documento": permiso, soap, revision, o el TTL
+        de la agencia) y las 404 (caché negativa). Los demás errores no se guardan.
+        Si no está en caché, la solicitud se agrupa con las idénticas en curso. La
+        clave es la URL con sus parámetros; como en get_agrupado, solo acepta "params".
+        """
+        agencia = agencia.upper()
+        if not CACHE_ENABLED:
+            return await self.get_agrupado(agencia, url, params=params)
+
+        url_clave = _url_clave(url, params)
+        guardada = cache_respuestas.obtener(agencia, url_clave)
+        if guardada is not None:
+            status_code, content, content_type = guardada
+            return httpx.Response(
+                status_code,
+                content=content,
+                headers={"content-type": content_type, "x-cache": "HIT"},
+                request=httpx.Request("GET", url_clave),
+            )
+
+        response = await self.get_agrupado(agencia, url, params=params)
+        if response.status_code in (200, 404):
+            if response.status_code == 200:
+                try:
+                    ttl = ttl_documento(agencia, documento, response.json())
+                except ValueError:
+                    ttl = 0  # Respuesta que no es JSON: no se guarda
+            else:
+                ttl = CACHE_TTL_404
+            valor = (response.status_code, response.content, response.headers.get("content-type", "application/json"))
+            cache_respuestas.guardar(agencia, url_clave, valor, ttl)
+        return response
+
+    async def post(self, agencia: str, url: str, **kwargs) -> httpx.Response:
+        """Realiza un POST a una agencia (solo se reintenta si no alcanzó a enviarse)"""
+        agencia = agencia.upper()
+        cliente = self.cliente(agencia)
+        return await self._en_compartimento(agencia, "POST", url, lambda: cliente.post(url, **kwargs), False, _plazo(kwargs))
+
+# Instancia única para toda la aplicación
+clientes_http = ClientesHTTP()
+
+# Dependencia para inyectar los clientes en los routers
+def get_clientes_http() -> ClientesHTTP:
+    return clientes_http
@@ -0,0 +1,195 @@
+# Memoria de conversación del chatbot por sesión
+# Cada conversación guarda sus últimos CHATBOT_MEMORIA_TURNOS turnos completos;
+# los turnos más antiguos se compactan en un resumen de largo acotado (pregunta
+# y primera oración de la respuesta, sin HTML). Así el prompt no crece aunque la
+# conversación sea larga.
+#
+# Backends:
+# - MemoriaLocal (por defecto): en memoria del proceso, con expiración de las
+#   sesiones inactivas y expulsión LRU cuando se supera el tamaño total.
+# - MemoriaRedis: si se define CHATBOT_MEMORIA_REDIS_URL (requiere el paquete
+#   "redis"), para que todas las réplicas del backend vean el mismo historial.
+#   La expiración la maneja Redis (EXPIRE) y el tamaño total la política
+#   maxmemory (allkeys-lru) del servidor.
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+try:
+    import redis.asyncio as redis
+    REDIS_DISPONIBLE = True
+except ImportError:
+    REDIS_DISPONIBLE = False
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+CHATBOT_MEMORIA_TURNOS = int(os.getenv("CHATBOT_MEMORIA_TURNOS", "4"))                 # Turnos completos por sesión
+CHATBOT_MEMORIA_RESPUESTA_MAX = int(os.getenv("CHATBOT_MEMORIA_RESPUESTA_MAX", "600"))  # Caracteres guardados por respuesta
+CHATBOT_MEMORIA_RESUMEN_MAX = int(os.getenv("CHATBOT_MEMORIA_RESUMEN_MAX", "800"))      # Caracteres del resumen
+CHATBOT_MEMORIA_TTL = float(os.getenv("CHATBOT_MEMORIA_TTL", "1800"))                   # Expiración por inactividad (segundos)
+CHATBOT_MEMORIA_MAX_BYTES = int(os.getenv("CHATBOT_MEMORIA_MAX_BYTES", str(32 * 1024 * 1024)))
+CHATBOT_MEMORIA_REDIS_URL = os.getenv("CHATBOT_MEMORIA_REDIS_URL")
+
+# Identificadores de sesión válidos (ej: UUID generado por el portal)
+SESION_VALIDA = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+def _sin_html(texto: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"<[^>]+>", " ", texto)).strip()
+
+def _recortar(texto: str, largo: int) -> str:
+    return texto if len(texto) <= largo else texto[:largo - 1].rstrip() + "…"
+
+def _primera_oracion(texto: str) -> str:
+    return re.split(r"(?<=[.!?])\s", texto, maxsplit=1)[0]
+
+def nueva_conversacion() -> dict:
+    return {"resumen": "", "turnos": []}
+
+def agregar_turno(conversacion: dict, usuario: str, asistente: str) -> dict:
+    """Agrega un turno y compacta los más antiguos en el resumen"""
+    conversacion["turnos"].append([
+        _recortar(usuario.strip(), CHATBOT_MEMORIA_RESPUESTA_MAX),
+        _recortar(_sin_html(asistente), CHATBOT_MEMORIA_RESPUESTA_MAX),
+    ])
+    while len(conversacion["turnos"]) > CHATBOT_MEMORIA_TURNOS:
+        usuario_anterior, asistente_anterior = conversacion["turnos"].pop(0)
+        linea = f"- El usuario preguntó: {_recortar(usuario_anterior, 150)} / Se respondió: {_recortar(_primera_oracion(asistente_anterior), 150)}"
+        resumen = f"{conversacion['resumen']}\n{linea}".strip()
+        # Se conservan las líneas más recientes que caben en el resumen
+        while len(resumen) > CHATBOT_MEMORIA_RESUMEN_MAX and "\n" in resumen:
+            resumen = resumen.split("\n", 1)[1]
+        conversacion["resumen"] = _recortar(resumen, CHATBOT_MEMORIA_RESUMEN_MAX)
+    return conversacion
+
+def _tamano(conversacion: dict) -> int:
+    return len(json.dumps(conversacion, ensure_ascii=False).encode())
+
+class MemoriaLocal:
+    """Conversaciones en memoria del proceso (LRU acotada por tamaño total y expiración por inactividad)"""
+
+    backend = "local"
+
+    def __init__(self, max_bytes: int = CHATBOT_MEMORIA_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._sesiones = OrderedDict()   # sesion_id -> (último uso, tamaño, conversación)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.expiradas = 0
+        self.expulsadas = 0
+
+    def _eliminar(self, sesion_id: str):
+        _, tamano, _ = self._sesiones.pop(sesion_id)
+        self._bytes -= tamano
+
+    async def obtener(self, sesion_id: str) -> dict:
+        with self._lock:
+            entrada = self._sesiones.get(sesion_id)
+            if entrada is None:
+                return nueva_conversacion()
+            if time.monotonic() - entrada[0] > CHATBOT_MEMORIA_TTL:
+                self._eliminar(sesion_id)
+                self.expiradas += 1
+                return nueva_conversacion()
+            return json.loads(json.dumps(entrada[2]))
+
+    async def agregar(self, sesion_id: str, usuario: str, asistente: str):
+        with self._lock:
+            entrada = self._sesiones.get(sesion_id)
+            conversacion = entrada[2] if entrada and time.monotonic() - entrada[0] <= CHATBOT_MEMORIA_TTL else nueva_conversacion()
+            if entrada:
+                self._eliminar(sesion_id)
+            agregar_turno(conversacion, usuario, asistente)
+            tamano = _tamano(conversacion)
+            self._sesiones[sesion_id] = (time.monotonic(), tamano, conversacion)
+            self._bytes += tamano
+            # Expulsar las sesiones usadas hace más tiempo hasta volver al límite
+            while self._bytes > self.max_bytes and len(self._sesiones) > 1:
+                self._eliminar(next(iter(self._sesiones)))
+                self.expulsadas += 1
+
+    async def eliminar(self, sesion_id: str):
+        with self._lock:
+            if sesion_id in self._sesiones:
+                self._eliminar(sesion_id)
+
+    def purgar(self):
+        """Elimina las sesiones inactivas (las más antiguas están al inicio)"""
+        with self._lock:
+            limite = time.monotonic() - CHATBOT_MEMORIA_TTL
+            while self._sesiones and next(iter(self._sesiones.values()))[0] < limite:
+                self._eliminar(next(iter(self._sesiones)))
+                self.expiradas += 1
+
+    async def cerrar(self):
+        pass
+
+    async def estadisticas(self) -> dict:
+        self.purgar()
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "sesiones": len(self._sesiones),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "expiradas": self.expiradas,
+                "expulsadas": self.expulsadas,
+            }
+
+class MemoriaRedis:
+    """Conversaciones en Redis, compartidas por todas las réplicas del backend"""
+
+    backend = "redis"
+    PREFIJO = "chatbot:sesion:"
+
+    def __init__(self, url: str):
+        self._redis = redis.from_url(url)
+        self.errores = 0
+
+    async def obtener(self, sesion_id: str) -> dict:
+        try:
+            datos = await self._redis.get(self.PREFIJO + sesion_id)
+        except Exception as e:
+            # Sin Redis el chatbot sigue funcionando, solo que sin historial
+            self.errores += 1
+            logger.error(f"Error leyendo la memoria del chatbot: {str(e)}")
+            return nueva_conversacion()
+        return json.loads(datos) if datos else nueva_conversacion()
+
+    async def agregar(self, sesion_id: str, usuario: str, asistente: str):
+        conversacion = agregar_turno(await self.obtener(sesion_id), usuario, asistente)
+        try:
+            await self._redis.set(self.PREFIJO + sesion_id, json.dumps(conversacion, ensure_ascii=False), ex=int(CHATBOT_MEMORIA_TTL))
+        except Exception as e:
+            self.errores += 1
+            logger.error(f"Error guardando la memoria del chatbot: {str(e)}")
+
+    async def eliminar(self, sesion_id: str):
+        try:
+            await self._redis.delete(self.PREFIJO + sesion_id)
+        except Exception as e:
+            self.errores += 1
+            logger.error(f"Error eliminando la memoria del chatbot: {str(e)}")
+
+    async def cerrar(self):
+        await self._redis.aclose()
+
+    async def estadisticas(self) -> dict:
+        return {"backend": self.backend, "errores": self.errores}
+
+def _crear_memoria():
+    if CHATBOT_MEMORIA_REDIS_URL:
+        if REDIS_DISPONIBLE:
+            return MemoriaRedis(CHATBOT_MEMORIA_REDIS_URL)
+        logger.warning("CHATBOT_MEMORIA_REDIS_URL definida pero el paquete redis no está instalado; se usa memoria local")
+    return MemoriaLocal()
+
+# Instancia única para toda la aplicación
+memoria_chatbot = _crear_memoria()
@@ -0,0 +1,154 @@
+# Migraciones versionadas del esquema del backend (back_db)
+# create_all (config.database.create_tables) solo crea las tablas que no existen;
+# los cambios sobre tablas ya creadas (ej: nuevos índices) se registran aquí con un
+# número de versión. Las versiones aplicadas quedan en la tabla schema_migrations
+# y cada una se aplica una sola vez, en orden, al iniciar la app.
+# En MySQL las migraciones se aplican con un lock con nombre (GET_LOCK): si varias
+# réplicas inician a la vez, una aplica las pendientes y las demás esperan y luego
+# no encuentran nada pendiente.
+
+import os
+from datetime import datetime
+from collections import defaultdict
+
+from sqlalchemy import Column, Integer, String, DateTime, Index, Table, inspect, text
+
+from config.database import Base, engine
+from config import models
+from config.rollups import reconstruir_rollups
+from comun.autenticacion import normalizar_rut
+
+MIGRACIONES_LOCK = "back_db_migraciones"
+MIGRACIONES_LOCK_TIMEOUT = int(os.getenv("MIGRACIONES_LOCK_TIMEOUT", "600"))   # Segundos esperando a otra réplica
+
+# Registro de versiones aplicadas
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("descripcion", String(200), nullable=False),
+    Column("fecha_aplicacion", DateTime, nullable=False),
+)
+
+def _indices(modelo, *nombres):
+    return [indice for indice in modelo.__table__.indexes if indice.name in nombres]
+
+def _columna(modelo, nombre):
+    """Operación que agrega una columna del modelo a la tabla si aún no existe"""
+    tabla = modelo.__table__
+    columna = tabla.c[nombre]
+
+    def agregar():
+        existentes = {c["name"] for c in inspect(engine).get_columns(tabla.name)}
+        if nombre in existentes:
+            return
+        tipo = columna.type.compile(dialect=engine.dialect)
+        nulo = "NULL" if columna.nullable else "NOT NULL"
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {nombre} {tipo} {nulo}"))
+    return agregar
+
+def _normalizar_rut_admins():
+    """
+    Lleva el RUT de los administradores al formato de normalizar_rut (el mismo que
+    usa login_admin al buscar). Si varias filas quedan con el mismo RUT no se
+    modifica ninguna de ellas (la columna es única): se informan para resolverlas
+    a mano y el resto se normaliza igual.
+    """
+    with engine.begin() as conn:
+        filas = conn.execute(text("SELECT id, rut FROM usuarios_admin")).all()
+        por_rut = defaultdict(list)
+        for id, rut in filas:
+            por_rut[normalizar_rut(rut)].append((id, rut))
+        for normalizado, grupo in por_rut.items():
+            if len(grupo) > 1:
+                print(f"RUT de administradores en conflicto, no se normalizan (ids {', '.join(str(id) for id, _ in grupo)} -> {normalizado})")
+                continue
+            id, rut = grupo[0]
+            if rut != normalizado:
+                conn.execute(text("UPDATE usuarios_admin SET rut = :rut WHERE id = :id"), {"rut": normalizado, "id": id})
+
+# ============================================================
+# MIGRACIONES
+# ============================================================
+# (versión, descripción, operaciones). Cada operación es un Index de los modelos
+# (se crea solo si no existe), una sentencia SQL o una función sin argumentos
+# (ej: carga de datos o _columna) que maneja su propia conexión. Las operaciones
+# se ejecutan en orden.
+MIGRACIONES = [
+    (1, "Índices para métricas por rango de fecha y joins contra permiso_circulacion", [
+        *_indices(models.LogFiscalizacion, "idx_log_fiscalizacion_fecha"),
+        *_indices(models.LogConsultaPropietario, "idx_log_consultas_fecha_rut"),
+        *_indices(models.PermisoCirculacion, "idx_permiso_fecha_emision_valor", "idx_permiso_ppu_rut", "idx_permiso_rut"),
+    ]),
+    (2, "Carga inicial de los rollups del panel de decisiones", [
+        reconstruir_rollups,
+    ]),
+    (3, "Identificador visible para el cliente (UUID) en los logs", [
+        _columna(models.LogFiscalizacion, "id_cliente"),
+        _columna(models.LogConsultaPropietario, "id_cliente"),
+        *_indices(models.LogFiscalizacion, "uq_log_fiscalizacion_id_cliente"),
+        *_indices(models.LogConsultaPropietario, "uq_log_consultas_id_cliente"),
+    ]),
+    (4, "Índices para la paginación por (fecha, id) de los navegadores de logs", [
+        *_indices(models.LogFiscalizacion, "idx_log_fiscalizacion_fecha_id", "idx_log_fiscalizacion_ppu_fecha",
+                  "idx_log_fiscalizacion_fiscalizador_fecha"),
+        *_indices(models.LogConsultaPropietario, "idx_log_consultas_fecha_id", "idx_log_consultas_rut_fecha",
+                  "idx_log_consultas_ppu_fecha"),
+        *_indices(models.PermisoCirculacion, "idx_permiso_fecha_emision_id"),
+    ]),
+    (5, "RUT de los administradores en formato normalizado (login por la columna única)", [
+        _normalizar_rut_admins,
+    ]),
+    (6, "Rollups solo diarios (meses y años se agrupan al consultar)", [
+        "DELETE FROM rollup_fiscalizacion WHERE tipo_periodo <> 'DIA'",
+        "DELETE FROM rollup_consultas WHERE tipo_periodo <> 'DIA'",
+        "DELETE FROM rollup_consultas_rut WHERE tipo_periodo <> 'DIA'",
+        "DELETE FROM rollup_permisos WHERE tipo_periodo <> 'DIA'",
+    ]),
+]
+
+def _aplicar(conn, operacion):
+    if isinstance(operacion, Index):
+        operacion.create(conn, checkfirst=True)
+    else:
+        conn.execute(text(operacion))
+
+def _aplicar_pendientes():
+    with engine.connect() as conn:
+        aplicadas = set(conn.execute(schema_migrations.select().with_only_columns(schema_migrations.c.version)).scalars())
+    for version, descripcion, operaciones in MIGRACIONES:
+        if version in aplicadas:
+            continue
+        for operacion in operaciones:
+            if callable(operacion):
+                operacion()
+            else:
+                with engine.begin() as conn:
+                    _aplicar(conn, operacion)
+        with engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(
+                version=version, descripcion=descripcion, fecha_aplicacion=datetime.now()
+            ))
+        print(f"Migración {version} aplicada: {descripcion}")
+
+def aplicar_migraciones():
+    """Aplica las migraciones pendientes (no detiene la app si la base de datos no está disponible)"""
+    try:
+        schema_migrations.create(engine, checkfirst=True)
+        if engine.dialect.name != "mysql":
+            _aplicar_pendientes()
+            return
+        # El lock pertenece a la conexión: se mantiene abierta mientras se aplican
+        with engine.connect() as lock:
+            obtenido = lock.execute(text("SELECT GET_LOCK(:nombre, :espera)"),
+                                    {"nombre": MIGRACIONES_LOCK, "espera": MIGRACIONES_LOCK_TIMEOUT}).scalar()
+            if obtenido != 1:
+                print(f"Error aplicando migraciones: otra réplica las está aplicando (esperado {MIGRACIONES_LOCK_TIMEOUT} s)")
+                return
+            try:
+                _aplicar_pendientes()
+            finally:
+                lock.execute(text("SELECT RELEASE_LOCK(:nombre)"), {"nombre": MIGRACIONES_LOCK})
+    except Exception as e:
+        print(f"Error aplicando migraciones: {e}")
@@ -0,0 +1,156 @@
+# Modelos SQLAlchemy de todas las tablas del backend (back_db)
+
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Boolean, Index
+
+from config.database import Base
+
+# Log consultas fiscalización
+class LogFiscalizacion(Base):
+    __tablename__ = "log_fiscalizacion"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ppu = Column(String(10), nullable=False)
+    rut_fiscalizador = Column(String(12), nullable=False)
+    fecha = Column(DateTime, nullable=False)
+    vigencia_permiso = Column(Boolean, nullable=False)
+    vigencia_revision = Column(Boolean, nullable=False)
+    vigencia_soap = Column(Boolean, nullable=False)
+    encargo_robo = Column(Boolean, nullable=False)
+    multas = Column(Boolean, nullable=False)
+    id_cliente = Column(String(36), nullable=True)   # UUID entregado al cliente (escritura diferida)
+
+    __table_args__ = (
+        # Cubre las métricas por rango de fecha (contadores por período sin leer la tabla)
+        Index("idx_log_fiscalizacion_fecha", "fecha", "vigencia_permiso", "vigencia_revision",
+              "vigencia_soap", "encargo_robo"),
+        Index("uq_log_fiscalizacion_id_cliente", "id_cliente", unique=True),
+        # Paginación por (fecha, id) en el navegador de logs, sin filtro o por PPU / fiscalizador
+        Index("idx_log_fiscalizacion_fecha_id", "fecha", "id"),
+        Index("idx_log_fiscalizacion_ppu_fecha", "ppu", "fecha", "id"),
+        Index("idx_log_fiscalizacion_fiscalizador_fecha", "rut_fiscalizador", "fecha", "id"),
+    )
+
+# Log consultas propietarios
+class LogConsultaPropietario(Base):
+    __tablename__ = "log_consultas_propietarios"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    rut = Column(String(12), nullable=False)
+    ppu = Column(String(10), nullable=False)
+    fecha = Column(DateTime, nullable=False)
+    id_cliente = Column(String(36), nullable=True)   # UUID entregado al cliente (escritura diferida)
+
+    __table_args__ = (
+        # Cubre las métricas por rango de fecha (consultas y usuarios únicos por período)
+        Index("idx_log_consultas_fecha_rut", "fecha", "rut"),
+        Index("uq_log_consultas_id_cliente", "id_cliente", unique=True),
+        # Paginación por (fecha, id) en el navegador de logs, sin filtro o por RUT / PPU
+        Index("idx_log_consultas_fecha_id", "fecha", "id"),
+        Index("idx_log_consultas_rut_fecha", "rut", "fecha", "id"),
+        Index("idx_log_consultas_ppu_fecha", "ppu", "fecha", "id"),
+    )
+
+# Permiso de circulación
+class PermisoCirculacion(Base):
+    __tablename__ = "permiso_circulacion"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ppu = Column(String(10), nullable=False)
+    rut = Column(String(12), nullable=False)
+    nombre = Column(String(100), nullable=False)
+    fecha_emision = Column(Date, nullable=False)
+    fecha_expiracion = Column(Date, nullable=False)
+    valor_permiso = Column(Integer, nullable=False)
+    motor = Column(Integer, nullable=False)
+    chasis = Column(String(50), nullable=False)
+    tipo_vehiculo = Column(String(50), nullable=False)
+    color = Column(String(50), nullable=False)
+    marca = Column(String(50), nullable=False)
+    modelo = Column(String(50), nullable=False)
+    anio = Column(Integer, nullable=False)
+    carga = Column(Integer, nullable=False)
+    tipo_sello = Column(String(50), nullable=False)
+    combustible = Column(String(50), nullable=False)
+    cilindrada = Column(Integer, nullable=False)
+    transmision = Column(String(50), nullable=False)
+    pts = Column(Integer, nullable=False)
+    ast = Column(Integer, nullable=False)
+    equipamiento = Column(String(100), nullable=False)
+    codigo_sii = Column(String(20), nullable=False)
+    tasacion = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Cubre las métricas por rango de fecha de emisión (cantidad y recaudación)
+        Index("idx_permiso_fecha_emision_valor", "fecha_emision", "valor_permiso"),
+        # Joins de los logs contra permiso_circulacion (por ppu y por ppu + rut)
+        Index("idx_permiso_ppu_rut", "ppu", "rut"),
+        Index("idx_permiso_rut", "rut"),
+        # Paginación por (fecha_emision, id) en el navegador de permisos obtenidos
+        Index("idx_permiso_fecha_emision_id", "fecha_emision", "id"),
+    )
+
+# Usuarios administradores
+class UsuarioAdminModel(Base):
+    __tablename__ = "usuarios_admin"
+    id = Column(Integer, primary_key=True, index=True)
+    rut = Column(String(12), unique=True, nullable=False)
+    nombre = Column(String(100), nullable=False)
+    email = Column(String(100), unique=True, nullable=False)
+    password = Column(String(255), nullable=False)
+
+# Mis Vehículos Guardados
+class MisVehiculos(Base):
+    __tablename__ = "mis_vehiculos"
+    id = Column(Integer, primary_key=True, index=True)
+    rut = Column(String(12), nullable=False)
+    ppu = Column(String(10), nullable=False)
+    nombre_vehiculo = Column(String(100), nullable=False)
+    fecha_agregado = Column(DateTime, nullable=False)
+
+# Mis Permisos Emitidos
+class MisPermisosEmitidos(Base):
+    __tablename__ = "mis_permisos_emitidos"
+    id = Column(Integer, primary_key=True, index=True)
+    rut = Column(String(12), nullable=False)
+    ppu = Column(String(10), nullable=False)
+    fecha_pago = Column(DateTime, nullable=False)
+    id_permiso = Column(Integer, nullable=False)
+    monto_pago = Column(Integer, nullable=False)
+    tarjeta = Column(String(16), nullable=False)
+    cuotas = Column(Integer, nullable=True)
+    cuota_pagada = Column(Integer, nullable=True)
+
+#####################################################
+# Tablas de agregados (rollups) del panel de decisiones
+#####################################################
+# Contadores por período ("DIA": YYYY-MM-DD, "MES": YYYY-MM, "AÑO": YYYY),
+# mantenidos por config.rollups al registrar logs y permisos.
+
+# Fiscalizaciones por período
+class RollupFiscalizacion(Base):
+    __tablename__ = "rollup_fiscalizacion"
+    tipo_periodo = Column(String(4), primary_key=True)
+    periodo = Column(String(10), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    al_dia = Column(Integer, nullable=False, default=0)
+    con_problemas = Column(Integer, nullable=False, default=0)
+
+# Consultas de propietarios por período
+class RollupConsultas(Base):
+    __tablename__ = "rollup_consultas"
+    tipo_periodo = Column(String(4), primary_key=True)
+    periodo = Column(String(10), primary_key=True)
+    consultas = Column(Integer, nullable=False, default=0)
+    usuarios_unicos = Column(Integer, nullable=False, default=0)
+
+# RUTs que consultaron en cada período (para contar usuarios únicos)
+class RollupConsultasRut(Base):
+    __tablename__ = "rollup_consultas_rut"
+    tipo_periodo = Column(String(4), primary_key=True)
+    periodo = Column(String(10), primary_key=True)
+    rut = Column(String(12), primary_key=True)
+
+# Permisos emitidos y recaudación por período
+class RollupPermisos(Base):
+    __tablename__ = "rollup_permisos"
+    tipo_periodo = Column(String(4), primary_key=True)
+    periodo = Column(String(10), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    recaudacion = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,119 @@
+# Paginación por llave (keyset / seek) para los navegadores de logs
+# Con OFFSET la base de datos recorre y descarta todas las filas anteriores, así
+# que las páginas profundas son cada vez más lentas. Aquí cada página continúa
+# desde la última fila entregada (fecha, id): la consulta siempre parte con una
+# búsqueda en el índice y cuesta lo mismo en la página 1 que en la 10.000.
+# El cursor es opaco para el cliente (base64) e incluye una huella de los filtros
+# con que se generó, de modo que no se puede reutilizar con otros filtros.
+
+import os
+import json
+import base64
+import hashlib
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import select, func, and_, or_, literal_column, Date, DateTime
+from sqlalchemy.orm import Session
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+LOGS_PAGINA_DEFECTO = int(os.getenv("LOGS_PAGINA_DEFECTO", "50"))
+LOGS_PAGINA_MAX = int(os.getenv("LOGS_PAGINA_MAX", "500"))
+# Fuera de MySQL el total aproximado es un conteo con tope
+LOGS_CONTEO_MAX = int(os.getenv("LOGS_CONTEO_MAX", "10000"))
+
+class TotalAproximadoModel(BaseModel):
+    total: int
+    aproximado: bool
+
+def _es_fecha(columna) -> bool:
+    return isinstance(columna.type, Date) and not isinstance(columna.type, DateTime)
+
+def filtro_rango(columna, from_date: str = None, to_date: str = None) -> list:
+    """Condiciones del rango semiabierto [from_date, to_date + 1 día) sobre la columna"""
+    condiciones = []
+    try:
+        desde = datetime.strptime(from_date.strip(), "%Y-%m-%d") if from_date else None
+        hasta = datetime.strptime(to_date.strip(), "%Y-%m-%d") + timedelta(days=1) if to_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    if desde and hasta and desde >= hasta:
+        raise HTTPException(status_code=400, detail="La fecha de inicio no puede ser mayor que la fecha de fin")
+    if desde:
+        condiciones.append(columna >= (desde.date() if _es_fecha(columna) else desde))
+    if hasta:
+        condiciones.append(columna < (hasta.date() if _es_fecha(columna) else hasta))
+    return condiciones
+
+def _huella(filtros: dict) -> str:
+    return hashlib.sha256(json.dumps(filtros, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _codificar_cursor(fecha, id: int, huella: str) -> str:
+    datos = json.dumps({"f": fecha.isoformat(), "i": id, "h": huella}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+def _decodificar_cursor(cursor: str, columna_fecha, huella: str):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        fecha = (date if _es_fecha(columna_fecha) else datetime).fromisoformat(datos["f"])
+        id = int(datos["i"])
+        huella_cursor = datos["h"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if huella_cursor != huella:
+        raise HTTPException(status_code=400, detail="El cursor no corresponde a los filtros de la consulta")
+    return fecha, id
+
+def _total_aproximado(db: Session, modelo, condiciones: list) -> dict:
+    """
+    En MySQL usa la estimación de filas del optimizador (EXPLAIN), que no lee la
+    tabla. En otros motores cuenta hasta LOGS_CONTEO_MAX filas.
+    """
+    consulta = select(literal_column("1")).select_from(modelo).where(*condiciones)
+    if db.bind.dialect.name == "mysql":
+        try:
+            sql = consulta.compile(dialect=db.bind.dialect)
+            parametros = tuple(sql.params[nombre] for nombre in sql.positiontup) if sql.positional else sql.params
+            plan = db.connection().exec_driver_sql(f"EXPLAIN {sql}", parametros).mappings().first()
+            filas = int(plan["rows"] or 0) * float(plan.get("filtered") or 100) / 100
+            return {"total": int(filas), "aproximado": True}
+        except Exception:
+            db.rollback()
+    conteo = db.execute(
+        select(func.count()).select_from(consulta.limit(LOGS_CONTEO_MAX).subquery())
+    ).scalar()
+    return {"total": conteo, "aproximado": conteo >= LOGS_CONTEO_MAX}
+
+def paginar(db: Session, modelo, columna_fecha, condiciones: list, filtros: dict,
+            limite: int = None, cursor: str = None, incluir_total: bool = False) -> dict:
+    """
+    Retorna una página de filas del modelo, de la más reciente a la más antigua,
+    ordenadas por (fecha, id). "filtros" son los parámetros de la consulta (sin
+    cursor ni límite) y se usan para validar el cursor.
+    """
+    limite = LOGS_PAGINA_DEFECTO if limite is None else limite
+    if limite < 1 or limite > LOGS_PAGINA_MAX:
+        raise HTTPException(status_code=400, detail=f"El límite debe estar entre 1 y {LOGS_PAGINA_MAX}")
+
+    huella = _huella(filtros)
+    pagina = select(modelo).where(*condiciones)
+    if cursor:
+        fecha, id = _decodificar_cursor(cursor, columna_fecha, huella)
+        pagina = pagina.where(or_(columna_fecha < fecha, and_(columna_fecha == fecha, modelo.id < id)))
+
+    # Se pide una fila extra para saber si hay una página siguiente
+    filas = db.execute(pagina.order_by(columna_fecha.desc(), modelo.id.desc()).limit(limite + 1)).scalars().all()
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    resultado = {
+        "resultados": filas,
+        "cantidad": len(filas),
+        "cursor_siguiente": _codificar_cursor(getattr(filas[-1], columna_fecha.key), filas[-1].id, huella) if hay_mas else None,
+    }
+    if incluir_total:
+        resultado["total"] = _total_aproximado(db, modelo, condiciones)
+    return resultado
@@ -0,0 +1,189 @@
+# Recuperación local de respuestas del chatbot (antes de llamar al LLM)
+# La mayoría de las preguntas del chatbot se repiten: cómo pagar en cuotas, qué
+# significa "Apto para pagar", dónde descargar el permiso. Para no pagar una
+# llamada a Gemini (segundos y tokens) por cada repetición:
+# - IndiceBM25: índice en memoria de las preguntas frecuentes, construido al
+#   iniciar la aplicación. Si la pregunta coincide con alta confianza se responde
+#   directamente.
+# - CacheRespuestasChatbot: respuestas anteriores del LLM por pregunta
+#   normalizada (sin tildes, mayúsculas, signos ni palabras vacías).
+# - EstadisticasChatbot: aciertos y latencia de cada camino (faq, cache, llm).
+
+import os
+import re
+import math
+import time
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, deque
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+CHATBOT_FAQ_ENABLED = os.getenv("CHATBOT_FAQ_ENABLED", "true").lower() == "true"
+# Fracción (ponderada por IDF) de los términos de la pregunta que debe contener la pregunta frecuente
+CHATBOT_FAQ_UMBRAL = float(os.getenv("CHATBOT_FAQ_UMBRAL", "0.8"))
+# Puntaje mínimo del mejor resultado respecto del segundo (evita respuestas ambiguas)
+CHATBOT_FAQ_MARGEN = float(os.getenv("CHATBOT_FAQ_MARGEN", "1.3"))
+# Términos mínimos de la pregunta presentes en la pregunta frecuente (una sola palabra es ambigua)
+CHATBOT_FAQ_MIN_TERMINOS = int(os.getenv("CHATBOT_FAQ_MIN_TERMINOS", "2"))
+CHATBOT_CACHE_ENABLED = os.getenv("CHATBOT_CACHE_ENABLED", "true").lower() == "true"
+CHATBOT_CACHE_MAX_ENTRADAS = int(os.getenv("CHATBOT_CACHE_MAX_ENTRADAS", "1000"))
+CHATBOT_CACHE_TTL = float(os.getenv("CHATBOT_CACHE_TTL", "86400"))
+
+PALABRAS_VACIAS = set("""
+a al algo como con cual cuales cuando de del donde el ella en es esa ese eso esta este esto
+estoy ha hay la las le les lo los me mi mis muy no o para pero por puedo puede que se si sin
+sobre son su sus te tengo tiene tu tus un una uno unos unas y ya yo hola favor gracias quiero
+necesito saber debo hacer hago
+""".split())
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes ni signos de puntuación y con espacios simples"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9ñ ]", " ", texto)).strip()
+
+# Terminaciones que se quitan para agrupar formas de una misma palabra
+# ("pago", "pagar", "pagado" -> "pag"; "descargo", "descargar" -> "descarg")
+TERMINACIONES = ("iendo", "ando", "ado", "ido", "ada", "ida", "ar", "er", "ir", "a", "e", "o")
+
+def _raiz(palabra: str) -> str:
+    """Raíz aproximada: sin plural ni terminación verbal, con al menos 3 letras"""
+    if len(palabra) > 4 and palabra.endswith("es") and palabra[-3] not in "aeiou":
+        palabra = palabra[:-2]
+    elif len(palabra) > 3 and palabra.endswith("s"):
+        palabra = palabra[:-1]
+    for terminacion in TERMINACIONES:
+        if palabra.endswith(terminacion) and len(palabra) - len(terminacion) >= 3:
+            return palabra[:-len(terminacion)]
+    return palabra
+
+def terminos(texto: str) -> list:
+    return [_raiz(p) for p in normalizar(texto).split() if p not in PALABRAS_VACIAS]
+
+def clave_pregunta(texto: str) -> str:
+    """Clave de caché de una pregunta: términos sin repetir y ordenados"""
+    return " ".join(sorted(set(terminos(texto))))
+
+class IndiceBM25:
+    """Índice BM25 en memoria sobre una lista de documentos de texto"""
+
+    def __init__(self, documentos: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._documentos = [Counter(terminos(d)) for d in documentos]
+        self._largos = [sum(d.values()) for d in self._documentos]
+        self._largo_promedio = (sum(self._largos) / len(self._largos)) if self._largos else 0
+        n = len(self._documentos)
+        frecuencias = Counter(t for d in self._documentos for t in d)
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in frecuencias.items()}
+        # Peso de un término que no aparece en ningún documento
+        self._idf_desconocido = math.log(1 + (n + 0.5) / 0.5)
+
+    def _puntaje(self, consulta: list, i: int) -> float:
+        documento, largo = self._documentos[i], self._largos[i]
+        puntaje = 0.0
+        for t in consulta:
+            f = documento.get(t, 0)
+            if f:
+                puntaje += self._idf[t] * f * (self.k1 + 1) / (f + self.k1 * (1 - self.b + self.b * largo / self._largo_promedio))
+        return puntaje
+
+    def buscar(self, texto: str):
+        """
+        Retorna (índice del mejor documento, confianza entre 0 y 1) o None.
+        La confianza es la fracción del peso (IDF) de los términos de la pregunta
+        que aparecen en el documento; es 0 si el resultado es ambiguo (el segundo
+        mejor está a menos de CHATBOT_FAQ_MARGEN veces del primero) o si coinciden
+        menos de CHATBOT_FAQ_MIN_TERMINOS términos.
+        """
+        consulta = list(dict.fromkeys(terminos(texto)))
+        if not consulta or not self._documentos:
+            return None
+        puntajes = sorted(((self._puntaje(consulta, i), i) for i in range(len(self._documentos))), reverse=True)
+        mejor, i = puntajes[0]
+        if mejor <= 0:
+            return None
+        if len(puntajes) > 1 and puntajes[1][0] * CHATBOT_FAQ_MARGEN > mejor:
+            return i, 0.0
+        peso = {t: self._idf.get(t, self._idf_desconocido) for t in consulta}
+        encontrados = [t for t in consulta if t in self._documentos[i]]
+        if len(encontrados) < CHATBOT_FAQ_MIN_TERMINOS:
+            return i, 0.0
+        return i, sum(peso[t] for t in encontrados) / sum(peso.values())
+
+class CacheRespuestasChatbot:
+    """Caché LRU con TTL de respuestas del LLM por (página, pregunta normalizada)"""
+
+    def __init__(self, max_entradas: int = CHATBOT_CACHE_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: tuple):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] <= time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave: tuple, respuesta: str):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + CHATBOT_CACHE_TTL, respuesta)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+class EstadisticasChatbot:
+    """Cantidad de respuestas y latencia por origen (faq, cache, llm)"""
+
+    ORIGENES = ("faq", "cache", "llm")
+
+    def __init__(self, muestras: int = 1000):
+        self._latencias = {origen: deque(maxlen=muestras) for origen in self.ORIGENES}
+        self._cantidades = Counter()
+        self._lock = threading.Lock()
+
+    def registrar(self, origen: str, ms: float):
+        with self._lock:
+            self._cantidades[origen] += 1
+            self._latencias[origen].append(ms)
+
+    def _resumen(self, origen: str) -> dict:
+        latencias = sorted(self._latencias[origen])
+        if not latencias:
+            return {"respuestas": self._cantidades[origen], "latencia_promedio_ms": 0.0, "latencia_p95_ms": 0.0}
+        return {
+            "respuestas": self._cantidades[origen],
+            "latencia_promedio_ms": round(sum(latencias) / len(latencias), 1),
+            "latencia_p95_ms": round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))], 1),
+        }
+
+    def estadisticas(self, entradas_cache: int = 0) -> dict:
+        with self._lock:
+            total = sum(self._cantidades.values())
+            locales = self._cantidades["faq"] + self._cantidades["cache"]
+            return {
+                "faq_habilitada": CHATBOT_FAQ_ENABLED,
+                "cache_habilitada": CHATBOT_CACHE_ENABLED,
+                "entradas_cache": entradas_cache,
+                "respuestas": total,
+                "tasa_aciertos": round(locales / total, 4) if total else 0.0,
+                **{origen: self._resumen(origen) for origen in self.ORIGENES},
+            }
+
+# Instancias únicas para toda la aplicación
+cache_respuestas_chatbot = CacheRespuestasChatbot()
+estadisticas_chatbot = EstadisticasChatbot()
@@ -0,0 +1,306 @@
+# Resiliencia de las llamadas a las agencias (config.http_client)
+# Cuando una agencia se pone lenta o falla, no debe arrastrar al resto del
+# backend. Cada llamada de ClientesHTTP pasa por:
+# - Plazo total por agencia (DEADLINE_<AGENCIA>): incluye reintentos y
+#   solicitudes de cobertura; el timeout de httpx limita cada intento.
+# - Circuito por agencia: si en la ventana de las últimas solicitudes la
+#   proporción de fallos (errores de conexión, timeouts y respuestas 5xx) supera
+#   el umbral, el circuito se abre y las llamadas fallan de inmediato
+#   (CircuitoAbiertoError) sin ocupar conexiones. Pasado CB_ABIERTO_SEGUNDOS se
+#   deja pasar una solicitud de prueba (semiabierto): si responde bien el
+#   circuito se cierra, si falla vuelve a abrirse.
+# - Reintentos con espera exponencial aleatoria (full jitter), solo para GET
+#   (idempotentes) o errores de conexión (la solicitud no llegó a enviarse).
+#   Cada reintento consume una ficha de un presupuesto global que se recarga con
+#   una fracción de las solicitudes normales, así los reintentos nunca
+#   multiplican la carga sobre una agencia que ya está saturada.
+# - Cobertura (hedging, opcional) para GET: si la respuesta tarda más que el
+#   p95 reciente de la agencia, se envía una segunda solicitud y se usa la
+#   primera que responda. También consume del presupuesto de reintentos.
+#
+# Los errores propios son subclases de los de httpx (CircuitoAbiertoError es un
+# TransportError y PlazoAgotadoError un TimeoutException), de modo que los
+# routers que ya manejan httpx.RequestError los tratan igual.
+
+import os
+import time
+import random
+import asyncio
+from collections import deque
+
+import httpx
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+# Valores globales, pueden sobrescribirse por agencia con el sufijo de la agencia
+# (ej: DEADLINE_TGR=3, CB_UMBRAL_FALLOS_SII=0.3)
+RESILIENCIA_ENABLED = os.getenv("RESILIENCIA_ENABLED", "true").lower() == "true"
+DEADLINE = float(os.getenv("DEADLINE", "8"))                           # Plazo total por llamada (segundos)
+CB_VENTANA = int(os.getenv("CB_VENTANA", "20"))                        # Solicitudes consideradas por el circuito
+CB_MIN_SOLICITUDES = int(os.getenv("CB_MIN_SOLICITUDES", "10"))        # Mínimo en la ventana para poder abrir
+CB_UMBRAL_FALLOS = float(os.getenv("CB_UMBRAL_FALLOS", "0.5"))         # Proporción de fallos que abre el circuito
+CB_ABIERTO_SEGUNDOS = float(os.getenv("CB_ABIERTO_SEGUNDOS", "10"))    # Tiempo abierto antes de probar
+CB_SONDAS = int(os.getenv("CB_SONDAS", "1"))                           # Solicitudes de prueba simultáneas (semiabierto)
+REINTENTOS_MAX = int(os.getenv("REINTENTOS_MAX", "2"))
+REINTENTO_BASE_MS = float(os.getenv("REINTENTO_BASE_MS", "100"))
+REINTENTO_MAX_MS = float(os.getenv("REINTENTO_MAX_MS", "1000"))
+# Presupuesto global: cada solicitud aporta esta fracción de ficha (0.1 = hasta 10% de reintentos)
+PRESUPUESTO_REINTENTOS = float(os.getenv("PRESUPUESTO_REINTENTOS", "0.1"))
+PRESUPUESTO_REINTENTOS_MAX = float(os.getenv("PRESUPUESTO_REINTENTOS_MAX", "20"))
+PRESUPUESTO_REINTENTOS_POR_SEGUNDO = float(os.getenv("PRESUPUESTO_REINTENTOS_POR_SEGUNDO", "1"))  # Recarga mínima
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+HEDGING_MIN_MUESTRAS = int(os.getenv("HEDGING_MIN_MUESTRAS", "20"))     # Latencias necesarias para calcular el p95
+HEDGING_MIN_MS = float(os.getenv("HEDGING_MIN_MS", "20"))
+
+# Respuestas que cuentan como fallo de la agencia y que se reintentan en un GET
+STATUS_FALLO = (500, 502, 503, 504)
+STATUS_REINTENTABLE = (502, 503, 504)
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+def _config_agencia(agencia: str, variable: str, por_defecto, tipo=float):
+    return tipo(os.getenv(f"{variable}_{agencia}", por_defecto))
+
+class CircuitoAbiertoError(httpx.TransportError):
+    """La agencia está fallando y el circuito no deja pasar la solicitud"""
+
+class PlazoAgotadoError(httpx.TimeoutException):
+    """La llamada (con sus reintentos) superó el plazo de la agencia"""
+
+class PresupuestoReintentos:
+    """Fichas de reintento compartidas por todas las agencias"""
+
+    def __init__(self):
+        self.fichas = PRESUPUESTO_REINTENTOS_MAX
+        self._ultima_recarga = time.monotonic()
+        self.usados = 0
+        self.denegados = 0
+
+    def depositar(self):
+        ahora = time.monotonic()
+        recarga = PRESUPUESTO_REINTENTOS + (ahora - self._ultima_recarga) * PRESUPUESTO_REINTENTOS_POR_SEGUNDO
+        self._ultima_recarga = ahora
+        self.fichas = min(PRESUPUESTO_REINTENTOS_MAX, self.fichas + recarga)
+
+    def retirar(self) -> bool:
+        if self.fichas < 1:
+            self.denegados += 1
+            return False
+        self.fichas -= 1
+        self.usados += 1
+        return True
+
+    def estadisticas(self) -> dict:
+        return {
+            "fichas": round(self.fichas, 2),
+            "max_fichas": PRESUPUESTO_REINTENTOS_MAX,
+            "usados": self.usados,
+            "denegados": self.denegados,
+        }
+
+class CircuitoAgencia:
+    """Estado del circuito y latencias recientes de una agencia"""
+
+    def __init__(self, agencia: str):
+        self.agencia = agencia
+        self.plazo = _config_agencia(agencia, "DEADLINE", DEADLINE)
+        self.ventana = _config_agencia(agencia, "CB_VENTANA", CB_VENTANA, int)
+        self.min_solicitudes = _config_agencia(agencia, "CB_MIN_SOLICITUDES", CB_MIN_SOLICITUDES, int)
+        self.umbral = _config_agencia(agencia, "CB_UMBRAL_FALLOS", CB_UMBRAL_FALLOS)
+        self.abierto_segundos = _config_agencia(agencia, "CB_ABIERTO_SEGUNDOS", CB_ABIERTO_SEGUNDOS)
+        self.estado = CERRADO
+        self._resultados = deque(maxlen=self.ventana)  # True = éxito
+        self._latencias = deque(maxlen=200)             # ms de los intentos exitosos
+        self._abierto_desde = 0.0
+        self._sondas = 0
+        self.solicitudes = 0
+        self.fallos = 0
+        self.rechazadas = 0
+        self.aperturas = 0
+        self.reintentos = 0
+        self.coberturas = 0
+        self.coberturas_ganadas = 0
+        self.plazos_agotados = 0
+
+    def permitir(self) -> bool:
+        """True si el intento puede enviarse (en semiabierto, solo las sondas)"""
+        if self.estado == ABIERTO:
+            if time.monotonic() - self._abierto_desde < self.abierto_segundos:
+                self.rechazadas += 1
+                return False
+            self.estado = SEMIABIERTO
+        if self.estado == SEMIABIERTO:
+            if self._sondas >= CB_SONDAS:
+                self.rechazadas += 1
+                return False
+            self._sondas += 1
+        self.solicitudes += 1
+        return True
+
+    def _abrir(self):
+        self.estado = ABIERTO
+        self._abierto_desde = time.monotonic()
+        self.aperturas += 1
+
+    def registrar(self, exito, ms: float = None):
+        """Registra el resultado de un intento (None: cancelado, no cuenta)"""
+        if self.estado == SEMIABIERTO:
+            self._sondas = max(0, self._sondas - 1)
+            if exito is True:
+                self.estado = CERRADO
+                self._resultados.clear()
+            elif exito is False:
+                self._abrir()
+        if exito is None:
+            return
+        self._resultados.append(exito)
+        if exito:
+            if ms is not None:
+                self._latencias.append(ms)
+            return
+        self.fallos += 1
+        if self.estado == CERRADO and len(self._resultados) >= self.min_solicitudes:
+            proporcion = self._resultados.count(False) / len(self._resultados)
+            if proporcion >= self.umbral:
+                self._abrir()
+
+    def p95(self):
+        """p95 de las latencias recientes (None si hay pocas muestras)"""
+        if len(self._latencias) < HEDGING_MIN_MUESTRAS:
+            return None
+        latencias = sorted(self._latencias)
+        return latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+
+    def estadisticas(self) -> dict:
+        p95 = self.p95()
+        return {
+            "estado": self.estado,
+            "plazo_s": self.plazo,
+            "fallos_ventana": self._resultados.count(False),
+            "solicitudes_ventana": len(self._resultados),
+            "solicitudes": self.solicitudes,
+            "fallos": self.fallos,
+            "rechazadas": self.rechazadas,
+            "aperturas": self.aperturas,
+            "reintentos": self.reintentos,
+            "coberturas": self.coberturas,
+            "coberturas_ganadas": self.coberturas_ganadas,
+            "plazos_agotados": self.plazos_agotados,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+        }
+
+class Resiliencia:
+    """Aplica plazo, circuito, reintentos y cobertura a las llamadas de cada agencia"""
+
+    def __init__(self):
+        self._circuitos = {}
+        self.presupuesto = PresupuestoReintentos()
+
+    def circuito(self, agencia: str) -> CircuitoAgencia:
+        if agencia not in self._circuitos:
+            self._circuitos[agencia] = CircuitoAgencia(agencia)
+        return self._circuitos[agencia]
+
+    async def _intento(self, circuito: CircuitoAgencia, funcion) -> httpx.Response:
+        if not circuito.permitir():
+            raise CircuitoAbiertoError(f"Circuito abierto para {circuito.agencia}")
+        inicio = time.perf_counter()
+        try:
+            response = await funcion()
+        except httpx.TransportError:
+            circuito.registrar(False)
+            raise
+        except BaseException:
+            # Cancelado (cobertura perdedora, plazo agotado) o error ajeno a la agencia
+            circuito.registrar(None)
+            raise
+        circuito.registrar(response.status_code not in STATUS_FALLO, (time.perf_counter() - inicio) * 1000)
+        return response
+
+    async def _con_cobertura(self, circuito: CircuitoAgencia, funcion) -> httpx.Response:
+        """Si la primera solicitud tarda más que el p95, envía una segunda y usa la primera que responda"""
+        retraso = circuito.p95()
+        if retraso is None or circuito.estado != CERRADO:
+            return await self._intento(circuito, funcion)
+        tareas = [asyncio.ensure_future(self._intento(circuito, funcion))]
+        try:
+            listas, _ = await asyncio.wait(tareas, timeout=max(retraso, HEDGING_MIN_MS) / 1000)
+            if not listas:
+                if not self.presupuesto.retirar():
+                    return await tareas[0]
+                circuito.coberturas += 1
+                tareas.append(asyncio.ensure_future(self._intento(circuito, funcion)))
+            pendientes = set(tareas)
+            error = None
+            while pendientes:
+                listas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in listas:
+                    if tarea.exception() is None:
+                        if len(tareas) > 1 and tarea is tareas[1]:
+                            circuito.coberturas_ganadas += 1
+                        return tarea.result()
+                    error = tarea.exception()
+            raise error
+        finally:
+            for tarea in tareas:
+                if not tarea.done():
+                    tarea.cancel()
+
+    async def _con_reintentos(self, circuito: CircuitoAgencia, funcion, idempotente: bool) -> httpx.Response:
+        intento = 0
+        while True:
+            response, error = None, None
+            try:
+                if idempotente and HEDGING_ENABLED:
+                    response = await self._con_cobertura(circuito, funcion)
+                else:
+                    response = await self._intento(circuito, funcion)
+                if not idempotente or response.status_code not in STATUS_REINTENTABLE:
+                    return response
+            except CircuitoAbiertoError:
+                raise
+            except httpx.TransportError as e:
+                # Un POST solo se reintenta si no alcanzó a enviarse
+                if not idempotente and not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                    raise
+                error = e
+            if intento >= REINTENTOS_MAX or not self.presupuesto.retirar():
+                if error is not None:
+                    raise error
+                return response
+            intento += 1
+            circuito.reintentos += 1
+            await asyncio.sleep(random.uniform(0, min(REINTENTO_MAX_MS, REINTENTO_BASE_MS * 2 ** intento)) / 1000)
+
+    async def ejecutar(self, agencia: str, funcion, idempotente: bool = True, plazo: float = None) -> httpx.Response:
+        """
+        Ejecuta funcion() (una llamada httpx a la agencia) con plazo, circuito,
+        reintentos y cobertura. "plazo" permite extender el plazo de la agencia
+        para una llamada puntual (ej: una consulta masiva con un timeout mayor).
+        """
+        if not RESILIENCIA_ENABLED:
+            return await funcion()
+        circuito = self.circuito(agencia)
+        self.presupuesto.depositar()
+        plazo = max(circuito.plazo, plazo or 0)
+        try:
+            return await asyncio.wait_for(self._con_reintentos(circuito, funcion, idempotente), plazo)
+        except asyncio.TimeoutError:
+            # Los intentos cancelados no se registraron: el plazo agotado cuenta como un fallo
+            circuito.plazos_agotados += 1
+            circuito.registrar(False)
+            raise PlazoAgotadoError(f"{agencia} no respondió en {plazo} segundos")
+
+    def estadisticas(self, agencias) -> dict:
+        return {
+            "habilitada": RESILIENCIA_ENABLED,
+            "cobertura_habilitada": HEDGING_ENABLED,
+            "presupuesto_reintentos": self.presupuesto.estadisticas(),
+            "agencias": {agencia: self.circuito(agencia).estadisticas() for agencia in agencias},
+        }
+
+# Instancia única para toda la aplicación
+resiliencia = Resiliencia()
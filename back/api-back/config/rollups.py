@@ -0,0 +1,266 @@
+# Agregados pre-calculados (rollups) para el panel de decisiones
+# calcular_metricas obtiene los KPIs y gráficos desde estas tablas en vez de
+# recorrer los logs completos. Solo se guardan contadores diarios (filas DIA): se
+# actualizan en la misma transacción que registra cada log o permiso, y los meses
+# y años se agrupan desde los días al consultar. Así cada escritura toca una sola
+# fila por tabla (la del día) en vez de también las filas del mes y del año, que
+# compartían todas las escrituras concurrentes. Con LOGS_BUFFER_ENABLED los
+# contadores de un lote completo se suman antes de escribirse.
+# Se pueden reconstruir desde las tablas originales con:
+#
+#     python -m config.rollups
+
+from datetime import date, datetime
+from collections import defaultdict
+
+from sqlalchemy import func, case, and_, text
+
+from config.database import SessionLocal
+from config.cache import cache_metricas
+from config.models import (
+    LogFiscalizacion, LogConsultaPropietario, PermisoCirculacion,
+    RollupFiscalizacion, RollupConsultas, RollupConsultasRut, RollupPermisos
+)
+
+# Largo de la clave de cada tipo de período ("2025-03-14", "2025-03", "2025")
+LARGO_PERIODO = {"DIA": 10, "MES": 7, "AÑO": 4}
+
+def _dia_periodo(fecha) -> str:
+    """Clave del período DIA de una fecha"""
+    return fecha.strftime("%Y-%m-%d")
+
+#####################################################
+# Actualización incremental
+#####################################################
+
+def _insert(db, tabla):
+    """Sentencia INSERT del dialecto de la conexión (para upserts)"""
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+    elif dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(tabla), dialecto
+
+def _incrementar(db, modelo, claves: dict, incrementos: dict):
+    """Suma los incrementos a la fila de la clave, creándola si no existe"""
+    tabla = modelo.__table__
+    stmt, dialecto = _insert(db, tabla)
+    stmt = stmt.values(**claves, **incrementos)
+    nuevos = {columna: tabla.c[columna] + valor for columna, valor in incrementos.items()}
+    if dialecto == "mysql":
+        stmt = stmt.on_duplicate_key_update(nuevos)
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=list(claves), set_=nuevos)
+    db.execute(stmt)
+
+def _insertar_si_no_existe(db, modelo, valores: dict) -> bool:
+    """Inserta la fila si su clave no existe. Retorna True si se insertó"""
+    stmt, dialecto = _insert(db, modelo.__table__)
+    stmt = stmt.values(**valores)
+    if dialecto == "mysql":
+        stmt = stmt.prefix_with("IGNORE")
+    else:
+        stmt = stmt.on_conflict_do_nothing()
+    return db.execute(stmt).rowcount == 1
+
+def _dato(log, campo):
+    """Campo de un log, sea un modelo SQLAlchemy o un dict (inserciones masivas)"""
+    return log[campo] if isinstance(log, dict) else getattr(log, campo)
+
+def _al_dia(log) -> bool:
+    return bool(_dato(log, "vigencia_permiso") and _dato(log, "vigencia_revision")
+                and _dato(log, "vigencia_soap") and not _dato(log, "encargo_robo"))
+
+def registrar_fiscalizaciones(db, logs: list):
+    """Suma logs de fiscalización a los rollups (llamar antes del commit de los logs)"""
+    contadores = defaultdict(lambda: [0, 0])
+    for log in logs:
+        contador = contadores[_dia_periodo(_dato(log, "fecha"))]
+        contador[0] += 1
+        contador[1] += int(_al_dia(log))
+    for periodo, (total, ok) in contadores.items():
+        _incrementar(db, RollupFiscalizacion, {"tipo_periodo": "DIA", "periodo": periodo}, {
+            "total": total, "al_dia": ok, "con_problemas": total - ok
+        })
+
+def registrar_fiscalizacion(db, log):
+    registrar_fiscalizaciones(db, [log])
+
+def registrar_consultas(db, logs: list):
+    """Suma logs de consultas de propietarios a los rollups (llamar antes del commit de los logs)"""
+    consultas = defaultdict(int)
+    ruts = defaultdict(set)
+    for log in logs:
+        periodo = _dia_periodo(_dato(log, "fecha"))
+        consultas[periodo] += 1
+        ruts[periodo].add(_dato(log, "rut"))
+    for periodo, cantidad in consultas.items():
+        nuevos = sum(
+            _insertar_si_no_existe(db, RollupConsultasRut, {"tipo_periodo": "DIA", "periodo": periodo, "rut": rut})
+            for rut in ruts[periodo]
+        )
+        _incrementar(db, RollupConsultas, {"tipo_periodo": "DIA", "periodo": periodo}, {
+            "consultas": cantidad, "usuarios_unicos": nuevos
+        })
+
+def registrar_consulta(db, log):
+    registrar_consultas(db, [log])
+
+def registrar_permiso(db, permiso):
+    """Suma un permiso emitido a los rollups (llamar antes del commit del permiso)"""
+    _incrementar(db, RollupPermisos, {"tipo_periodo": "DIA", "periodo": _dia_periodo(permiso.fecha_emision)}, {
+        "total": 1, "recaudacion": int(permiso.valor_permiso or 0)
+    })
+
+#####################################################
+# Consultas por rango
+#####################################################
+
+def _rango(modelo, period_type: str, desde: date, hasta: date):
+    """Retorna (filtro de las filas DIA del rango, expresión del período agrupado)"""
+    period_type = period_type if period_type in LARGO_PERIODO else "DIA"
+    filtro = and_(
+        modelo.tipo_periodo == "DIA",
+        modelo.periodo >= desde.isoformat(),
+        modelo.periodo <= hasta.isoformat(),
+    )
+    periodo = func.substr(modelo.periodo, 1, LARGO_PERIODO[period_type])
+    return filtro, periodo
+
+def series_fiscalizacion(db, period_type: str, desde: date, hasta: date):
+    """Filas (periodo, total, al_dia, con_problemas) por período"""
+    filtro, periodo = _rango(RollupFiscalizacion, period_type, desde, hasta)
+    return db.query(
+        periodo.label("periodo"),
+        func.sum(RollupFiscalizacion.total).label("total"),
+        func.sum(RollupFiscalizacion.al_dia).label("al_dia"),
+        func.sum(RollupFiscalizacion.con_problemas).label("con_problemas"),
+    ).filter(filtro).group_by(periodo).order_by(periodo).all()
+
+def series_consultas(db, period_type: str, desde: date, hasta: date):
+    """Retorna (filas (periodo, consultas, usuarios_unicos) por período, usuarios únicos del rango)"""
+    filtro, periodo = _rango(RollupConsultas, period_type, desde, hasta)
+    consultas = dict(
+        db.query(periodo, func.sum(RollupConsultas.consultas))
+        .filter(filtro).group_by(periodo).all()
+    )
+    # Los usuarios únicos no se pueden sumar entre períodos: se cuentan desde los RUT
+    filtro_rut, periodo_rut = _rango(RollupConsultasRut, period_type, desde, hasta)
+    usuarios = dict(
+        db.query(periodo_rut, func.count(func.distinct(RollupConsultasRut.rut)))
+        .filter(filtro_rut).group_by(periodo_rut).all()
+    )
+    usuarios_rango = db.query(func.count(func.distinct(RollupConsultasRut.rut))).filter(filtro_rut).scalar() or 0
+    filas = [
+        {"periodo": str(p), "consultas": int(consultas[p] or 0), "usuarios_unicos": int(usuarios.get(p, 0))}
+        for p in sorted(consultas)
+    ]
+    return filas, int(usuarios_rango)
+
+def series_permisos(db, period_type: str, desde: date, hasta: date):
+    """Filas (periodo, total, recaudacion) por período"""
+    filtro, periodo = _rango(RollupPermisos, period_type, desde, hasta)
+    return db.query(
+        periodo.label("periodo"),
+        func.sum(RollupPermisos.total).label("total"),
+        func.sum(RollupPermisos.recaudacion).label("recaudacion"),
+    ).filter(filtro).group_by(periodo).order_by(periodo).all()
+
+#####################################################
+# Reconstrucción (backfill)
+#####################################################
+
+def _dia(valor) -> str:
+    return str(valor)[:10]
+
+def _guardar(db, modelo, filas: list, lote: int = 1000):
+    for i in range(0, len(filas), lote):
+        db.execute(modelo.__table__.insert(), filas[i:i + lote])
+
+def reconstruir_rollups(db=None) -> dict:
+    """
+    Vacía y recalcula todos los rollups desde log_fiscalizacion,
+    log_consultas_propietarios y permiso_circulacion.
+    """
+    propia = db is None
+    db = db or SessionLocal()
+    try:
+        for modelo in (RollupFiscalizacion, RollupConsultas, RollupConsultasRut, RollupPermisos):
+            db.query(modelo).delete()
+
+        # Fiscalizaciones: contadores diarios
+        fiscalizacion = defaultdict(lambda: [0, 0, 0])
+        dia = func.date(LogFiscalizacion.fecha)
+        al_dia = and_(
+            LogFiscalizacion.vigencia_permiso == True,
+            LogFiscalizacion.vigencia_revision == True,
+            LogFiscalizacion.vigencia_soap == True,
+            LogFiscalizacion.encargo_robo == False
+        )
+        filas = db.query(
+            dia, func.count(text("1")), func.sum(case((al_dia, 1), else_=0))
+        ).group_by(dia).all()
+        for d, total, ok in filas:
+            contador = fiscalizacion[_dia(d)]
+            contador[0] += int(total or 0)
+            contador[1] += int(ok or 0)
+            contador[2] += int(total or 0) - int(ok or 0)
+        _guardar(db, RollupFiscalizacion, [
+            {"tipo_periodo": "DIA", "periodo": periodo, "total": c[0], "al_dia": c[1], "con_problemas": c[2]}
+            for periodo, c in fiscalizacion.items()
+        ])
+
+        # Consultas: cantidad por día y RUT distintos por día
+        consultas = defaultdict(int)
+        ruts = defaultdict(set)
+        dia = func.date(LogConsultaPropietario.fecha)
+        filas = db.query(dia, LogConsultaPropietario.rut, func.count(text("1"))).group_by(dia, LogConsultaPropietario.rut).all()
+        for d, rut, cantidad in filas:
+            consultas[_dia(d)] += int(cantidad or 0)
+            ruts[_dia(d)].add(rut)
+        _guardar(db, RollupConsultas, [
+            {"tipo_periodo": "DIA", "periodo": periodo, "consultas": cantidad, "usuarios_unicos": len(ruts[periodo])}
+            for periodo, cantidad in consultas.items()
+        ])
+        _guardar(db, RollupConsultasRut, [
+            {"tipo_periodo": "DIA", "periodo": periodo, "rut": rut}
+            for periodo, conjunto in ruts.items() for rut in conjunto
+        ])
+
+        # Permisos: cantidad y recaudación por día
+        permisos = defaultdict(lambda: [0, 0])
+        dia = func.date(PermisoCirculacion.fecha_emision)
+        filas = db.query(dia, func.count(text("1")), func.sum(PermisoCirculacion.valor_permiso)).group_by(dia).all()
+        for d, total, recaudacion in filas:
+            contador = permisos[_dia(d)]
+            contador[0] += int(total or 0)
+            contador[1] += int(recaudacion or 0)
+        _guardar(db, RollupPermisos, [
+            {"tipo_periodo": "DIA", "periodo": periodo, "total": c[0], "recaudacion": c[1]}
+            for periodo, c in permisos.items()
+        ])
+
+        db.commit()
+        cache_metricas.limpiar()
+        return {
+            "rollup_fiscalizacion": len(fiscalizacion),
+            "rollup_consultas": len(consultas),
+            "rollup_consultas_rut": sum(len(c) for c in ruts.values()),
+            "rollup_permisos": len(permisos),
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if propia:
+            db.close()
+
+if __name__ == "__main__":
+    from config.database import create_tables
+    create_tables()
+    inicio = datetime.now()
+    resumen = reconstruir_rollups()
+    print(f"Rollups reconstruidos en {(datetime.now() - inicio).total_seconds():.1f} s: {resumen}")
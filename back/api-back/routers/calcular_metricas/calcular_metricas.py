@@ -1,97 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy import (
-    create_engine, Column, Integer, String, DateTime, Date, Boolean,
-    func, and_, or_, text, case
-)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from sqlalchemy import func, and_, or_, text, case
+from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any
-import os
-from dotenv import load_dotenv
 import re
 
+from config.database import get_db_analitica
+from config.models import LogFiscalizacion, LogConsultaPropietario, PermisoCirculacion
+from config import rollups
+from config.cache import cache_metricas
+
 # Instanciamos el router
 router = APIRouter()
 
-############################################
-# DB
-############################################
-load_dotenv()
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_name = os.getenv("DB_NAME")
-DATABASE_URL = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-############################################
-# MODELOS SQLALCHEMY 
-############################################
-
-class LogFiscalizacion(Base):
-    __tablename__ = "log_fiscalizacion"
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    ppu = Column(String(10), nullable=False)
-    rut_fiscalizador = Column(String(12), nullable=False)
-    fecha = Column(DateTime, nullable=False)
-    vigencia_permiso = Column(Boolean, nullable=False)
-    vigencia_revision = Column(Boolean, nullable=False)
-    vigencia_soap = Column(Boolean, nullable=False)
-    encargo_robo = Column(Boolean, nullable=False)
-    multas = Column(Boolean, nullable=False)
-
-class LogConsultasPropietarios(Base):
-    __tablename__ = "log_consultas_propietarios"
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    rut = Column(String(12), nullable=False)
-    ppu = Column(String(10), nullable=False)
-    fecha = Column(DateTime, nullable=False)
-
-class PermisoCirculacion(Base):
-    __tablename__ = "permiso_circulacion"
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    ppu = Column(String(10), nullable=False)
-    rut = Column(String(12), nullable=False)
-    nombre = Column(String(100), nullable=False)
-    fecha_emision = Column(Date, nullable=False)
-    fecha_expiracion = Column(Date, nullable=False)
-    valor_permiso = Column(Integer, nullable=False)
-    motor = Column(Integer, nullable=False)
-    chasis = Column(String(50), nullable=False)
-    tipo_vehiculo = Column(String(50), nullable=False)
-    color = Column(String(50), nullable=False)
-    marca = Column(String(50), nullable=False)
-    modelo = Column(String(50), nullable=False)
-    anio = Column(Integer, nullable=False)
-    carga = Column(Integer, nullable=False)
-    tipo_sello = Column(String(50), nullable=False)
-    combustible = Column(String(50), nullable=False)
-    cilindrada = Column(Integer, nullable=False)
-    transmision = Column(String(50), nullable=False)
-    pts = Column(Integer, nullable=False)
-    ast = Column(Integer, nullable=False)
-    equipamiento = Column(String(100), nullable=False)
-    codigo_sii = Column(String(20), nullable=False)
-    tasacion = Column(Integer, nullable=False)
-
-def create_tables():
-    try:
-        Base.metadata.create_all(bind=engine)
-        print("Tablas creadas/actualizadas correctamente")
-    except Exception as e:
-        print(f"Error creando tablas: {e}")
-
 ############################################
 # Utilidades métricas (sin SQL crudo)
 ############################################
@@ -101,94 +23,29 @@ def _parse_date(date_str: str) -> datetime:
     except ValueError:
         raise HTTPException(status_code=400, detail=f"Formato de fecha inválido: {date_str}. Use YYYY-MM-DD")
 
-def _period_expr(period_type: str, dt_col):
-    if period_type == "DIA":
-        return func.date(dt_col)                  # 'YYYY-MM-DD'
-    elif period_type == "MES":
-        return func.date_format(dt_col, "%Y-%m")  # 'YYYY-MM'
-    elif period_type == "AÑO":
-        return func.year(dt_col)                  # 2025
-    return func.date(dt_col)
+def _rango(col, df: datetime, dt: datetime, es_fecha: bool = False):
+    """
+    Filtro de rango semiabierto [df, dt + 1 día) sobre la columna sin envolverla en
+    funciones, para que MySQL pueda usar los índices sobre la fecha.
+    """
+    hasta = dt + timedelta(days=1)
+    if es_fecha:
+        return and_(col >= df.date(), col < hasta.date())
+    return and_(col >= df, col < hasta)
 
 def _metricas_fiscalizacion(df: datetime, dt: datetime, period_type: str, db: Session) -> Dict[str, Any]:
-    filtro = and_(func.date(LogFiscalizacion.fecha) >= df.date(),
-                  func.date(LogFiscalizacion.fecha) <= dt.date())
+    filtro = _rango(LogFiscalizacion.fecha, df, dt)
 
-    total = db.query(func.count(text("1"))).filter(filtro).scalar() or 0
+    # KPIs y gráficos desde los rollups; los logs solo se leen para el detalle
+    por_periodo = rollups.series_fiscalizacion(db, period_type, df.date(), dt.date())
 
-    al_dia = db.query(func.sum(
-        case(
-            (
-                and_(
-                    LogFiscalizacion.vigencia_permiso == True,
-                    LogFiscalizacion.vigencia_revision == True,
-                    LogFiscalizacion.vigencia_soap == True,
-                    LogFiscalizacion.encargo_robo == False
-                ),
-                1
-            ),
-            else_=0
-        )
-    )).filter(filtro).scalar() or 0
-
-    con_prob = db.query(func.sum(
-        case(
-            (
-                or_(
-                    LogFiscalizacion.vigencia_permiso == False,
-                    LogFiscalizacion.vigencia_revision == False,
-                    LogFiscalizacion.vigencia_soap == False,
-                    LogFiscalizacion.encargo_robo == True
-                ),
-                1
-            ),
-            else_=0
-        )
-    )).filter(filtro).scalar() or 0
+    total = sum(int(r.total or 0) for r in por_periodo)
+    al_dia = sum(int(r.al_dia or 0) for r in por_periodo)
+    con_prob = sum(int(r.con_problemas or 0) for r in por_periodo)
 
     kpi_ok = round((al_dia/total)*100, 1) if total else 0.0
     kpi_bad = round((con_prob/total)*100, 1) if total else 0.0
 
-    per = _period_expr(period_type, LogFiscalizacion.fecha)
-    serie_cond = db.query(
-        per.label("periodo"),
-        func.sum(
-            case(
-                (
-                    and_(
-                        LogFiscalizacion.vigencia_permiso == True,
-                        LogFiscalizacion.vigencia_revision == True,
-                        LogFiscalizacion.vigencia_soap == True,
-                        LogFiscalizacion.encargo_robo == False
-                    ),
-                    1
-                ),
-                else_=0
-            )
-        ).label("al_dia"),
-        func.sum(
-            case(
-                (
-                    or_(
-                        LogFiscalizacion.vigencia_permiso == False,
-                        LogFiscalizacion.vigencia_revision == False,
-                        LogFiscalizacion.vigencia_soap == False,
-                        LogFiscalizacion.encargo_robo == True
-                    ),
-                    1
-                ),
-                else_=0
-            )
-        ).label("con_problemas")
-    ).filter(filtro).group_by(per).order_by(per).all()
-
-    serie_miles = (
-        db.query(
-            per.label("periodo"),
-            func.round(func.count(text("1")), 2).label("miles_fiscalizados")
-        ).filter(filtro).group_by(per).order_by(per).all()
-    )
-
     detalle = (
         db.query(
             LogFiscalizacion.ppu,
@@ -217,10 +74,10 @@ def _metricas_fiscalizacion(df: datetime, dt: datetime, period_type: str, db: Se
         "charts": {
             "vehiculos_por_condicion": [
                 {"periodo": str(r.periodo), "al_dia": int(r.al_dia or 0), "con_problemas": int(r.con_problemas or 0)}
-                for r in serie_cond
+                for r in por_periodo
             ],
             "miles_fiscalizados": [
-                {"periodo": str(r.periodo), "miles": float(r.miles_fiscalizados)} for r in serie_miles
+                {"periodo": str(r.periodo), "miles": float(r.total or 0)} for r in por_periodo
             ],
             "pie_documentos": {"al_dia": kpi_ok, "con_problemas": kpi_bad}
         },
@@ -243,28 +100,17 @@ def _metricas_fiscalizacion(df: datetime, dt: datetime, period_type: str, db: Se
     }
 
 def _metricas_consultas(df: datetime, dt: datetime, period_type: str, db: Session) -> Dict[str, Any]:
-    filtro = and_(func.date(LogConsultasPropietarios.fecha) >= df.date(),
-                  func.date(LogConsultasPropietarios.fecha) <= dt.date())
-
-    tot_row = db.query(
-        func.count(text("1")).label("total_consultas"),
-        func.count(func.distinct(LogConsultasPropietarios.rut)).label("usuarios_unicos")
-    ).filter(filtro).first()
+    filtro = _rango(LogConsultaPropietario.fecha, df, dt)
 
-    per = _period_expr(period_type, LogConsultasPropietarios.fecha)
-    por_periodo = (
-        db.query(
-            per.label("periodo"),
-            func.count(text("1")).label("consultas"),
-            func.count(func.distinct(LogConsultasPropietarios.rut)).label("usuarios_unicos")
-        ).filter(filtro).group_by(per).order_by(per).all()
-    )
+    # KPIs y gráficos desde los rollups; los logs solo se leen para el detalle
+    por_periodo, usuarios_rango = rollups.series_consultas(db, period_type, df.date(), dt.date())
+    total_consultas = sum(p["consultas"] for p in por_periodo)
 
     ultimas = (
         db.query(
-            LogConsultasPropietarios.rut,
-            LogConsultasPropietarios.ppu,
-            LogConsultasPropietarios.fecha,
+            LogConsultaPropietario.rut,
+            LogConsultaPropietario.ppu,
+            LogConsultaPropietario.fecha,
             func.coalesce(PermisoCirculacion.nombre, "N/A").label("nombre"),
             func.coalesce(PermisoCirculacion.marca, "N/A").label("marca"),
             func.coalesce(PermisoCirculacion.modelo, "N/A").label("modelo"),
@@ -272,27 +118,27 @@ def _metricas_consultas(df: datetime, dt: datetime, period_type: str, db: Sessio
         .outerjoin(
             PermisoCirculacion,
             and_(
-                PermisoCirculacion.ppu == LogConsultasPropietarios.ppu,
-                PermisoCirculacion.rut == LogConsultasPropietarios.rut
+                PermisoCirculacion.ppu == LogConsultaPropietario.ppu,
+                PermisoCirculacion.rut == LogConsultaPropietario.rut
             )
         )
         .filter(filtro)
-        .order_by(LogConsultasPropietarios.fecha.desc())
+        .order_by(LogConsultaPropietario.fecha.desc())
         .limit(50)
         .all()
     )
 
     return {
         "kpi": {
-            "total_consultas": int((tot_row.total_consultas if tot_row else 0) or 0),
-            "usuarios_unicos_acumulados": int((tot_row.usuarios_unicos if tot_row else 0) or 0)
+            "total_consultas": total_consultas,
+            "usuarios_unicos_acumulados": usuarios_rango
         },
         "charts": {
             "consultas_por_periodo": [
-                {"periodo": str(r.periodo), "consultas": int(r.consultas or 0)} for r in por_periodo
+                {"periodo": p["periodo"], "consultas": p["consultas"]} for p in por_periodo
             ],
             "usuarios_unicos_por_periodo": [
-                {"periodo": str(r.periodo), "usuarios_unicos": int(r.usuarios_unicos or 0)} for r in por_periodo
+                {"periodo": p["periodo"], "usuarios_unicos": p["usuarios_unicos"]} for p in por_periodo
             ]
         },
         "tables": {
@@ -308,22 +154,14 @@ def _metricas_consultas(df: datetime, dt: datetime, period_type: str, db: Sessio
     }
 
 def _metricas_permisos(df: datetime, dt: datetime, period_type: str, db: Session) -> Dict[str, Any]:
-    filtro = and_(func.date(PermisoCirculacion.fecha_emision) >= df.date(),
-                  func.date(PermisoCirculacion.fecha_emision) <= dt.date())
+    filtro = _rango(PermisoCirculacion.fecha_emision, df, dt, es_fecha=True)
 
-    kpi = db.query(
-        func.count(text("1")).label("total_permisos"),
-        func.sum(PermisoCirculacion.valor_permiso).label("recaudacion_total"),
-        func.avg(PermisoCirculacion.valor_permiso).label("valor_promedio")
-    ).filter(filtro).first()
+    # KPIs y gráficos desde los rollups; la tabla solo se lee para el detalle
+    emisiones = rollups.series_permisos(db, period_type, df.date(), dt.date())
 
-    per = _period_expr(period_type, PermisoCirculacion.fecha_emision)
-    emisiones = (
-        db.query(
-            per.label("periodo"),
-            func.round(func.count(text("1")), 2).label("miles")
-        ).filter(filtro).group_by(per).order_by(per).all()
-    )
+    total_permisos = sum(int(r.total or 0) for r in emisiones)
+    recaudacion_total = float(sum(int(r.recaudacion or 0) for r in emisiones))
+    valor_promedio = recaudacion_total / total_permisos if total_permisos else 0.0
 
     permisos_tbl = (
         db.query(
@@ -340,13 +178,13 @@ def _metricas_permisos(df: datetime, dt: datetime, period_type: str, db: Session
 
     return {
         "kpi": {
-            "total_permisos_emitidos": int((kpi.total_permisos if kpi else 0) or 0),
-            "recaudacion_total_clp": float((kpi.recaudacion_total if kpi else 0.0) or 0.0),
-            "valor_promedio_clp": float((kpi.valor_promedio if kpi else 0.0) or 0.0),
+            "total_permisos_emitidos": total_permisos,
+            "recaudacion_total_clp": recaudacion_total,
+            "valor_promedio_clp": valor_promedio,
         },
         "charts": {
             "emisiones_por_periodo_miles": [
-                {"periodo": str(r.periodo), "miles": float(r.miles)} for r in emisiones
+                {"periodo": str(r.periodo), "miles": float(r.total or 0)} for r in emisiones
             ]
         },
         "tables": {
@@ -369,14 +207,17 @@ def _metricas_permisos(df: datetime, dt: datetime, period_type: str, db: Session
 def read_root():
     return {"message": "API back sin autenticación (demo)"}
 
+# Endpoint síncrono: FastAPI lo ejecuta en el threadpool, sin bloquear el event loop
 @router.post("/calcular-metricas/{scope}/{period_type}/{from_date}/{to_date}")
-async def calcular_metricas(scope: str, period_type: str, from_date: str, to_date: str, db: Session = Depends(get_db)):
+def calcular_metricas(scope: str, period_type: str, from_date: str, to_date: str, response: Response, db: Session = Depends(get_db_analitica)):
     """
     Parameters:
       "scope": "fiscalizacion" | "consultas" | "permisos",
       "period_type": "DIA" | "MES" | "AÑO",
       "from_date": "YYYY-MM-DD",
       "to_date":   "YYYY-MM-DD"
+
+    El header X-Cache indica si el resultado se obtuvo de la caché (HIT) o se calculó (MISS).
     """
     try:
         # Limpiar y validar scope
@@ -402,6 +243,14 @@ async def calcular_metricas(scope: str, period_type: str, from_date: str, to_dat
         if df > dt:
             raise HTTPException(status_code=400, detail="La fecha de inicio no puede ser mayor que la fecha de fin")
 
+        # Consultar la caché de resultados por rango
+        clave = (scope, period_type, df.date(), dt.date())
+        result = cache_metricas.obtener(clave)
+        if result is not None:
+            response.headers["X-Cache"] = "HIT"
+            return {"status": "success", "message": "Métricas calculadas correctamente", "data": result}
+        generacion = cache_metricas.generacion()
+
         if scope == "fiscalizacion":
             result = _metricas_fiscalizacion(df, dt, period_type, db)
         elif scope == "consultas":
@@ -415,6 +264,8 @@ async def calcular_metricas(scope: str, period_type: str, from_date: str, to_dat
             "from_date": from_date,
             "to_date": to_date
         })
+        cache_metricas.guardar(clave, df.date(), dt.date(), result, generacion)
+        response.headers["X-Cache"] = "MISS"
 
         return {"status": "success", "message": "Métricas calculadas correctamente", "data": result}
     except HTTPException:
@@ -1,17 +1,27 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 import os
+import re
+import json
+import time
 from typing import Optional
-import google.generativeai as genai
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
+from config.gemini import cliente_gemini, GeminiError, GeminiSaturadoError
+from config.recuperacion import (
+    IndiceBM25, CHATBOT_FAQ_ENABLED, CHATBOT_FAQ_UMBRAL, CHATBOT_CACHE_ENABLED,
+    clave_pregunta, cache_respuestas_chatbot, estadisticas_chatbot
+)
+from config.memoria_chatbot import memoria_chatbot, SESION_VALIDA
+
 # Instanciamos el router
 router = APIRouter()
 
 load_dotenv()
 
-# Contexto inicial del sistema para TU PERMISO
-CONTEXTO_SISTEMA = """
+# Contexto general del sistema TU PERMISO (se envía en todas las consultas)
+CONTEXTO_GENERAL = """
 
 Eres un asistente virtual especializado en el sistema TU PERMISO, una plataforma digital para la gestión de permisos de circulación vehicular en Chile a nivel nacional.
 
@@ -58,25 +68,32 @@ Instrucciones para el asistente:
 - Las respuestas necesito que sean en español, adaptadas al contexto chileno y con un tono formal pero accesible.
 - Las respuestas serán insertadas en el portal TU PERMISO a través de un chatbot para asistir a los usuarios en sus consultas sobre el sistema.
 - Necesito que las respuestas esten formateadas en formato HTML, utilizando etiquetas como <p>, <ul>, <li>, <b>, <i>, entre otras, para mejorar la presentación del contenido en el portal.
+"""
 
-Información adicional de cada página del sistema (la sección en la que se encuentra el usuario será proporcionando en cada consulta):
+# Información adicional de cada página del sistema. Solo se envía la sección de
+# la página en la que se encuentra el usuario (y no el contexto completo).
+SECCIONES_PAGINA = [
+    (("/",), """
 - Inicio (/):
     * El usuario puede encontrar información general sobre TU PERMISO, acceso rápido a las principales funciones y noticias relevantes.
     * El usuario puede iniciar sesión con clave única a través del botón "Iniciar Sesión" que está en la parte superior derecha.
     * El usuario puede acceder a las Preguntas Frecuentes desde el menú principal para resolver dudas comunes.
-
+"""),
+    (("/home",), """
 - Dashboard (/home):
     * Es la página principal después de iniciar sesión, aquí el usuario tiene acceso a tres botones principales: "Ver Documentos Vehículares", "Pagar Mis Permisos de Circulación" e "Historial de Pagos".
     * Si el usuario quiere ver sus documentos, debe hacer clic en "Ver Documentos Vehículares".
     * Si el usuario quiere pagar su permiso de circulación, debe hacer clic en "Pagar Mis Permisos de Circulación".
     * Si el usuario quiere revisar su historial de pagos, debe hacer clic en "Historial de Pagos".
-
+"""),
+    (("/home/ver-documentos",), """
 - Mis Documentos (/home/ver-documentos):
     * En esta sección, el usuario puede ver todos sus documentos vehiculares, incluyendo el padrón, permiso de circulación, soap y revisión técnica.
     * Si el usuario posee vehículos a su nombre podrá verlos listados aquí con sus respectivos documentos.
     * En la fila de cada vehículo, el usuario puede ver los documentos presionando los botones "Padrón", "Permiso", "SOAP", "Revisión" según corresponda.
     * Cuando el usuario apreta el botón de un documento, se abrirá un modal con el documento en formato PDF para que pueda revisarlo o descargarlo.
-
+"""),
+    (("/home/ver-vehiculos",), """
 - Ver Vehículos (/home/ver-vehiculos):
     * En esta sección, el usuario puede ver todos los vehículos asociados a su RUT, vehículos que ha guardado previamente en su cuenta y pagar otros vehículos.
     * El usuario tiene a disposición tres botones principales: "Mis Vehículos", "Vehículos Guardados" y "Pagar otro Vehículo".
@@ -89,7 +106,8 @@ Información adicional de cada página del sistema (la sección en la que se enc
     * "Apto para pagar" significa que el vehículo tiene todos sus documentos vigentes y puede pagar su permiso de circulación.
     * "Presenta problemas" significa que el vehículo tiene documentos vencidos o multas impagas.
     * Para ver detalles del vehículo y proceder a pagar debe presionar en "Ver".
-
+"""),
+    (("/home/validaciones-pago",), """
 - Validaciones de Pago (/home/validaciones-pago):
     * En esta sección, el usuario puede revisar las validaciones necesarias antes de pagar su permiso de circulación.
     * El usuario verá una lista de validaciones que incluyen: Revisión Técnica, SOAP, Multas de Tránsito, Multas RPI, y Permiso de Circulación.
@@ -98,95 +116,297 @@ Información adicional de cada página del sistema (la sección en la que se enc
     * En su parte inferior izquierda, el usuario verá una lista de validaciones de cada documento. En este mismo lugar, puede ver los detalles de cada documento con el botón "Ver". Si el usuario tiene multas (de tránsito y rpi) impagas y/o SOAP vencido, el usuario verá un botón "Ver y pagar" para revisar y pagar las multas o renovar el SOAP si así lo desea hacer a través de la plataforma.
     * En la parte inferior derecha el usuario puede ver un selector para elegir si quiere pagar el permiso de circulación en una o dos cuotas (si el usuario elige dos cuotas, podrá pagar cada cuota mensualmente a través de WebPay con tarjeta de crédito).
     * Finalmente, en la parte inferior derecha el usuario verá un botón "Pagar Permiso" para proceder al pago del permiso de circulación una vez que todas las validaciones estén correctas.
-
+"""),
+    (("/home/formulario-pago",), """
 - Formulario de Pago (/home/formulario-pago):
     * En esta sección, el usuario puede ingresar los datos necesarios para pagar su permiso de circulación.
     * Estos datos se completan automáticamente, pero puede modificarlos si lo desea.
     * Para proceder con el pago, el usuario verá un botón "Pagar con WebPay" que lo llevará a la pasarela de pago segura de WebPay.
-
+"""),
+    (("/home/confirmacion-pago",), """
 - Confirmación de Pago (/home/confirmacion-pago):
     * En esta sección, el usuario verá un resumen de su pago del permiso de circulación una vez que haya completado la transacción.
     * El usuario podrá ver si el pago fue exitoso o fallido.
     * Aquí podrá descargar su comprobante de pago y el permiso de circulación digital en formato PDF (obviamente si el pago fue exitoso).
-
+"""),
+    (("/home/pago-soap",), """
 - Pago SOAP (/home/pago-soap):
     * En esta sección, el usuario puede renovar su seguro obligatorio (SOAP) si está vencido.
     * El usuario verá los detalles de su vehículo y el monto del SOAP.
     * El usuario verá múltiples opciones de seguros SOAP ofrecidos por distintas aseguradoras, con sus respectivos precios y coberturas.
     * El usuario podrá seleccionar el seguro SOAP que prefiera.
     * Para proceder con el pago, el usuario verá un botón "Pagar SOAP con WebPay" que lo llevará a la pasarela de pago segura de WebPay.
-
+"""),
+    (("/home/confirmacion-pago-soap", "/home/confirmacion-pago-multas-transito", "/home/confirmacion-pago-multas-rpi"), """
 - Confirmación de Pago SOAP, Multas de Tránsito y Multas RPI (/home/confirmacion-pago-soap, /home/confirmacion-pago-multas-transito, /home/confirmacion-pago-multas-rpi):
     * En estas secciones, el usuario verá un resumen de su pago del SOAP o multas una vez que haya completado la transacción.
     * El usuario podrá ver si el pago fue exitoso o fallido.
     * Aquí podrá descargar su comprobante de pago en formato PDF (obviamente si el pago fue exitoso).
     * Tendrá a su disposición un botón para continuar en la sección de Validaciones de Pago del vehículo que estaba pagando.
-
+"""),
+    (("/home/historial-pagos",), """
 - Historial de Pagos (/home/historial-pagos):
     * En esta sección, el usuario puede revisar todos sus pagos realizados a través de TU PERMISO.
     * El usuario verá una lista de pagos con detalles como fecha, monto, tipo de pago (permiso de circulación, SOAP, multas) y la cuota pagada (1 de 1, 1 de 2 y/o 2 de 2).
     * El usuario tiene a su disposición un botón "Ver Permiso" para poder ver el permiso de circulación pagado y descargarlo en formato PDF si así lo desea.
+"""),
+]
+PAGINAS = {ruta: seccion for rutas, seccion in SECCIONES_PAGINA for ruta in rutas}
 
-"""
+# Preguntas frecuentes que se responden sin llamar al LLM (config.recuperacion).
+# Cada una tiene varias formas de preguntarla; el índice BM25 se construye con ellas.
+PREGUNTAS_FRECUENTES = [
+    {
+        "preguntas": [
+            "¿Cómo pago el permiso de circulación en cuotas?",
+            "¿Puedo pagar el permiso en dos cuotas?",
+            "¿Cómo pago en cuotas con tarjeta de crédito?",
+        ],
+        "respuesta": "<p>Puedes pagar tu permiso de circulación en <b>una o dos cuotas</b>. En la página <b>Validaciones de Pago</b>, en la parte inferior derecha, elige con el selector si quieres pagar en una o dos cuotas y luego presiona <b>\"Pagar Permiso\"</b>.</p><p>Si eliges dos cuotas, cada cuota se paga a través de WebPay y, con tarjeta de crédito, puedes además pagarla en cuotas mensuales.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Qué significa \"Apto para pagar\"?",
+            "¿Qué quiere decir el estado apto para pagar de mi vehículo?",
+        ],
+        "respuesta": "<p><b>\"Apto para pagar\"</b> significa que tu vehículo tiene todos sus documentos vigentes (SOAP y Revisión Técnica) y puede pagar su permiso de circulación.</p><p>Para continuar, presiona <b>\"Ver\"</b> en la fila del vehículo y sigue el proceso de pago.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Qué significa \"Al día\"?",
+            "¿Qué quiere decir el estado al día de mi vehículo?",
+        ],
+        "respuesta": "<p><b>\"Al día\"</b> significa que tu vehículo tiene todos sus documentos vigentes y no posee multas impagas.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Qué significa \"Presenta problemas\"?",
+            "¿Por qué mi vehículo aparece con el estado presenta problemas?",
+        ],
+        "respuesta": "<p><b>\"Presenta problemas\"</b> significa que tu vehículo tiene documentos vencidos o multas impagas.</p><p>Presiona <b>\"Ver\"</b> en la fila del vehículo para revisar cada validación. Desde ahí puedes usar <b>\"Ver y pagar\"</b> para pagar multas de tránsito o RPI y renovar el SOAP.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Dónde descargo mi permiso de circulación?",
+            "¿Cómo descargo el permiso de circulación pagado en PDF?",
+            "¿Dónde obtengo el comprobante de pago?",
+        ],
+        "respuesta": "<p>Una vez realizado el pago, en la página de <b>Confirmación de Pago</b> puedes descargar el comprobante y el permiso de circulación digital en PDF.</p><p>También puedes descargarlo después desde <b>Historial de Pagos</b>, con el botón <b>\"Ver Permiso\"</b>.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Qué requisitos necesito para pagar el permiso de circulación?",
+            "¿Por qué no puedo pagar mi permiso de circulación?",
+        ],
+        "respuesta": "<p>Para pagar el permiso de circulación necesitas:</p><ul><li>SOAP vigente.</li><li>Revisión Técnica al día.</li><li>No tener multas de tránsito ni multas RPI impagas.</li><li>Que el vehículo no tenga encargo por robo.</li></ul><p>Puedes revisar estas validaciones en la página <b>Validaciones de Pago</b>.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Qué medios de pago aceptan?",
+            "¿Puedo pagar con tarjeta de débito, crédito o prepago?",
+            "¿Cómo se paga, con WebPay?",
+        ],
+        "respuesta": "<p>El pago se realiza a través de <b>WebPay</b> con tarjetas de <b>crédito, débito y prepago</b>.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Cómo inicio sesión en TU PERMISO?",
+            "¿Cómo ingreso con Clave Única?",
+        ],
+        "respuesta": "<p>Ingresas con tu <b>RUT y Clave Única</b> del Registro Civil, usando el botón <b>\"Iniciar Sesión\"</b> en la parte superior derecha de la página de inicio.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Dónde veo mis documentos vehiculares?",
+            "¿Dónde veo el padrón, SOAP y revisión técnica de mi vehículo?",
+        ],
+        "respuesta": "<p>En <b>Mis Documentos</b> (botón <b>\"Ver Documentos Vehículares\"</b> del inicio) verás tus vehículos con sus documentos. Presiona <b>\"Padrón\"</b>, <b>\"Permiso\"</b>, <b>\"SOAP\"</b> o <b>\"Revisión\"</b> para abrir el documento en PDF y revisarlo o descargarlo.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Cómo pago el permiso de otro vehículo?",
+            "¿Puedo pagar el permiso de un vehículo que no está a mi nombre?",
+        ],
+        "respuesta": "<p>En <b>Ver Vehículos</b>, usa la opción <b>\"Pagar otro Vehículo\"</b> e ingresa la placa patente única (PPU) del vehículo para pagar su permiso de circulación.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Cómo guardo, edito o elimino un vehículo guardado?",
+            "¿Cómo cambio el nombre de un vehículo guardado?",
+        ],
+        "respuesta": "<p>En <b>Ver Vehículos</b>, en la opción <b>\"Vehículos Guardados\"</b>, puedes ver los vehículos que guardaste y usar los botones <b>\"Editar\"</b> (para cambiar su nombre) y <b>\"Eliminar\"</b>.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Cómo renuevo el SOAP?",
+            "¿Puedo pagar el SOAP vencido en TU PERMISO?",
+        ],
+        "respuesta": "<p>Si tu SOAP está vencido, en <b>Validaciones de Pago</b> verás el botón <b>\"Ver y pagar\"</b>. Ahí puedes elegir entre los seguros SOAP de distintas aseguradoras y pagarlo con <b>\"Pagar SOAP con WebPay\"</b>.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Cómo pago mis multas de tránsito o RPI?",
+            "¿Puedo pagar las multas impagas en TU PERMISO?",
+        ],
+        "respuesta": "<p>Si tienes multas de tránsito o RPI impagas, en <b>Validaciones de Pago</b> verás el botón <b>\"Ver y pagar\"</b> para revisarlas y pagarlas en la plataforma antes de pagar el permiso de circulación.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Dónde veo mi historial de pagos?",
+            "¿Dónde reviso los pagos que he realizado?",
+        ],
+        "respuesta": "<p>En <b>Historial de Pagos</b> verás todos tus pagos con su fecha, monto, tipo de pago y la cuota pagada. Con el botón <b>\"Ver Permiso\"</b> puedes ver y descargar el permiso pagado.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Existe una aplicación móvil de TU PERMISO?",
+            "¿Hay app para Android o iOS?",
+        ],
+        "respuesta": "<p>Sí, la aplicación <b>TU PERMISO MOVIL</b> está disponible para Android e iOS y te da acceso rápido a tus documentos vehiculares desde tu teléfono.</p>",
+    },
+    {
+        "preguntas": [
+            "¿Se emite el permiso de circulación físico o impreso?",
+            "¿Dónde retiro el permiso en papel?",
+        ],
+        "respuesta": "<p>Desde 2025 no se emiten permisos físicos: el permiso de circulación es <b>digital</b> y lo puedes descargar en PDF una vez realizado el pago.</p>",
+    },
+]
+INDICE_FAQ = IndiceBM25([" ".join(faq["preguntas"]) for faq in PREGUNTAS_FRECUENTES])
+
+# El portal envía la página del usuario en "contexto_adicional" (ej: "Ruta actual: /home/ver-documentos")
+RUTA_ACTUAL = re.compile(r"Ruta actual:\s*(\S+)")
+
+def ruta_seccion(pagina: Optional[str]) -> Optional[str]:
+    """Ruta con sección propia de la página o, si no tiene, de la página padre más cercana"""
+    if not pagina:
+        return None
+    ruta = pagina.split("?")[0].rstrip("/") or "/"
+    while ruta not in PAGINAS:
+        if "/" not in ruta[1:]:
+            return None
+        ruta = ruta.rsplit("/", 1)[0]
+    return ruta
+
+def seccion_pagina(pagina: Optional[str]) -> Optional[str]:
+    ruta = ruta_seccion(pagina)
+    return PAGINAS[ruta] if ruta else None
 
 class GeminiChatbot:
-    def __init__(self, api_key: Optional[str] = None):
-        """Inicializa el cliente de Gemini"""
-        # Obtener API Key de variable de entorno
-        key = api_key or os.getenv("GEMINI_API_KEY")
-        
-        if not key:
-            raise ValueError("GEMINI_API_KEY no configurada en variables de entorno")
-        
-        genai.configure(api_key=key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        self.chat_history = []
-    
-    def enviar_mensaje(self, mensaje: str, contexto_adicional: Optional[str] = None) -> str:
+    """
+    Responde las consultas del chatbot. Primero busca una respuesta local (pregunta
+    frecuente o respuesta anterior del LLM en caché) y solo si no la encuentra
+    consulta a Gemini con el cliente compartido (config.gemini).
+    """
+
+    def instrucciones(self, pagina: Optional[str] = None) -> str:
+        """Contexto general más la sección de la página del usuario (si se conoce)"""
+        seccion = seccion_pagina(pagina)
+        if seccion is None:
+            return CONTEXTO_GENERAL
+        return CONTEXTO_GENERAL + "\nInformación de la página en la que se encuentra el usuario:\n" + seccion
+
+    def prompt(self, mensaje: str, contexto_adicional: Optional[str] = None, conversacion: Optional[dict] = None) -> str:
+        prompt = ""
+        # Historial de la sesión: resumen de los turnos antiguos y los últimos turnos completos
+        if conversacion and conversacion["resumen"]:
+            prompt += f"Resumen de la conversación anterior:\n{conversacion['resumen']}\n\n"
+        if conversacion and conversacion["turnos"]:
+            prompt += "Historial de conversación:\n"
+            for usuario, asistente in conversacion["turnos"]:
+                prompt += f"Usuario: {usuario}\nAsistente: {asistente}\n\n"
+        if contexto_adicional:
+            prompt += f"Información adicional: {contexto_adicional}\n\n"
+        prompt += f"Usuario: {mensaje}\nAsistente:"
+        return prompt
+
+    def _clave_cache(self, mensaje: str, contexto_adicional: Optional[str], pagina: Optional[str], conversacion: Optional[dict] = None):
         """
-        Envía un mensaje a Gemini y obtiene respuesta
-        
-        Args:
-            mensaje: El mensaje del usuario
-            contexto_adicional: Contexto adicional (ej: datos del sistema TU PERMISO)
-        
-        Returns:
-            Respuesta de Gemini
+        Clave (sección de la página, pregunta normalizada). Es None si la caché está
+        deshabilitada, si el contexto adicional trae algo más que la ruta actual o si
+        la sesión tiene historial (la respuesta podría depender de ese contexto).
         """
+        if not CHATBOT_CACHE_ENABLED or RUTA_ACTUAL.sub("", contexto_adicional or "").strip():
+            return None
+        if conversacion and (conversacion["turnos"] or conversacion["resumen"]):
+            return None
+        pregunta = clave_pregunta(mensaje)
+        return (ruta_seccion(pagina), pregunta) if pregunta else None
+
+    def respuesta_local(self, mensaje: str, contexto_adicional: Optional[str] = None, pagina: Optional[str] = None,
+                        conversacion: Optional[dict] = None):
+        """Retorna (origen, respuesta) si hay una respuesta sin llamar al LLM, o None"""
+        inicio = time.perf_counter()
+        if CHATBOT_FAQ_ENABLED:
+            resultado = INDICE_FAQ.buscar(mensaje)
+            if resultado and resultado[1] >= CHATBOT_FAQ_UMBRAL:
+                estadisticas_chatbot.registrar("faq", (time.perf_counter() - inicio) * 1000)
+                return "faq", PREGUNTAS_FRECUENTES[resultado[0]]["respuesta"]
+        clave = self._clave_cache(mensaje, contexto_adicional, pagina, conversacion)
+        respuesta = cache_respuestas_chatbot.obtener(clave) if clave else None
+        if respuesta is not None:
+            estadisticas_chatbot.registrar("cache", (time.perf_counter() - inicio) * 1000)
+            return "cache", respuesta
+        return None
+
+    def _registrar_llm(self, mensaje, contexto_adicional, pagina, conversacion, respuesta: str, inicio: float):
+        estadisticas_chatbot.registrar("llm", (time.perf_counter() - inicio) * 1000)
+        clave = self._clave_cache(mensaje, contexto_adicional, pagina, conversacion)
+        if clave and respuesta:
+            cache_respuestas_chatbot.guardar(clave, respuesta)
+
+    async def enviar_mensaje(self, mensaje: str, contexto_adicional: Optional[str] = None, pagina: Optional[str] = None,
+                             conversacion: Optional[dict] = None) -> str:
+        """Envía un mensaje a Gemini y retorna la respuesta completa"""
+        inicio = time.perf_counter()
+        respuesta = await cliente_gemini.generar(self.prompt(mensaje, contexto_adicional, conversacion), self.instrucciones(pagina))
+        self._registrar_llm(mensaje, contexto_adicional, pagina, conversacion, respuesta, inicio)
+        return respuesta
+
+    async def enviar_mensaje_stream(self, mensaje: str, contexto_adicional: Optional[str] = None, pagina: Optional[str] = None,
+                                    conversacion: Optional[dict] = None):
+        """Envía un mensaje a Gemini y entrega los fragmentos de la respuesta a medida que llegan"""
+        inicio = time.perf_counter()
+        partes = []
+        flujo = cliente_gemini.generar_stream(self.prompt(mensaje, contexto_adicional, conversacion), self.instrucciones(pagina))
         try:
-            # Construir el prompt con el contexto del sistema
-            prompt = CONTEXTO_SISTEMA + "\n\n"
-            
-            # Agregar historial de conversación para mantener contexto
-            if self.chat_history:
-                prompt += "Historial de conversación:\n"
-                for item in self.chat_history[-5:]:  # Últimos 5 mensajes
-                    prompt += f"Usuario: {item['usuario']}\nAsistente: {item['asistente']}\n\n"
-            
-            # Agregar contexto adicional si existe
-            if contexto_adicional:
-                prompt += f"Información adicional: {contexto_adicional}\n\n"
-            
-            # Agregar el mensaje del usuario
-            prompt += f"Usuario: {mensaje}\nAsistente:"
-            
-            response = self.model.generate_content(prompt)
-            respuesta = response.text.strip()
-            
-            # Guardar en historial
-            self.chat_history.append({
-                "usuario": mensaje,
-                "asistente": respuesta
-            })
-            
-            return respuesta
-        except Exception as e:
-            raise Exception(f"Error al comunicarse con Gemini: {str(e)}")
+            async for texto in flujo:
+                partes.append(texto)
+                yield texto
+        finally:
+            await flujo.aclose()
+        self._registrar_llm(mensaje, contexto_adicional, pagina, conversacion, "".join(partes).strip(), inicio)
+
+# Instancia única para toda la aplicación
+gemini_chatbot = GeminiChatbot()
 
 # Modelo de datos para la solicitud
 class ChatbotRequest(BaseModel):
     mensaje: str
     contexto_adicional: Optional[str] = None
+    pagina: Optional[str] = None
+    sesion_id: Optional[str] = None
+
+def _validar(request: ChatbotRequest) -> Optional[str]:
+    """Valida la solicitud y retorna la página del usuario"""
+    if not request.mensaje:
+        raise HTTPException(status_code=400, detail="El campo 'mensaje' es obligatorio.")
+    if request.sesion_id is not None and not SESION_VALIDA.match(request.sesion_id):
+        raise HTTPException(status_code=400, detail="sesion_id inválido (8 a 64 caracteres: letras, números, '-' o '_')")
+    if request.pagina:
+        return request.pagina
+    ruta = RUTA_ACTUAL.search(request.contexto_adicional or "")
+    return ruta.group(1) if ruta else None
+
+def _saturado() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="El asistente está atendiendo muchas consultas, intenta nuevamente en unos segundos",
+        headers={"Retry-After": "5"}
+    )
+
+def _evento(tipo: str, datos: dict) -> str:
+    return f"event: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
 
 # Endpoint para interactuar con el chatbot Gemini
 @router.post("/chatbot/gemini")
@@ -197,23 +417,96 @@ async def chat_with_gemini(request: ChatbotRequest):
     Request Body:
         {
             "mensaje": "Tu mensaje aquí",
-            "contexto_adicional": "Contexto adicional (opcional)"
+            "contexto_adicional": "Contexto adicional (opcional)",
+            "pagina": "Ruta del portal en la que está el usuario (opcional, ej: /home/ver-documentos)",
+            "sesion_id": "Identificador de la conversación (opcional, ej: UUID generado por el portal)"
         }
     
     Returns:
         {
-            "respuesta": "Respuesta del chatbot"
+            "respuesta": "Respuesta del chatbot",
+            "origen": "faq" | "cache" | "llm"
         }
     """
-    mensaje = request.mensaje
-    contexto_adicional = request.contexto_adicional
+    pagina = _validar(request)
+    conversacion = await memoria_chatbot.obtener(request.sesion_id) if request.sesion_id else None
+    local = gemini_chatbot.respuesta_local(request.mensaje, request.contexto_adicional, pagina, conversacion)
+    if local is not None:
+        origen, respuesta = local
+    else:
+        try:
+            origen = "llm"
+            respuesta = await gemini_chatbot.enviar_mensaje(request.mensaje, request.contexto_adicional, pagina, conversacion)
+        except GeminiSaturadoError:
+            raise _saturado()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    if request.sesion_id:
+        await memoria_chatbot.agregar(request.sesion_id, request.mensaje, respuesta)
+    return {"respuesta": respuesta, "origen": origen}
 
-    if not mensaje:
-        raise HTTPException(status_code=400, detail="El campo 'mensaje' es obligatorio.")
-    
+# Endpoint con la respuesta por partes (Server-Sent Events)
+@router.post("/chatbot/gemini/stream")
+async def chat_with_gemini_stream(request: ChatbotRequest):
+    """
+    Mismo Request Body que /chatbot/gemini. Responde con text/event-stream:
+        event: token   data: {"texto": "fragmento de la respuesta"}   (uno o más)
+        event: fin     data: {"origen": "faq" | "cache" | "llm"}
+        event: error   data: {"detalle": "..."}                       (si falla a mitad de la respuesta)
+    Las respuestas locales (faq, cache) se entregan en un solo fragmento.
+    """
+    pagina = _validar(request)
+    conversacion = await memoria_chatbot.obtener(request.sesion_id) if request.sesion_id else None
+    local = gemini_chatbot.respuesta_local(request.mensaje, request.contexto_adicional, pagina, conversacion)
+    if local is not None:
+        origen, respuesta = local
+        if request.sesion_id:
+            await memoria_chatbot.agregar(request.sesion_id, request.mensaje, respuesta)
+        return StreamingResponse(
+            iter([_evento("token", {"texto": respuesta}), _evento("fin", {"origen": origen})]),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    flujo = gemini_chatbot.enviar_mensaje_stream(request.mensaje, request.contexto_adicional, pagina, conversacion)
+    # Se espera el primer fragmento antes de responder para informar la saturación o
+    # los errores con el código HTTP correspondiente
     try:
-        chatbot = GeminiChatbot()
-        respuesta = chatbot.enviar_mensaje(mensaje, contexto_adicional)
-        return {"respuesta": respuesta}
+        primero = await anext(flujo)
+    except StopAsyncIteration:
+        primero = ""
+    except GeminiSaturadoError:
+        raise _saturado()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def eventos():
+        partes = [primero]
+        try:
+            if primero:
+                yield _evento("token", {"texto": primero})
+            async for texto in flujo:
+                partes.append(texto)
+                yield _evento("token", {"texto": texto})
+            # El turno se guarda solo si la respuesta llegó completa
+            if request.sesion_id:
+                await memoria_chatbot.agregar(request.sesion_id, request.mensaje, "".join(partes))
+            yield _evento("fin", {"origen": "llm"})
+        except GeminiError as e:
+            yield _evento("error", {"detalle": str(e)})
+        finally:
+            await flujo.aclose()
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Endpoint para olvidar una conversación (ej: al cerrar o reiniciar el chat)
+@router.delete("/chatbot/sesion/{sesion_id}")
+async def eliminar_sesion(sesion_id: str):
+    if not SESION_VALIDA.match(sesion_id):
+        raise HTTPException(status_code=400, detail="sesion_id inválido")
+    await memoria_chatbot.eliminar(sesion_id)
+    return {"sesion_id": sesion_id, "eliminada": True}
@@ -4,8 +4,8 @@ from pydantic import BaseModel
 from datetime import date
 
 from patentes_vehiculares_chile import validar_patente
-import requests
 from config.apis import API_CARABINEROS
+from config.http_client import ClientesHTTP, get_clientes_http
 
 # Instanciamos el router
 router = APIRouter()
@@ -16,7 +16,7 @@ router = APIRouter()
 
 # Consultar Encargo por Robo
 @router.get("/consultar_encargo/{ppu}")
-async def consultar_encargo(ppu: str):
+async def consultar_encargo(ppu: str, clientes: ClientesHTTP = Depends(get_clientes_http)):
     # Validar que no tenga caracteres especiales y/o espacios
     if not ppu.isalnum():
         raise HTTPException(status_code=400, detail="PPU no puede contener caracteres especiales o espacios")
@@ -29,7 +29,7 @@ async def consultar_encargo(ppu: str):
     # response = requests.get(f"http://host.docker.internal:5006/encargo_patente/{ppu}")
     
     # Consultar usando variable de entorno
-    response = requests.get(f"{API_CARABINEROS}/encargo_patente/{ppu}")
+    response = await clientes.get_cacheado("CARABINEROS", f"{API_CARABINEROS}/encargo_patente/{ppu}")
 
     if response.status_code == 200:
         # La respuesta debe entregar el valor de la variable "encargo"
@@ -1,9 +1,63 @@
 # Importamos librerías necesarias
 from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+
+from config.database import get_db_analitica
+from config.models import LogConsultaPropietario
+from config.paginacion import paginar, filtro_rango, TotalAproximadoModel
 
 # Instanciamos el router
 router = APIRouter()
 
+# Modelos Pydantic de la respuesta
+class LogConsultaPropietarioCompleteModel(BaseModel):
+    id: int
+    rut: str
+    ppu: str
+    fecha: datetime
+
+class PaginaLogsConsultasModel(BaseModel):
+    resultados: List[LogConsultaPropietarioCompleteModel]
+    cantidad: int
+    cursor_siguiente: Optional[str] = None
+    total: Optional[TotalAproximadoModel] = None
+
 #####################################################
 # Definimos los endpoints del router
-#####################################################
\ No newline at end of file
+#####################################################
+
+# Navegar los logs de consultas de propietarios, del más reciente al más antiguo
+@router.get("/consultar_logs_consultas_realizadas/", response_model=PaginaLogsConsultasModel, response_model_exclude_none=True)
+def consultar_logs_consultas_realizadas(
+    rut: Optional[str] = None,
+    ppu: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None,
+    incluir_total: bool = False,
+    db: Session = Depends(get_db_analitica)
+):
+    """
+    Parameters (todos opcionales):
+      "rut", "ppu",
+      "from_date": "YYYY-MM-DD", "to_date": "YYYY-MM-DD" (incluido),
+      "limite": filas por página,
+      "cursor": "cursor_siguiente" de la página anterior,
+      "incluir_total": agrega el total aproximado de filas que cumplen los filtros
+    """
+    rut = rut.strip() if rut else None
+    ppu = ppu.strip().upper() if ppu else None
+    filtros = {"rut": rut, "ppu": ppu, "from_date": from_date, "to_date": to_date}
+
+    condiciones = filtro_rango(LogConsultaPropietario.fecha, from_date, to_date)
+    if rut:
+        condiciones.append(LogConsultaPropietario.rut == rut)
+    if ppu:
+        condiciones.append(LogConsultaPropietario.ppu == ppu)
+
+    return paginar(db, LogConsultaPropietario, LogConsultaPropietario.fecha, condiciones, filtros,
+                   limite=limite, cursor=cursor, incluir_total=incluir_total)
@@ -1,9 +1,87 @@
 # Importamos librerías necesarias
 from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Optional
+
+from config.database import get_db_analitica
+from config.models import LogFiscalizacion
+from config.paginacion import paginar, filtro_rango, TotalAproximadoModel
 
 # Instanciamos el router
 router = APIRouter()
 
+# Modelos Pydantic de la respuesta
+class LogFiscalizacionCompleteModel(BaseModel):
+    id: int
+    ppu: str
+    rut_fiscalizador: str
+    fecha: datetime
+    vigencia_permiso: bool
+    vigencia_revision: bool
+    vigencia_soap: bool
+    encargo_robo: bool
+    multas: bool
+
+class PaginaLogsFiscalizacionModel(BaseModel):
+    resultados: List[LogFiscalizacionCompleteModel]
+    cantidad: int
+    cursor_siguiente: Optional[str] = None
+    total: Optional[TotalAproximadoModel] = None
+
 #####################################################
 # Definimos los endpoints del router
-#####################################################
\ No newline at end of file
+#####################################################
+
+# Navegar los logs de fiscalización, del más reciente al más antiguo
+@router.get("/consultar_logs_fiscalizacion/", response_model=PaginaLogsFiscalizacionModel, response_model_exclude_none=True)
+def consultar_logs_fiscalizacion(
+    ppu: Optional[str] = None,
+    rut_fiscalizador: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    vigencia_permiso: Optional[bool] = None,
+    vigencia_revision: Optional[bool] = None,
+    vigencia_soap: Optional[bool] = None,
+    encargo_robo: Optional[bool] = None,
+    multas: Optional[bool] = None,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None,
+    incluir_total: bool = False,
+    db: Session = Depends(get_db_analitica)
+):
+    """
+    Parameters (todos opcionales):
+      "ppu", "rut_fiscalizador",
+      "from_date": "YYYY-MM-DD", "to_date": "YYYY-MM-DD" (incluido),
+      "vigencia_permiso", "vigencia_revision", "vigencia_soap", "encargo_robo", "multas": true | false,
+      "limite": filas por página,
+      "cursor": "cursor_siguiente" de la página anterior,
+      "incluir_total": agrega el total aproximado de filas que cumplen los filtros
+    """
+    ppu = ppu.strip().upper() if ppu else None
+    rut_fiscalizador = rut_fiscalizador.strip() if rut_fiscalizador else None
+    filtros = {
+        "ppu": ppu,
+        "rut_fiscalizador": rut_fiscalizador,
+        "from_date": from_date,
+        "to_date": to_date,
+        "vigencia_permiso": vigencia_permiso,
+        "vigencia_revision": vigencia_revision,
+        "vigencia_soap": vigencia_soap,
+        "encargo_robo": encargo_robo,
+        "multas": multas,
+    }
+
+    condiciones = filtro_rango(LogFiscalizacion.fecha, from_date, to_date)
+    if ppu:
+        condiciones.append(LogFiscalizacion.ppu == ppu)
+    if rut_fiscalizador:
+        condiciones.append(LogFiscalizacion.rut_fiscalizador == rut_fiscalizador)
+    for campo in ("vigencia_permiso", "vigencia_revision", "vigencia_soap", "encargo_robo", "multas"):
+        if filtros[campo] is not None:
+            condiciones.append(getattr(LogFiscalizacion, campo) == filtros[campo])
+
+    return paginar(db, LogFiscalizacion, LogFiscalizacion.fecha, condiciones, filtros,
+                   limite=limite, cursor=cursor, incluir_total=incluir_total)
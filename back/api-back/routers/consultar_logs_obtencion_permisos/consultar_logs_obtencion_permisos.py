@@ -1,9 +1,77 @@
 # Importamos librerías necesarias
 from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import List, Optional
+
+from config.database import get_db_analitica
+from config.models import PermisoCirculacion
+from config.paginacion import paginar, filtro_rango, TotalAproximadoModel
 
 # Instanciamos el router
 router = APIRouter()
 
+# Modelos Pydantic de la respuesta
+class PermisoEmitidoModel(BaseModel):
+    id: int
+    ppu: str
+    rut: str
+    nombre: str
+    fecha_emision: date
+    fecha_expiracion: date
+    valor_permiso: int
+    tipo_vehiculo: str
+    marca: str
+    modelo: str
+    anio: int
+
+class PaginaPermisosModel(BaseModel):
+    resultados: List[PermisoEmitidoModel]
+    cantidad: int
+    cursor_siguiente: Optional[str] = None
+    total: Optional[TotalAproximadoModel] = None
+
 #####################################################
 # Definimos los endpoints del router
-#####################################################
\ No newline at end of file
+#####################################################
+
+# Navegar los permisos de circulación obtenidos, del más reciente al más antiguo
+@router.get("/consultar_logs_obtencion_permisos/", response_model=PaginaPermisosModel, response_model_exclude_none=True)
+def consultar_logs_obtencion_permisos(
+    ppu: Optional[str] = None,
+    rut: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    vigente: Optional[bool] = None,
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None,
+    incluir_total: bool = False,
+    db: Session = Depends(get_db_analitica)
+):
+    """
+    Parameters (todos opcionales):
+      "ppu", "rut",
+      "from_date": "YYYY-MM-DD", "to_date": "YYYY-MM-DD" (incluido, por fecha de emisión),
+      "vigente": true | false (según la fecha de expiración),
+      "limite": filas por página,
+      "cursor": "cursor_siguiente" de la página anterior,
+      "incluir_total": agrega el total aproximado de filas que cumplen los filtros
+    """
+    ppu = ppu.strip().upper() if ppu else None
+    rut = rut.strip() if rut else None
+    hoy = date.today()
+    # La fecha del día forma parte de los filtros: un cursor de "vigente" no sirve al día siguiente
+    filtros = {"ppu": ppu, "rut": rut, "from_date": from_date, "to_date": to_date,
+               "vigente": vigente, "hoy": hoy if vigente is not None else None}
+
+    condiciones = filtro_rango(PermisoCirculacion.fecha_emision, from_date, to_date)
+    if ppu:
+        condiciones.append(PermisoCirculacion.ppu == ppu)
+    if rut:
+        condiciones.append(PermisoCirculacion.rut == rut)
+    if vigente is not None:
+        condiciones.append(PermisoCirculacion.fecha_expiracion >= hoy if vigente else PermisoCirculacion.fecha_expiracion < hoy)
+
+    return paginar(db, PermisoCirculacion, PermisoCirculacion.fecha_emision, condiciones, filtros,
+                   limite=limite, cursor=cursor, incluir_total=incluir_total)
@@ -4,8 +4,9 @@ from pydantic import BaseModel
 from datetime import date
 
 from patentes_vehiculares_chile import validar_patente
-import requests
+import httpx
 from config.apis import API_SRCEI
+from config.http_client import ClientesHTTP, get_clientes_http
 
 # Instanciamos el router
 router = APIRouter()
@@ -31,7 +32,7 @@ class PadronModel(BaseModel):
 
 # Consultar Patente
 @router.get("/consultar_patente/{ppu}")
-async def consultar_patente(ppu: str):
+async def consultar_patente(ppu: str, clientes: ClientesHTTP = Depends(get_clientes_http)):
     
     # Validar formato patente
     if not validar_patente(ppu):
@@ -43,7 +44,7 @@ async def consultar_patente(ppu: str):
     
     # Consultar patente a la API AACH usando variable de entorno
     try:
-        response = requests.get(f"{API_SRCEI}/padron/vehiculo/{ppu}")  # Usar variable de entorno
+        response = await clientes.get_cacheado("SRCEI", f"{API_SRCEI}/padron/vehiculo/{ppu}")  # Usar variable de entorno
         
         # Si obtuvimos una respuesta exitosa retornamos el padron
         if response.status_code == 200:
@@ -56,5 +57,5 @@ async def consultar_patente(ppu: str):
             raise HTTPException(status_code=response.status_code, detail="Error en el servicio de padrón")
             
     # Si ocurre un error de conexión, lanzamos una excepción HTTP
-    except requests.RequestException as e:
+    except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Error al conectar con el servicio de padrón: {str(e)}")
\ No newline at end of file
@@ -4,8 +4,8 @@ from pydantic import BaseModel
 from datetime import date
 
 from patentes_vehiculares_chile import validar_patente
-import requests
 from config.apis import API_TGR
+from config.http_client import ClientesHTTP, get_clientes_http
 
 # Instanciamos el router
 router = APIRouter()
@@ -16,7 +16,7 @@ router = APIRouter()
 
 # Endpoint para consultar el permiso de circulación a la API http://host.docker.internal:5007/consultar_permiso/{ppu}
 @router.get("/consultar_permiso_circulacion/{patente}")
-async def consultar_permiso_circulacion(patente: str):
+async def consultar_permiso_circulacion(patente: str, clientes: ClientesHTTP = Depends(get_clientes_http)):
     # Validamos la patente
     if not validar_patente(patente):
         raise HTTPException(status_code=400, detail="Patente inválida")
@@ -25,7 +25,7 @@ async def consultar_permiso_circulacion(patente: str):
     # response = requests.get(f"http://host.docker.internal:5007/consultar_permiso/{patente}")
     
     # Realizamos la consulta usando variable de entorno
-    response = requests.get(f"{API_TGR}/consultar_permiso/{patente}")
+    response = await clientes.get_cacheado("TGR", f"{API_TGR}/consultar_permiso/{patente}", documento="permiso")
     if response.status_code == 404:
         raise HTTPException(status_code=404, detail="Permiso de circulación no encontrado")
     if response.status_code != 200:
@@ -70,12 +70,12 @@ async def consultar_permiso_circulacion(patente: str):
 
 # Consultar permiso de circulación usando el id del permiso
 @router.get("/consultar_permiso_circulacion_id/{id_permiso}")
-async def consultar_permiso_circulacion_id(id_permiso: int):
+async def consultar_permiso_circulacion_id(id_permiso: int, clientes: ClientesHTTP = Depends(get_clientes_http)):
     # [DEPRECATED] Realizamos la consulta al servicio externo
     # response = requests.get(f"http://host.docker.internal:5007/consultar_permiso_id/{id_permiso}")
     
     # Realizamos la consulta usando variable de entorno
-    response = requests.get(f"{API_TGR}/consultar_permiso_id/{id_permiso}")
+    response = await clientes.get_cacheado("TGR", f"{API_TGR}/consultar_permiso_id/{id_permiso}", documento="permiso")
     if response.status_code == 404:
         raise HTTPException(status_code=404, detail="Permiso de circulación no encontrado")
     if response.status_code != 200:
@@ -4,8 +4,8 @@ from datetime import date
 from pydantic import BaseModel
 import httpx
 from typing import List
-import requests 
 from config.apis import API_MTT, RPI
+from config.http_client import ClientesHTTP, get_clientes_http
 
 # Instanciamos el router
 router = APIRouter()
@@ -27,7 +27,7 @@ class MultaRPIResponse(BaseModel):
 #####################################################
 
 @router.get("/consultar-multas-rpi/{rut}", response_model=MultaRPIResponse)
-async def consultar_multas_rpi(rut: str):
+async def consultar_multas_rpi(rut: str, clientes: ClientesHTTP = Depends(get_clientes_http)):
     """
     Consulta la cantidad de multas del propietario asociadas al Registro de Pasajeros Infractores (RPI)
     enviando el RUT del propietario a la API del MTT.
@@ -43,37 +43,36 @@ async def consultar_multas_rpi(rut: str):
         url = f"{RPI}/?rut={rut}"
         
         # Realizar la petición GET a la API del MTT
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+        response = await clientes.get_agrupado("MTT", url)
+
+        # Verificar si la respuesta es exitosa
+        if response.status_code == 200:
+            data = response.json()
             
-            # Verificar si la respuesta es exitosa
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Contar la cantidad de objetos en la respuesta
-                cantidad_multas = len(data) if isinstance(data, list) else 0
-                
-                return MultaRPIResponse(
-                    rut_propietario=rut,
-                    cantidad_multas=cantidad_multas,
-                    multas=data,
-                    mensaje="Cuenta con multas de RPI"
-                )
+            # Contar la cantidad de objetos en la respuesta
+            cantidad_multas = len(data) if isinstance(data, list) else 0
             
-            elif response.status_code == 404:
-                return MultaRPIResponse(
-                    rut_propietario=rut,
-                    cantidad_multas=0,
-                    multas=[],
-                    mensaje="No se encontraron multas para el RUT proporcionado"
-                )
+            return MultaRPIResponse(
+                rut_propietario=rut,
+                cantidad_multas=cantidad_multas,
+                multas=data,
+                mensaje="Cuenta con multas de RPI"
+            )
+        
+        elif response.status_code == 404:
+            return MultaRPIResponse(
+                rut_propietario=rut,
+                cantidad_multas=0,
+                multas=[],
+                mensaje="No se encontraron multas para el RUT proporcionado"
+            )
+        
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Error al consultar la API del MTT: {response.text}"
+            )
             
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Error al consultar la API del MTT: {response.text}"
-                )
-                
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=500,
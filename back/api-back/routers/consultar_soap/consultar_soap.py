@@ -4,8 +4,8 @@ from pydantic import BaseModel
 from datetime import date
 
 from patentes_vehiculares_chile import validar_patente
-import requests
 from config.apis import API_AACH
+from config.http_client import ClientesHTTP, get_clientes_http
 
 # Instanciamos el router
 router = APIRouter()
@@ -16,7 +16,7 @@ router = APIRouter()
 
 # Endpoint para consultar el SOAP del endpoint http://host.docker.internal:5003/soap/{ppu}
 @router.get("/consultar_soap/{ppu}")
-async def consultar_soap(ppu: str):
+async def consultar_soap(ppu: str, clientes: ClientesHTTP = Depends(get_clientes_http)):
   # Validar que la PPU no tenga carácteres especiales
   if not ppu.isalnum():
       raise HTTPException(status_code=400, detail="Patente inválida")
@@ -27,7 +27,7 @@ async def consultar_soap(ppu: str):
   # [DEPRECATED] response = requests.get(f"http://host.docker.internal:5003/soap/{ppu}")
   
   # Consultar usando variable de entorno
-  response = requests.get(f"{API_AACH}/soap/{ppu}")
+  response = await clientes.get_cacheado("AACH", f"{API_AACH}/soap/{ppu}", documento="soap")
   
   if response.status_code == 404:
       raise HTTPException(status_code=404, detail="No se encontró información para la patente proporcionada")
@@ -4,8 +4,8 @@ from datetime import date
 from pydantic import BaseModel
 import httpx
 from typing import List, Optional
-import requests 
 from config.apis import API_SII, API_TGR, API_SRCEI, TASACION_FISCAL, FACTURA_VENTA, PERMISO_CIRCULACION, PADRON_VEHICULO
+from config.http_client import ClientesHTTP, get_clientes_http
 
 # Instanciamos el router
 router = APIRouter()
@@ -111,7 +111,7 @@ def calcular_proporcional(valor_permiso: int, mes_actual: int) -> int:
     return int(proporcional)
     
 @router.get("/consultar_valor_permiso/{ppu}", response_model=ValorPermiso)
-async def consultar_valor_permiso(ppu: str):
+async def consultar_valor_permiso(ppu: str, clientes: ClientesHTTP = Depends(get_clientes_http)):
     # Consultar si existe un permiso anterior vinculado a la PPU
     valor_permiso = 0
     
@@ -126,7 +126,7 @@ async def consultar_valor_permiso(ppu: str):
     equipamiento = None
     tasacion = None
 
-    response = requests.get(f"{PERMISO_CIRCULACION}/{ppu}")
+    response = await clientes.get_cacheado("TGR", f"{PERMISO_CIRCULACION}/{ppu}", documento="permiso")
     if response.status_code == 200:
         estado_permiso = "renovación"
         permiso = response.json()
@@ -138,7 +138,7 @@ async def consultar_valor_permiso(ppu: str):
     # Si es renovación obtener código desde permiso de circulación anterior
     if estado_permiso == "renovación":
         codigo_sii = permiso.get("codigo_sii")
-        response = requests.get(f"{TASACION_FISCAL}/?codigo_sii={codigo_sii}")
+        response = await clientes.get("SII", f"{TASACION_FISCAL}/?codigo_sii={codigo_sii}")
         if response.status_code == 200:
             valor_permiso = tiene_tasa_fija(permiso.get("tipo_vehiculo"), permiso.get("carga", 0))
             sii_data = response.json()
@@ -174,7 +174,7 @@ async def consultar_valor_permiso(ppu: str):
     # Si es primera obtención, obtener el valor del vehiculo desde la factura y calcular el valor del permiso    
     if estado_permiso == "primera obtención":
         # Consultar Padrón
-        response = requests.get(f"{PADRON_VEHICULO}/{ppu}")
+        response = await clientes.get("SRCEI", f"{PADRON_VEHICULO}/{ppu}")
         if response.status_code == 200:
             padron = response.json()
             num_chasis = padron.get("num_chasis")
@@ -183,7 +183,7 @@ async def consultar_valor_permiso(ppu: str):
         else:
             raise HTTPException(status_code=500, detail="Error al consultar el Padrón")
         # Consultar Factura
-        response = requests.get(f"{FACTURA_VENTA}/?num_chasis={num_chasis}")
+        response = await clientes.get("SII", f"{FACTURA_VENTA}/?num_chasis={num_chasis}")
         if response.status_code == 200:
             factura = response.json()
             valor_permiso = tiene_tasa_fija(factura.get("tipo_vehiculo"), factura.get("carga", 0))
@@ -1,95 +1,88 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from datetime import date, datetime
 import os
-from pydantic import BaseModel
-from typing import List
-import requests 
-from sqlalchemy import Column, Integer, String, Date, DateTime
+import re
+import json
+import codecs
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+
+from config.database import get_db, SessionLocal
+from config.models import LogConsultaPropietario, LogFiscalizacion
+from config.rollups import registrar_consulta, registrar_fiscalizacion, registrar_fiscalizaciones
+from config.cache import cache_metricas
+from config.buffer_logs import buffer_logs, ColaLlenaError
 
 # Instanciamos el router
 router = APIRouter()
 
-#######################################
-# Conexión a la base de datos
-#######################################
-
-load_dotenv()
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_name = os.getenv("DB_NAME")
-DATABASE_URL = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Base de datos declarativa
-Base = declarative_base()
-
-# Modelo SQL Alchemy para logs consultas propietarios
-class LogConsultaPropietario(Base):
-    __tablename__ = "log_consultas_propietarios"
-    id = Column(Integer, primary_key=True, index=True)
-    rut = Column(String(12), nullable=False)
-    ppu = Column(String(10), nullable=False)
-    fecha = Column(DateTime, nullable=False)
-
-# Modelo SQL Alchemy para logs fiscalización
-class LogFiscalizacion(Base):
-    __tablename__ = "log_fiscalizacion"
-    id = Column(Integer, primary_key=True, index=True)
-    ppu = Column(String(10), nullable=False)
-    rut_fiscalizador = Column(String(12), nullable=False)
-    fecha = Column(DateTime, nullable=False)
-    vigencia_permiso = Column(Integer, nullable=False)  # BOOLEAN as Integer (0/1)
-    vigencia_revision = Column(Integer, nullable=False)
-    vigencia_soap = Column(Integer, nullable=False)
-    encargo_robo = Column(Integer, nullable=False)
-    multas = Column(Integer, nullable=False)  # BOOLEAN as Integer (0/1)
-
 # Modelos Pydantic para validación de datos
+# Los largos máximos son los de las columnas (una fila más larga haría fallar el INSERT)
 class LogConsultaPropietarioModel(BaseModel):
-    rut: str
-    ppu: str
+    rut: str = Field(..., max_length=12)
+    ppu: str = Field(..., max_length=10)
     fecha: datetime
 
 class LogFiscalizacionModel(BaseModel):
-    ppu: str
-    rut_fiscalizador: str
+    ppu: str = Field(..., max_length=10)
+    rut_fiscalizador: str = Field(..., max_length=12)
     fecha: datetime
-    vigencia_permiso: int  # BOOLEAN as Integer (0/1)
-    vigencia_revision: int
-    vigencia_soap: int
-    encargo_robo: int
-    multas: int  # BOOLEAN as Integer (0/1)
+    vigencia_permiso: int = Field(..., ge=0, le=1)  # BOOLEAN as Integer (0/1)
+    vigencia_revision: int = Field(..., ge=0, le=1)
+    vigencia_soap: int = Field(..., ge=0, le=1)
+    encargo_robo: int = Field(..., ge=0, le=1)
+    multas: int = Field(..., ge=0, le=1)  # BOOLEAN as Integer (0/1)
 
-def get_db():
-    db = SessionLocal()
+class LogFiscalizacionBulkModel(LogFiscalizacionModel):
+    id_cliente: Optional[str] = Field(None, min_length=1, max_length=36)  # Clave de idempotencia
+
+# Carga masiva de logs de fiscalización
+BULK_MAX_FILAS = int(os.getenv("LOGS_BULK_MAX_FILAS", "5000"))
+BULK_LOTE = int(os.getenv("LOGS_BULK_LOTE", "500"))
+BULK_MAX_BYTES_FILA = int(os.getenv("LOGS_BULK_MAX_BYTES_FILA", "65536"))
+
+def _encolar(tipo: str, datos: dict, response: Response):
+    """Modo buffer: deja el log en la cola de escritura diferida (202 Accepted)"""
     try:
-        yield db
-    finally:
-        db.close()
+        log_id = buffer_logs.encolar(tipo, datos)
+    except ColaLlenaError:
+        raise HTTPException(
+            status_code=503,
+            detail="Cola de logs llena, intente nuevamente",
+            headers={"Retry-After": "1"}
+        )
+    response.status_code = 202
+    return {"message": "Log entry accepted", "log_id": log_id}
 
 @router.post("/logs_consulta_propietario/", status_code=201)
-def create_log_consulta_propietario(log: LogConsultaPropietarioModel, db: Session = Depends(get_db)):
+def create_log_consulta_propietario(log: LogConsultaPropietarioModel, response: Response, db: Session = Depends(get_db)):
     """Create a new log entry for vehicle owner consultation"""
+    if buffer_logs.habilitado:
+        return _encolar("consulta", log.model_dump(), response)
+
     db_log = LogConsultaPropietario(
         rut=log.rut,
         ppu=log.ppu,
         fecha=log.fecha
     )
     db.add(db_log)
+    registrar_consulta(db, db_log)
     db.commit()
     db.refresh(db_log)
+    cache_metricas.invalidar("consultas", db_log.fecha)
     return {"message": "Log entry created successfully", "log_id": db_log.id}
 
 @router.post("/logs_fiscalizacion/", status_code=201)
-def create_log_fiscalizacion(log: LogFiscalizacionModel, db: Session = Depends(get_db)):
+def create_log_fiscalizacion(log: LogFiscalizacionModel, response: Response, db: Session = Depends(get_db)):
     """Create a new log entry for vehicle inspection"""
+    if buffer_logs.habilitado:
+        return _encolar("fiscalizacion", log.model_dump(), response)
+
     db_log = LogFiscalizacion(
         ppu=log.ppu,
         rut_fiscalizador=log.rut_fiscalizador,
@@ -101,6 +94,210 @@ def create_log_fiscalizacion(log: LogFiscalizacionModel, db: Session = Depends(g
         multas=log.multas
     )
     db.add(db_log)
+    registrar_fiscalizacion(db, db_log)
     db.commit()
     db.refresh(db_log)
-    return {"message": "Log entry created successfully", "log_id": db_log.id}
\ No newline at end of file
+    cache_metricas.invalidar("fiscalizacion", db_log.fecha)
+    return {"message": "Log entry created successfully", "log_id": db_log.id}
+
+#####################################################
+# Carga masiva (dispositivos sin conexión)
+#####################################################
+
+class CuerpoInvalidoError(Exception):
+    """El cuerpo de la carga masiva no se puede seguir leyendo (JSON mal formado o fila demasiado grande)"""
+
+ESPACIOS = re.compile(r"[ \t\n\r]*")
+
+class ArregloIncremental:
+    """
+    Extrae los elementos de un arreglo JSON a medida que llegan los trozos del
+    cuerpo, sin cargar el arreglo completo en memoria. Solo se guarda el texto
+    del elemento que aún no termina de llegar.
+    """
+
+    def __init__(self):
+        self._decodificador = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._texto = ""
+        self._estado = "inicio"   # inicio -> primero | elemento -> separador -> fin
+
+    def agregar(self, trozo: bytes, final: bool = False) -> list:
+        try:
+            texto = self._texto + self._utf8.decode(trozo, final)
+        except UnicodeDecodeError:
+            raise CuerpoInvalidoError("El cuerpo no está en UTF-8")
+        elementos = []
+        pos = 0
+        while True:
+            pos = ESPACIOS.match(texto, pos).end()
+            if pos == len(texto):
+                break
+            caracter = texto[pos]
+            if self._estado == "inicio":
+                if caracter != "[":
+                    raise CuerpoInvalidoError("El cuerpo debe ser un arreglo JSON o NDJSON")
+                self._estado = "primero"
+                pos += 1
+            elif self._estado in ("primero", "elemento"):
+                if caracter == "]" and self._estado == "primero":
+                    self._estado = "fin"
+                    pos += 1
+                    continue
+                try:
+                    valor, fin = self._decodificador.raw_decode(texto, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise CuerpoInvalidoError("JSON inválido")
+                    break   # El elemento sigue en el próximo trozo
+                if fin == len(texto) and not final:
+                    break   # Un número podría continuar en el próximo trozo
+                elementos.append(valor)
+                self._estado = "separador"
+                pos = fin
+            elif self._estado == "separador":
+                if caracter not in ",]":
+                    raise CuerpoInvalidoError("JSON inválido")
+                self._estado = "elemento" if caracter == "," else "fin"
+                pos += 1
+            else:
+                raise CuerpoInvalidoError("Contenido después del arreglo JSON")
+        self._texto = texto[pos:]
+        if len(self._texto) > BULK_MAX_BYTES_FILA:
+            raise CuerpoInvalidoError(f"Fila de más de {BULK_MAX_BYTES_FILA} bytes")
+        if final and self._estado != "fin":
+            raise CuerpoInvalidoError("El cuerpo debe ser un arreglo JSON o NDJSON")
+        return elementos
+
+async def _leer_filas(request: Request):
+    """
+    Entrega las filas del cuerpo a medida que llegan. Con Content-Type
+    application/x-ndjson se procesa línea por línea; si no, se espera un arreglo
+    JSON, que también se procesa por partes (ArregloIncremental).
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        pendiente = b""
+        async for trozo in request.stream():
+            pendiente += trozo
+            *lineas, pendiente = pendiente.split(b"\n")
+            for linea in lineas:
+                if linea.strip():
+                    yield linea
+            if len(pendiente) > BULK_MAX_BYTES_FILA:
+                raise CuerpoInvalidoError(f"Fila de más de {BULK_MAX_BYTES_FILA} bytes")
+        if pendiente.strip():
+            yield pendiente
+    else:
+        arreglo = ArregloIncremental()
+        async for trozo in request.stream():
+            for fila in arreglo.agregar(trozo):
+                yield fila
+        for fila in arreglo.agregar(b"", final=True):
+            yield fila
+
+def _claves_existentes(db: Session, claves: list) -> set:
+    if not claves:
+        return set()
+    filas = db.query(LogFiscalizacion.id_cliente).filter(LogFiscalizacion.id_cliente.in_(claves)).all()
+    return {r.id_cliente for r in filas}
+
+def _insertar_lote_fiscalizacion(lote: list) -> list:
+    """
+    Inserta un lote (executemany) omitiendo las claves de idempotencia ya registradas.
+    Retorna los índices (dentro del lote) de las filas duplicadas.
+    """
+    db = SessionLocal()
+    try:
+        for intento in range(2):
+            existentes = _claves_existentes(db, [f["id_cliente"] for f in lote if f["id_cliente"]])
+            duplicadas = [i for i, f in enumerate(lote) if f["id_cliente"] and f["id_cliente"] in existentes]
+            filas = [f for f in lote if not (f["id_cliente"] and f["id_cliente"] in existentes)]
+            try:
+                if filas:
+                    db.execute(insert(LogFiscalizacion), filas)
+                    registrar_fiscalizaciones(db, filas)
+                db.commit()
+                break
+            except IntegrityError:
+                # Otra carga insertó las mismas claves entre la verificación y el INSERT
+                db.rollback()
+                if intento == 1:
+                    raise
+        for dia in {f["fecha"].date() for f in filas}:
+            cache_metricas.invalidar("fiscalizacion", dia)
+        return duplicadas
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+@router.post("/logs_fiscalizacion/bulk")
+async def create_logs_fiscalizacion_bulk(request: Request):
+    """
+    Carga masiva de logs de fiscalización (ej: revisiones acumuladas sin conexión).
+    Acepta NDJSON (application/x-ndjson, una fila por línea) o un arreglo JSON.
+    Cada fila se valida por separado; las filas con un "id_cliente" ya registrado
+    (o repetido en la misma carga) se informan como duplicadas y no se insertan.
+    La respuesta solo detalla las filas duplicadas o rechazadas. Si la carga supera
+    BULK_MAX_FILAS, o el cuerpo deja de ser JSON válido, se deja de leer: las filas
+    anteriores quedan procesadas y se responde 207 con "completa": false y una fila
+    rechazada desde la que hay que reenviar (no 413/400, que indicarían que no se
+    procesó nada y el reenvío completo duplicaría las filas sin "id_cliente").
+    """
+    resumen = {"recibidas": 0, "aceptadas": 0, "duplicadas": 0, "rechazadas": 0, "completa": True, "filas": []}
+    vistas = set()
+    lote, posiciones = [], []
+
+    async def escribir_lote():
+        duplicadas = await run_in_threadpool(_insertar_lote_fiscalizacion, lote)
+        for i in duplicadas:
+            resumen["filas"].append({"fila": posiciones[i], "estado": "duplicada", "id_cliente": lote[i]["id_cliente"]})
+        resumen["duplicadas"] += len(duplicadas)
+        resumen["aceptadas"] += len(lote) - len(duplicadas)
+        lote.clear()
+        posiciones.clear()
+
+    # Corte de la lectura: error de la fila en que se dejó de leer
+    corte = None
+    try:
+        async for fila in _leer_filas(request):
+            if resumen["recibidas"] >= BULK_MAX_FILAS:
+                corte = f"Máximo {BULK_MAX_FILAS} filas por carga, no se procesaron esta fila ni las siguientes"
+                break
+            resumen["recibidas"] += 1
+            numero = resumen["recibidas"]
+            try:
+                datos = json.loads(fila) if isinstance(fila, bytes) else fila
+                log = LogFiscalizacionBulkModel.model_validate(datos)
+            except (ValueError, ValidationError) as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()) if isinstance(e, ValidationError) else "JSON inválido"
+                resumen["rechazadas"] += 1
+                resumen["filas"].append({"fila": numero, "estado": "rechazada", "error": error})
+                continue
+
+            if log.id_cliente:
+                if log.id_cliente in vistas:
+                    resumen["duplicadas"] += 1
+                    resumen["filas"].append({"fila": numero, "estado": "duplicada", "id_cliente": log.id_cliente})
+                    continue
+                vistas.add(log.id_cliente)
+
+            lote.append(log.model_dump())
+            posiciones.append(numero)
+            if len(lote) >= BULK_LOTE:
+                await escribir_lote()
+    except CuerpoInvalidoError as e:
+        if resumen["recibidas"] == 0:
+            raise HTTPException(status_code=400, detail=str(e))
+        corte = f"{e}, no se procesaron esta fila ni las siguientes"
+
+    if lote:
+        await escribir_lote()
+    if corte:
+        # Parte de la carga ya se insertó: 207 con el resumen por fila
+        resumen["completa"] = False
+        resumen["filas"].append({"fila": resumen["recibidas"] + 1, "estado": "rechazada", "error": corte})
+        return JSONResponse(status_code=207, content=resumen)
+    return resumen
@@ -1,20 +1,18 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy import (
-    create_engine, Column, Integer, String, DateTime, Date, Boolean,
-    func, and_, or_, text, case
-)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from datetime import datetime, date
 from typing import Dict, Any
-import os
-from dotenv import load_dotenv
 import re
 import httpx
 import logging
 import json
 
+from config.database import get_db
+from config.models import PermisoCirculacion
+from config.cache import cache_respuestas, cache_metricas
+from config.rollups import registrar_permiso
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,56 +20,6 @@ logger = logging.getLogger(__name__)
 # Instanciamos el router
 router = APIRouter()
 
-############################################
-# DB
-############################################
-load_dotenv()
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_name = os.getenv("DB_NAME")
-DATABASE_URL = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-class PermisoCirculacion(Base):
-    __tablename__ = "permiso_circulacion"
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    ppu = Column(String(10), nullable=False)
-    rut = Column(String(12), nullable=False)
-    nombre = Column(String(100), nullable=False)
-    fecha_emision = Column(Date, nullable=False)
-    fecha_expiracion = Column(Date, nullable=False)
-    valor_permiso = Column(Integer, nullable=False)
-    motor = Column(Integer, nullable=False)
-    chasis = Column(String(50), nullable=False)
-    tipo_vehiculo = Column(String(50), nullable=False)
-    color = Column(String(50), nullable=False)
-    marca = Column(String(50), nullable=False)
-    modelo = Column(String(50), nullable=False)
-    anio = Column(Integer, nullable=False)
-    carga = Column(Integer, nullable=False)
-    tipo_sello = Column(String(50), nullable=False)
-    combustible = Column(String(50), nullable=False)
-    cilindrada = Column(Integer, nullable=False)
-    transmision = Column(String(50), nullable=False)
-    pts = Column(Integer, nullable=False)
-    ast = Column(Integer, nullable=False)
-    equipamiento = Column(String(100), nullable=False)
-    codigo_sii = Column(String(20), nullable=False)
-    tasacion = Column(Integer, nullable=False)
-
-# Crear las tablas
-Base.metadata.create_all(bind=engine)
-
 class PermisoCirculacionRequest(BaseModel):
     ppu: str
     rut: str
@@ -115,8 +63,9 @@ def validar_ppu(ppu: str) -> bool:
     ppu_pattern = re.compile(r"^[A-Z]{4}\d{2}$|^[A-Z]{2}\d{4}$")
     return ppu_pattern.match(ppu.upper())
 
+# Endpoints síncronos: FastAPI los ejecuta en el threadpool, sin bloquear el event loop
 @router.post("/emitir_permiso_circulacion/")
-async def emitir_permiso_circulacion(
+def emitir_permiso_circulacion(
     permiso_data: PermisoCirculacionRequest,
     db: Session = Depends(get_db)
 ):
@@ -196,9 +145,17 @@ async def emitir_permiso_circulacion(
         )
 
         db.add(nuevo_permiso)
+        registrar_permiso(db, nuevo_permiso)
         db.commit()
         db.refresh(nuevo_permiso)
 
+        # El nuevo permiso reemplaza al que pudiera estar en caché para esta PPU
+        cache_respuestas.invalidar("TGR", nuevo_permiso.ppu)
+        # Métricas: los rangos de permisos que contienen la fecha de emisión. Las series de
+        # fiscalización y consultas no cambian; los datos del vehículo en sus tablas de
+        # detalle se actualizan al expirar la caché
+        cache_metricas.invalidar("permisos", fecha_emision)
+
         logger.info(f"Permiso de circulación emitido exitosamente para PPU: {permiso_data.ppu}")
         
         return {
@@ -223,7 +180,7 @@ async def emitir_permiso_circulacion(
 
 # Endpoint para actualizar fecha de expiración usando id del permiso
 @router.patch("/update_fecha_permiso/")
-async def update_fecha_permiso(
+def update_fecha_permiso(
     update_data: UpdateFechaRequest,
     db: Session = Depends(get_db)
 ):
@@ -257,6 +214,12 @@ async def update_fecha_permiso(
         db.commit()
         db.refresh(permiso)
 
+        # Invalidar las consultas en caché del permiso (por PPU y por id)
+        cache_respuestas.invalidar("TGR", permiso.ppu)
+        cache_respuestas.invalidar("TGR", str(permiso.id))
+        # La tabla de detalle de permisos muestra la fecha de expiración (rangos que contienen la emisión)
+        cache_metricas.invalidar("permisos", permiso.fecha_emision)
+
         logger.info(f"Fecha de expiración actualizada exitosamente para ID: {update_data.id}")
         
         return {
@@ -0,0 +1,100 @@
+# Importamos librerías necesarias
+from fastapi import APIRouter
+from typing import Optional
+
+from config.cache import cache_respuestas, cache_metricas
+from config.coalescing import solicitudes_en_vuelo
+from config.buffer_logs import buffer_logs
+from config.gemini import cliente_gemini
+from config.recuperacion import cache_respuestas_chatbot, estadisticas_chatbot
+from config.memoria_chatbot import memoria_chatbot
+from comun.autenticacion import verificador_contrasenas
+from comun.tokens import gestor_tokens
+from config.resiliencia import resiliencia
+from config.http_client import AGENCIAS, clientes_http
+from config.admision import control_admision
+from comun.trazas import exportador_trazas
+from config.database import engine, engine_analitico, estadisticas_pool
+
+# Instanciamos el router
+router = APIRouter()
+
+#####################################################
+# Definimos los endpoints del router
+#####################################################
+
+# Estadísticas de la caché de respuestas de las APIs externas
+@router.get("/estado/cache")
+async def estado_cache():
+    return cache_respuestas.estadisticas()
+
+# Invalidar la caché (completa, por agencia y/o por PPU)
+@router.delete("/estado/cache")
+async def invalidar_cache(agencia: Optional[str] = None, ppu: Optional[str] = None):
+    eliminadas = cache_respuestas.invalidar(agencia.upper() if agencia else None, ppu)
+    return {"eliminadas": eliminadas}
+
+# Estadísticas de la caché de resultados de calcular_metricas
+@router.get("/estado/cache_metricas")
+async def estado_cache_metricas():
+    return cache_metricas.estadisticas()
+
+# Estadísticas de la agrupación de solicitudes idénticas (llamadas ahorradas)
+@router.get("/estado/coalescing")
+async def estado_coalescing():
+    return solicitudes_en_vuelo.estadisticas()
+
+# Estado del buffer de logs (profundidad de la cola y latencia de escritura)
+@router.get("/estado/logs_buffer")
+async def estado_logs_buffer():
+    return buffer_logs.estadisticas()
+
+# Llamadas al modelo del chatbot (en curso, en cola, rechazadas y latencias)
+@router.get("/estado/gemini")
+async def estado_gemini():
+    return cliente_gemini.estadisticas()
+
+# Respuestas del chatbot por origen (pregunta frecuente, caché o LLM), su latencia y la memoria de sesiones
+@router.get("/estado/chatbot")
+async def estado_chatbot():
+    return {**estadisticas_chatbot.estadisticas(len(cache_respuestas_chatbot)), "memoria": await memoria_chatbot.estadisticas()}
+
+# Vaciar la caché de respuestas del chatbot (ej: después de cambiar el contexto del sistema)
+@router.delete("/estado/chatbot/cache")
+async def limpiar_cache_chatbot():
+    eliminadas = len(cache_respuestas_chatbot)
+    cache_respuestas_chatbot.limpiar()
+    return {"eliminadas": eliminadas}
+
+# Verificaciones de contraseña del login de administradores (pool de bcrypt, migraciones de hash y rechazos)
+@router.get("/estado/autenticacion")
+async def estado_autenticacion():
+    return verificador_contrasenas.estadisticas()
+
+# Llaves de firma de tokens (kid activo) y caché de tokens verificados
+@router.get("/estado/tokens")
+async def estado_tokens():
+    return gestor_tokens.estadisticas()
+
+# Circuitos por agencia (cerrado, abierto, semiabierto), reintentos, coberturas, presupuesto de reintentos
+# y compartimentos por agencia (llamadas en curso, en cola y rechazadas)
+@router.get("/estado/agencias")
+async def estado_agencias():
+    estadisticas = resiliencia.estadisticas(AGENCIAS)
+    estadisticas["compartimentos"] = clientes_http.estadisticas_compartimentos()
+    return estadisticas
+
+# Carriles de prioridad (en curso, profundidad de cola y rechazos por carril) y uso de los pools de la base de datos
+@router.get("/estado/carriles")
+async def estado_carriles():
+    estadisticas = control_admision.estadisticas()
+    estadisticas["pools_db"] = {
+        "transaccional": estadisticas_pool(engine),
+        "analitico": estadisticas_pool(engine_analitico),
+    }
+    return estadisticas
+
+# Exportación de trazas (destino, spans exportados, descartados y pendientes)
+@router.get("/estado/trazas")
+async def estado_trazas():
+    return exportador_trazas.estadisticas()
@@ -0,0 +1,186 @@
+# Importamos librerías necesarias
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_, Boolean, Date, DateTime, Integer, BigInteger
+from datetime import datetime, timedelta
+import os
+import io
+import csv
+import json
+
+from config.database import get_engine_streaming
+from config.models import LogFiscalizacion, LogConsultaPropietario, PermisoCirculacion
+
+# Parquet requiere pyarrow; si no está instalado solo se ofrecen CSV y NDJSON
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+# Instanciamos el router
+router = APIRouter()
+
+# Filas leídas por cada viaje al cursor del servidor (y por row group en Parquet)
+EXPORT_FILAS_LOTE = int(os.getenv("EXPORT_FILAS_LOTE", "5000"))
+
+# Tablas exportables: nombre -> (modelo, columna de fecha del rango)
+TABLAS = {
+    "fiscalizacion": (LogFiscalizacion, LogFiscalizacion.fecha),
+    "consultas": (LogConsultaPropietario, LogConsultaPropietario.fecha),
+    "permisos": (PermisoCirculacion, PermisoCirculacion.fecha_emision),
+}
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+#####################################################
+# Lectura en streaming
+#####################################################
+
+def _leer_lotes(consulta, columnas_bool: list):
+    """
+    Entrega las filas en lotes de EXPORT_FILAS_LOTE usando un cursor del lado del
+    servidor: la memoria usada no depende del tamaño de la exportación.
+    """
+    with get_engine_streaming().connect() as conn:
+        resultado = conn.execution_options(stream_results=True, yield_per=EXPORT_FILAS_LOTE).execute(consulta)
+        for particion in resultado.partitions():
+            lote = [list(fila) for fila in particion]
+            for fila in lote:
+                for i in columnas_bool:
+                    if fila[i] is not None:
+                        fila[i] = bool(fila[i])
+            yield lote
+
+def _exportar_csv(columnas: list, lotes):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(columnas)
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield salida.getvalue()
+        salida.seek(0)
+        salida.truncate()
+    if salida.tell():
+        yield salida.getvalue()
+
+def _exportar_ndjson(columnas: list, lotes):
+    for lote in lotes:
+        yield "".join(json.dumps(dict(zip(columnas, fila)), default=str, ensure_ascii=False) + "\n" for fila in lote)
+
+class _SalidaParquet(io.RawIOBase):
+    """Archivo de salida que acumula los bytes escritos por pyarrow para enviarlos por partes"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+def _tipo_arrow(columna):
+    if isinstance(columna.type, Boolean):
+        return pa.bool_()
+    if isinstance(columna.type, (Integer, BigInteger)):
+        return pa.int64()
+    if isinstance(columna.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(columna.type, Date):
+        return pa.date32()
+    return pa.string()
+
+def _exportar_parquet(tabla, lotes):
+    schema = pa.schema([(c.name, _tipo_arrow(c)) for c in tabla.columns])
+    salida = _SalidaParquet()
+    writer = pq.ParquetWriter(salida, schema)
+    try:
+        for lote in lotes:
+            # Un row group por lote
+            columnas = list(zip(*lote)) if lote else [[] for _ in schema]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, schema)],
+                schema=schema
+            ))
+            yield salida.vaciar()
+    finally:
+        writer.close()
+    yield salida.vaciar()
+
+#####################################################
+# Definimos los endpoints del router
+#####################################################
+
+# Exportar una tabla completa por rango de fechas en CSV, NDJSON o Parquet
+@router.get("/exportar/{tabla}/{formato}")
+def exportar_datos(tabla: str, formato: str, from_date: str, to_date: str):
+    """
+    Parameters:
+      "tabla": "fiscalizacion" | "consultas" | "permisos",
+      "formato": "csv" | "ndjson" | "parquet",
+      "from_date": "YYYY-MM-DD",
+      "to_date":   "YYYY-MM-DD" (incluido)
+    """
+    tabla = tabla.strip().lower()
+    if tabla not in TABLAS:
+        raise HTTPException(status_code=400, detail=f"Tabla inválida. Debe ser una de: {list(TABLAS)}")
+
+    formato = formato.strip().lower()
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Debe ser uno de: {list(FORMATOS)}")
+    if formato == "parquet" and not PARQUET_DISPONIBLE:
+        raise HTTPException(status_code=501, detail="Exportación Parquet no disponible (falta pyarrow)")
+
+    try:
+        desde = datetime.strptime(from_date.strip(), "%Y-%m-%d")
+        hasta = datetime.strptime(to_date.strip(), "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    if desde >= hasta:
+        raise HTTPException(status_code=400, detail="La fecha de inicio no puede ser mayor que la fecha de fin")
+
+    modelo, columna_fecha = TABLAS[tabla]
+    if isinstance(columna_fecha.type, Date) and not isinstance(columna_fecha.type, DateTime):
+        desde, hasta = desde.date(), hasta.date()
+
+    # Rango semiabierto [desde, hasta) para usar los índices sobre la fecha
+    tabla_sql = modelo.__table__
+    consulta = (
+        select(tabla_sql)
+        .where(and_(columna_fecha >= desde, columna_fecha < hasta))
+        .order_by(columna_fecha, tabla_sql.c.id)
+    )
+    columnas = [c.name for c in tabla_sql.columns]
+    columnas_bool = [i for i, c in enumerate(tabla_sql.columns) if isinstance(c.type, Boolean)]
+    lotes = _leer_lotes(consulta, columnas_bool)
+
+    if formato == "csv":
+        contenido = _exportar_csv(columnas, lotes)
+    elif formato == "ndjson":
+        contenido = _exportar_ndjson(columnas, lotes)
+    else:
+        contenido = _exportar_parquet(tabla_sql, lotes)
+
+    nombre = f"{tabla_sql.name}_{from_date.strip()}_{to_date.strip()}.{formato}"
+    return StreamingResponse(
+        contenido,
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
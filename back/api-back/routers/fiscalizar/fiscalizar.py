@@ -0,0 +1,216 @@
+# Importamos librerías necesarias
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from datetime import date, datetime
+import asyncio
+import time
+import httpx
+import logging
+
+from patentes_vehiculares_chile import validar_patente
+from config.apis import (
+    PERMISO_CIRCULACION, REVISION_TECNICA, SOAP, ENCARGO_PATENTE, MULTAS_TRANSITO,
+    TIMEOUT_TGR, TIMEOUT_PRT, TIMEOUT_AACH, TIMEOUT_CARABINEROS, TIMEOUT_SRCEI
+)
+from config.http_client import ClientesHTTP, get_clientes_http
+from config.database import SessionLocal
+from config.models import LogFiscalizacion
+from config.rollups import registrar_fiscalizacion
+from config.cache import cache_metricas
+
+logger = logging.getLogger(__name__)
+
+# Instanciamos el router
+router = APIRouter()
+
+#####################################################
+# Estados posibles de cada documento
+#####################################################
+
+ESTADO_OK = "ok"                        # La agencia respondió con el documento
+ESTADO_NO_ENCONTRADO = "no_encontrado"  # La agencia respondió 404
+ESTADO_TIMEOUT = "timeout"              # La agencia no respondió a tiempo
+ESTADO_ERROR = "error"                  # Error de conexión o respuesta inesperada
+
+#####################################################
+# Interpretación de la respuesta de cada agencia
+#####################################################
+
+# Cada función recibe el JSON de la agencia y retorna los campos del documento.
+# Para las respuestas 404 se retorna el valor que usa la app de fiscalizadores
+# (documento no vigente / sin multas).
+
+def _interpretar_permiso(data):
+    if data is None:
+        return {"vigente": False}
+    fecha_exp = date.fromisoformat(str(data.get("fecha_expiracion"))[:10])
+    return {
+        "vigente": fecha_exp >= date.today(),
+        "fecha_expiracion": data.get("fecha_expiracion"),
+        "datos": data,
+    }
+
+def _interpretar_revision(data):
+    if data is None:
+        return {"vigente": False}
+    return {
+        "vigente": data.get("vigencia") == "Vigente",
+        "fecha_vencimiento": data.get("fecha_vencimiento"),
+        "datos": data,
+    }
+
+def _interpretar_soap(data):
+    if data is None:
+        return {"vigente": False}
+    return {
+        "vigente": data.get("vigencia") == "Vigente",
+        "rige_hasta": data.get("rige_hasta"),
+        "datos": data,
+    }
+
+def _interpretar_encargo(data):
+    if data is None:
+        return {"encargo": False}
+    return {
+        "encargo": bool(data.get("encargo")),
+        "datos": {
+            "patente_delantera": data.get("patente_delantera"),
+            "patente_trasera": data.get("patente_trasera"),
+            "vin": data.get("vin"),
+            "motor": data.get("motor"),
+        },
+    }
+
+def _interpretar_multas(data):
+    if data is None:
+        return {"tiene_multas": False, "total_multas": 0, "multas": []}
+    multas = data if isinstance(data, list) else data.get("multas", [])
+    return {"tiene_multas": len(multas) > 0, "total_multas": len(multas), "multas": multas}
+
+async def _consultar_documento(clientes: ClientesHTTP, agencia: str, url: str, timeout: float, interpretar, documento: str = None):
+    """
+    Consulta un documento a una agencia aplicando su timeout.
+    Nunca lanza excepciones: los errores quedan reflejados en el campo "estado".
+    Las respuestas 200 y 404 pasan por la caché de respuestas (campo "cache").
+    """
+    inicio = time.perf_counter()
+    resultado = {"agencia": agencia}
+    try:
+        response = await asyncio.wait_for(clientes.get_cacheado(agencia, url, documento=documento), timeout=timeout)
+        resultado["cache"] = response.headers.get("x-cache") == "HIT"
+        if response.status_code == 200:
+            resultado.update(estado=ESTADO_OK, **interpretar(response.json()))
+        elif response.status_code == 404:
+            resultado.update(estado=ESTADO_NO_ENCONTRADO, **interpretar(None))
+        else:
+            resultado.update(estado=ESTADO_ERROR, detalle=f"Respuesta inesperada de {agencia}: {response.status_code}")
+    except asyncio.TimeoutError:
+        resultado.update(estado=ESTADO_TIMEOUT, detalle=f"{agencia} no respondió en {timeout} segundos")
+    except httpx.RequestError as e:
+        resultado.update(estado=ESTADO_ERROR, detalle=f"Error de conexión con {agencia}: {str(e)}")
+    except Exception as e:
+        resultado.update(estado=ESTADO_ERROR, detalle=f"Error al procesar la respuesta de {agencia}: {str(e)}")
+    resultado["tiempo_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+    return resultado
+
+def _calcular_estado_vehiculo(documentos: dict, completo: bool):
+    """Replica el cálculo de estado que hace la app de fiscalizadores"""
+    if documentos["encargo_robo"].get("encargo"):
+        return "Posee Encargo por Robo"
+    if not completo:
+        return None
+    if documentos["multas_transito"]["tiene_multas"]:
+        return "Posee Multas de Tránsito"
+    if not (documentos["permiso_circulacion"]["vigente"]
+            and documentos["revision_tecnica"]["vigente"]
+            and documentos["soap"]["vigente"]):
+        return "Documentos Vencidos"
+    return "Vehículo al Día"
+
+def _guardar_log_fiscalizacion(ppu: str, rut_fiscalizador: str, fecha: datetime, documentos: dict) -> int:
+    db = SessionLocal()
+    try:
+        db_log = LogFiscalizacion(
+            ppu=ppu,
+            rut_fiscalizador=rut_fiscalizador,
+            fecha=fecha,
+            vigencia_permiso=int(documentos["permiso_circulacion"]["vigente"]),
+            vigencia_revision=int(documentos["revision_tecnica"]["vigente"]),
+            vigencia_soap=int(documentos["soap"]["vigente"]),
+            encargo_robo=int(documentos["encargo_robo"]["encargo"]),
+            multas=int(documentos["multas_transito"]["tiene_multas"])
+        )
+        db.add(db_log)
+        registrar_fiscalizacion(db, db_log)
+        db.commit()
+        db.refresh(db_log)
+        cache_metricas.invalidar("fiscalizacion", fecha)
+        return db_log.id
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+#####################################################
+# Definimos los endpoints del router
+#####################################################
+
+# Fiscalizar un vehículo: consulta todos los documentos en paralelo y registra el log
+@router.get("/fiscalizar/{ppu}")
+async def fiscalizar(ppu: str, rut_fiscalizador: str, clientes: ClientesHTTP = Depends(get_clientes_http)):
+    """
+    Consulta en paralelo el permiso de circulación (TGR), la revisión técnica (PRT),
+    el SOAP (AACH), el encargo por robo (Carabineros) y las multas de tránsito (SRCEI).
+
+    Cada agencia tiene su propio timeout; si alguna falla se retornan los demás
+    documentos igualmente, indicando el estado de cada uno. El log de fiscalización
+    se registra solo cuando todos los documentos pudieron ser determinados.
+    """
+    # Validar que no tenga caracteres especiales y/o espacios
+    if not ppu.isalnum():
+        raise HTTPException(status_code=400, detail="PPU no puede contener caracteres especiales o espacios")
+
+    # Validar formato Placa Patente Única (PPU)
+    if not validar_patente(ppu):
+        raise HTTPException(status_code=400, detail="Formato de PPU inválido")
+
+    if not rut_fiscalizador.strip():
+        raise HTTPException(status_code=400, detail="El RUT del fiscalizador es obligatorio")
+
+    fecha = datetime.now()
+
+    permiso, revision, soap, encargo, multas = await asyncio.gather(
+        _consultar_documento(clientes, "TGR", f"{PERMISO_CIRCULACION}/{ppu}", TIMEOUT_TGR, _interpretar_permiso, "permiso"),
+        _consultar_documento(clientes, "PRT", f"{REVISION_TECNICA}/{ppu}", TIMEOUT_PRT, _interpretar_revision, "revision"),
+        _consultar_documento(clientes, "AACH", f"{SOAP}/{ppu}", TIMEOUT_AACH, _interpretar_soap, "soap"),
+        _consultar_documento(clientes, "CARABINEROS", f"{ENCARGO_PATENTE}/{ppu}", TIMEOUT_CARABINEROS, _interpretar_encargo),
+        _consultar_documento(clientes, "SRCEI", f"{MULTAS_TRANSITO}/{ppu}", TIMEOUT_SRCEI, _interpretar_multas),
+    )
+
+    documentos = {
+        "permiso_circulacion": permiso,
+        "revision_tecnica": revision,
+        "soap": soap,
+        "encargo_robo": encargo,
+        "multas_transito": multas,
+    }
+    completo = all(doc["estado"] in (ESTADO_OK, ESTADO_NO_ENCONTRADO) for doc in documentos.values())
+
+    # Registrar el log de fiscalización (solo con información completa)
+    log_id = None
+    if completo:
+        try:
+            log_id = await run_in_threadpool(_guardar_log_fiscalizacion, ppu, rut_fiscalizador, fecha, documentos)
+        except Exception as e:
+            logger.error(f"Error al registrar log de fiscalización para PPU {ppu}: {str(e)}")
+
+    return {
+        "ppu": ppu,
+        "rut_fiscalizador": rut_fiscalizador,
+        "fecha": fecha.isoformat(),
+        "completo": completo,
+        "estado_vehiculo": _calcular_estado_vehiculo(documentos, completo),
+        "documentos": documentos,
+        "log_id": log_id
+    }
@@ -3,42 +3,14 @@ from datetime import date, datetime
 import os
 from pydantic import BaseModel
 from typing import List
-import requests 
-from sqlalchemy import Column, Integer, String, Date, DateTime
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+
+from config.database import get_db
+from config.models import MisVehiculos
 
 # Instanciamos el router
 router = APIRouter()
 
-#######################################
-# Conexión a la base de datos
-#######################################
-
-load_dotenv()
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_name = os.getenv("DB_NAME")
-DATABASE_URL = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Base de datos declarativa
-Base = declarative_base()
-
-# Modelo SQL Alchemy para guardar vehículos
-class MisVehiculos(Base):
-    __tablename__ = "mis_vehiculos"
-    id = Column(Integer, primary_key=True, index=True)
-    rut = Column(String(12), nullable=False)
-    ppu = Column(String(10), nullable=False)
-    nombre_vehiculo = Column(String(100), nullable=False)
-    fecha_agregado = Column(DateTime, nullable=False)
-
 # Modelo Pydantic para validación de datos
 class MisVehiculosModel(BaseModel):
     rut: str
@@ -46,14 +18,6 @@ class MisVehiculosModel(BaseModel):
     nombre_vehiculo: str
     fecha_agregado: datetime
 
-# Dependencia para obtener la sesión de la base de datos
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Endpoint para guardar un vehículo
 @router.post("/guardar_vehiculo/", response_model=MisVehiculosModel)
 def guardar_vehiculo(vehiculo: MisVehiculosModel, db: Session = Depends(get_db)):
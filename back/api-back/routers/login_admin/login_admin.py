@@ -1,34 +1,24 @@
 # Importamos librerías necesarias
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy import (
-    create_engine, Column, Integer, String, DateTime, Date, Boolean,
-    func, and_, or_, text, case
-)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import os
-from dotenv import load_dotenv
+
+from config.database import SessionLocal
+from config.models import UsuarioAdminModel
+from comun.autenticacion import verificador_contrasenas, normalizar_rut, AutenticacionSaturadaError
+from comun.tokens import create_access_token, usuario_autenticado
 
 
 # Librerías para manejo de seguridad y autenticación
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from datetime import datetime, timedelta
-import secrets
-from sqlalchemy import and_, text
+from datetime import datetime, timedelta, timezone
 
 #########################################################
 # Configuración de seguridad
 #########################################################
 
-SECRET_KEY = secrets.token_urlsafe(32)
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 #########################################################
 # Funciones de validación personalizadas
 #########################################################
@@ -46,56 +36,9 @@ def validar_contrasena(contrasena: str) -> bool:
     
     return True
 
-# Función para encriptar contraseñas
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-# Función para verificar el token JWT
-def verify_token(token: str, credentials_exception):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        rut: str = payload.get("sub")
-        if rut is None:
-            raise credentials_exception
-        return rut
-    except JWTError:
-        raise credentials_exception
-
 # Instanciamos el router
 router = APIRouter()
 
-#######################################
-# Conexión a la base de datos
-#######################################
-
-load_dotenv()
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_name = os.getenv("DB_NAME")
-DATABASE_URL = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}/{db_name}"
-engine = create_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Base de datos declarativa
-Base = declarative_base()
-
-# Modelo SQL Alchemy para usuarios administradores
-class UsuarioAdminModel(Base):
-    __tablename__ = "usuarios_admin"
-    id = Column(Integer, primary_key=True, index=True)
-    rut = Column(String(12), unique=True, nullable=False)
-    nombre = Column(String(100), nullable=False)
-    email = Column(String(100), unique=True, nullable=False)
-    password = Column(String(255), nullable=False)
-
 class UsuarioAdmin(BaseModel):
     rut: str
     nombre: str
@@ -113,32 +56,19 @@ class TokenModel(BaseModel):
     expires_in: int
 
 
-#######################################
-# Función para crear las tablas
-#######################################
-
-def create_tables():
-    """Create database tables if they don't exist"""
-    try:
-        Base.metadata.create_all(bind=engine)
-        print("Database tables created successfully")
-    except Exception as e:
-        print(f"Error creating tables: {e}")
-        # Don't crash the app if database is not available
-
-#########################################################
-# Dependencia para obtener la sesión de la base de datos
-#########################################################
+def _buscar_usuario(rut: str) -> Optional[UsuarioAdminModel]:
+    """Busca el administrador por RUT normalizado (columna única e indexada)"""
+    with SessionLocal() as db:
+        return db.query(UsuarioAdminModel).filter(UsuarioAdminModel.rut == rut).first()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def _actualizar_password(id: int, password_hash: str):
+    """Guarda el hash nuevo de la contraseña (migración desde texto plano o cambio de costo)"""
+    with SessionLocal() as db:
+        db.query(UsuarioAdminModel).filter(UsuarioAdminModel.id == id).update({UsuarioAdminModel.password: password_hash})
+        db.commit()
 
 @router.post("/login_admin", response_model=TokenModel)
-def login_admin(request: Request, credentials: LoginRequest, db: Session = Depends(get_db)):
+async def login_admin(request: Request, credentials: LoginRequest):
     """
     Endpoint para que un usuario administrador inicie sesión
     """
@@ -148,31 +78,30 @@ def login_admin(request: Request, credentials: LoginRequest, db: Session = Depen
 
     # Buscar el usuario en la base de datos SOLO por RUT
     try:
-        usuario_db = db.query(UsuarioAdminModel).filter(
-            UsuarioAdminModel.rut == credentials.rut
-        ).first()
+        usuario_db = await run_in_threadpool(_buscar_usuario, normalizar_rut(credentials.rut))
     except Exception as e:
         print(f"Error al buscar usuario: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
-    if not usuario_db:
-        raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
-
-    # Verificar la contraseña usando bcrypt
+    # Verificar la contraseña (bcrypt en el pool de autenticación, texto plano heredado se migra).
+    # Si el RUT no existe se verifica contra un hash ficticio para no revelarlo por el tiempo de respuesta
     try:
-        # Si la contraseña en la BD está en texto plano (para desarrollo/testing)
-        if len(usuario_db.password) < 20:  # Las contraseñas hasheadas son más largas
-            # Comparación directa para contraseñas en texto plano
-            if credentials.password != usuario_db.password:
-                raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
-        else:
-            # Verificación con bcrypt para contraseñas hasheadas
-            if not pwd_context.verify(credentials.password, usuario_db.password):
-                raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
-    except Exception as e:
-        print(f"Error al verificar contraseña: {e}")
+        if not usuario_db:
+            await verificador_contrasenas.verificar_inexistente(credentials.password)
+            raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
+        valida, nuevo_hash = await verificador_contrasenas.verificar(credentials.password, usuario_db.password)
+    except AutenticacionSaturadaError:
+        raise HTTPException(status_code=503, detail="Demasiados inicios de sesión simultáneos, intente nuevamente", headers={"Retry-After": "1"})
+    if not valida:
         raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
 
+    if nuevo_hash:
+        try:
+            await run_in_threadpool(_actualizar_password, usuario_db.id, nuevo_hash)
+        except Exception as e:
+            # El inicio de sesión es válido aunque no se pueda migrar la contraseña
+            print(f"Error al actualizar contraseña: {e}")
+
     # Crear el token de acceso
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -190,3 +119,12 @@ def login_admin(request: Request, credentials: LoginRequest, db: Session = Depen
         "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60  # en segundos
     }
 
+@router.get("/sesion_admin")
+async def sesion_admin(payload: dict = Depends(usuario_autenticado)):
+    """
+    Valida el token del panel (header Authorization: Bearer) y retorna el usuario de la sesión
+    """
+    return {
+        "rut": payload["sub"],
+        "expira": datetime.fromtimestamp(payload["exp"], timezone.utc).isoformat()
+    }
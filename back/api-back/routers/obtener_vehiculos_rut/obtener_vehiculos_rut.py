@@ -1,10 +1,14 @@
 # Importamos librerías necesarias
 from datetime import date, timedelta
 from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import asyncio
 import httpx
+import os
 from typing import List
-from config.apis import API_SRCEI, API_TGR, PADRON_VEHICULO, PERMISO_CIRCULACION
+from config.apis import API_SRCEI, API_TGR, PADRON_VEHICULO, PERMISO_CIRCULACION, PERMISOS_CIRCULACION_LOTE
+from config.http_client import ClientesHTTP, get_clientes_http
 
 # Instanciamos el router
 router = APIRouter()
@@ -69,87 +73,140 @@ class Vehiculo(BaseModel):
     modelo: str
     estado: str
 
+# Consultas simultáneas máximas a TGR por cada solicitud
+CONCURRENCIA_TGR = int(os.getenv("VEHICULOS_RUT_CONCURRENCIA", "10"))
+
+def _calcular_estado(permiso_data) -> str:
+    """Determina el estado del vehículo a partir de su último permiso de circulación"""
+    if not permiso_data:
+        return "sin_permiso"
+    # Verificar si el permiso está vigente
+    fecha_expiracion = permiso_data.get("fecha_expiracion")
+    if not fecha_expiracion:
+        return "sin_permiso"
+    fecha_exp = date.fromisoformat(fecha_expiracion)
+    # Si estamos 60 días antes de la expiración, marcar como "habilitado"
+    if fecha_exp - date.today() <= timedelta(days=60):
+        return "habilitado"
+    elif fecha_exp >= date.today():
+        return "vigente"
+    return "vencido"
+
+async def _obtener_vehiculo(clientes: ClientesHTTP, vehiculo_padron: dict, semaforo: asyncio.Semaphore) -> Vehiculo:
+    """Consulta el permiso de circulación de un vehículo del padrón y retorna su estado"""
+    ppu = vehiculo_padron.get("ppu", "")
+
+    # Consultar permiso de circulación para determinar estado
+    try:
+        async with semaforo:
+            permiso_response = await clientes.get_cacheado(
+                "TGR",
+                f"{PERMISO_CIRCULACION}/{ppu}",
+                documento="permiso"
+            )
+        estado = _calcular_estado(permiso_response.json() if permiso_response.status_code == 200 else None)
+    except Exception:
+        estado = "desconocido"
+
+    return Vehiculo(
+        ppu=ppu,
+        marca=vehiculo_padron.get("marca", ""),
+        modelo=vehiculo_padron.get("modelo", ""),
+        estado=estado
+    )
+
+async def _obtener_vehiculos_lote(clientes: ClientesHTTP, vehiculos_padron: list):
+    """
+    Consulta el último permiso de todos los vehículos con una sola solicitud a TGR.
+    Retorna None si TGR no pudo responder la consulta masiva.
+    """
+    ppus = [v.get("ppu", "") for v in vehiculos_padron]
+    try:
+        response = await clientes.post("TGR", PERMISOS_CIRCULACION_LOTE, json={"ppus": ppus}, timeout=30.0)
+        if response.status_code != 200:
+            return None
+        permisos = {p.get("ppu", "").upper(): p for p in response.json().get("permisos", [])}
+    except Exception:
+        return None
+    return [
+        Vehiculo(
+            ppu=v.get("ppu", ""),
+            marca=v.get("marca", ""),
+            modelo=v.get("modelo", ""),
+            estado=_calcular_estado(permisos.get(v.get("ppu", "").upper()))
+        )
+        for v in vehiculos_padron
+    ]
+
+async def _stream_vehiculos(clientes: ClientesHTTP, vehiculos_padron: list):
+    """Emite cada vehículo en formato NDJSON apenas se conoce su estado"""
+    semaforo = asyncio.Semaphore(CONCURRENCIA_TGR)
+    tareas = [asyncio.create_task(_obtener_vehiculo(clientes, v, semaforo)) for v in vehiculos_padron]
+    try:
+        for tarea in asyncio.as_completed(tareas):
+            vehiculo = await tarea
+            yield vehiculo.model_dump_json() + "\n"
+    finally:
+        # Si el cliente se desconecta, cancelar las consultas pendientes
+        for tarea in tareas:
+            tarea.cancel()
+
 # Endpoint para obtener vehículos asociados a un RUT
 @router.get("/vehiculos_rut/{rut}", response_model=List[Vehiculo])
-async def obtener_vehiculos_por_rut(rut: str):
+async def obtener_vehiculos_por_rut(rut: str, stream: bool = False, clientes: ClientesHTTP = Depends(get_clientes_http)):
     """
     Obtiene los vehículos asociados a un RUT.
     Retorna PPU, marca, modelo y estado de cada vehículo.
+
+    Los permisos de circulación se obtienen con una sola consulta masiva a TGR; si ésta
+    falla, se consultan en paralelo (máximo VEHICULOS_RUT_CONCURRENCIA consultas
+    simultáneas). Con ?stream=true la respuesta es NDJSON y cada vehículo se
+    envía apenas se resuelve su estado (el orden puede no coincidir con el del padrón).
     """
     try:
         # Consultar vehículos en el padrón por RUT
-        async with httpx.AsyncClient() as client:
-            padron_response = await client.get(
-                f"{API_SRCEI}/padron/{rut}",
-                timeout=30.0
+        padron_response = await clientes.get(
+            "SRCEI",
+            f"{API_SRCEI}/padron/{rut}",
+            timeout=30.0
+        )
+        
+        if padron_response.status_code == 404:
+            if stream:
+                return StreamingResponse(iter(()), media_type="application/x-ndjson")
+            return []  # No hay vehículos asociados al RUT
+            # return "no se encuentra padrón"
+        
+        if padron_response.status_code != 200:
+            raise HTTPException(
+                status_code=500, 
+                detail="Error al consultar el padrón vehicular"
             )
-            
-            if padron_response.status_code == 404:
-                return []  # No hay vehículos asociados al RUT
-                # return "no se encuentra padrón"
-            
-            if padron_response.status_code != 200:
-                raise HTTPException(
-                    status_code=500, 
-                    detail="Error al consultar el padrón vehicular"
-                )
-            
-            padron_data = padron_response.json()
-            
-            # Si padron_data es una lista
-            if isinstance(padron_data, list):
-                vehiculos_padron = padron_data
-            else:
-                vehiculos_padron = [padron_data]
-            
-            vehiculos_resultado = []
-            
-            # Para cada vehículo del padrón, verificar su estado con TGR
-            for vehiculo_padron in vehiculos_padron:
-                ppu = vehiculo_padron.get("ppu", "")
-                marca = vehiculo_padron.get("marca", "")
-                modelo = vehiculo_padron.get("modelo", "")
-                
-                # Consultar permiso de circulación para determinar estado
-                try:
-                    permiso_response = await client.get(
-                        f"{PERMISO_CIRCULACION}/{ppu}",
-                        timeout=30.0
-                    )
-                    
-                    if permiso_response.status_code == 200:
-                        permiso_data = permiso_response.json()
-                        # Verificar si el permiso está vigente
-                        fecha_expiracion = permiso_data.get("fecha_expiracion")
-                        if fecha_expiracion:
-                            fecha_exp = date.fromisoformat(fecha_expiracion)
-                            # Si estamos 60 días antes de la expiración, marcar como "habilitado"
-                            if fecha_exp - date.today() <= timedelta(days=60):
-                                estado = "habilitado"
-                            elif fecha_exp >= date.today():
-                                estado = "vigente"
-                            elif fecha_exp < date.today():
-                                estado = "vencido"
-                        else:
-                            estado = "sin_permiso"
-                    else:
-                        estado = "sin_permiso"
-                        
-                except Exception:
-                    estado = "desconocido"
-                
-                # Crear objeto Vehiculo
-                vehiculo = Vehiculo(
-                    ppu=ppu,
-                    marca=marca,
-                    modelo=modelo,
-                    estado=estado
-                )
-                
-                vehiculos_resultado.append(vehiculo)
-            
+        
+        padron_data = padron_response.json()
+        
+        # Si padron_data es una lista
+        if isinstance(padron_data, list):
+            vehiculos_padron = padron_data
+        else:
+            vehiculos_padron = [padron_data]
+        
+        if stream:
+            return StreamingResponse(_stream_vehiculos(clientes, vehiculos_padron), media_type="application/x-ndjson")
+
+        # Consultar el estado de todos los vehículos con una sola solicitud a TGR
+        vehiculos_resultado = await _obtener_vehiculos_lote(clientes, vehiculos_padron)
+        if vehiculos_resultado is not None:
             return vehiculos_resultado
-            
+
+        # Si la consulta masiva falla, verificar cada vehículo con TGR (en paralelo)
+        semaforo = asyncio.Semaphore(CONCURRENCIA_TGR)
+        vehiculos_resultado = await asyncio.gather(
+            *(_obtener_vehiculo(clientes, v, semaforo) for v in vehiculos_padron)
+        )
+        
+        return list(vehiculos_resultado)
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -157,4 +214,3 @@ async def obtener_vehiculos_por_rut(rut: str):
             status_code=500,
             detail=f"Error interno del servidor: {str(e)}"
         )
-
@@ -0,0 +1,7 @@
+# Base de datos SQLite temporal para las pruebas: debe quedar configurada antes de
+# que algún módulo importe config.database
+
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "pruebas.db")
@@ -0,0 +1,118 @@
+# Verifica con EXPLAIN QUERY PLAN (SQLite) que las consultas de métricas y de los
+# navegadores de logs usan los índices de las migraciones 1 y 4.
+# El esquema se arma como en una base existente: las tablas sin esos índices y
+# luego aplicar_migraciones. Las sentencias que se revisan son las que ejecutan
+# los routers (se capturan del engine), no copias escritas a mano.
+#
+# Ejecutar desde back/api-back:  python -m pytest -q
+
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, text
+
+from config.database import Base, engine, SessionLocal, create_tables
+from config.migraciones import MIGRACIONES, aplicar_migraciones
+from routers.calcular_metricas import calcular_metricas
+from routers.consultar_logs_fiscalizacion.consultar_logs_fiscalizacion import consultar_logs_fiscalizacion
+from routers.consultar_logs_consultas_realizadas.consultar_logs_consultas_realizadas import consultar_logs_consultas_realizadas
+
+DESDE, HASTA = datetime(2024, 1, 1), datetime(2024, 3, 31)
+
+FILTROS_FISCALIZACION = dict(ppu=None, rut_fiscalizador=None, from_date=None, to_date=None,
+                             vigencia_permiso=None, vigencia_revision=None, vigencia_soap=None,
+                             encargo_robo=None, multas=None, limite=None, cursor=None, incluir_total=False)
+FILTROS_CONSULTAS = dict(rut=None, ppu=None, from_date=None, to_date=None,
+                         limite=None, cursor=None, incluir_total=False)
+
+@pytest.fixture(scope="module")
+def db():
+    create_tables()
+    # Base existente: las tablas se crearon antes de los índices de las migraciones
+    with engine.begin() as conn:
+        for version in (1, 4):
+            operaciones = next(ops for v, _, ops in MIGRACIONES if v == version)
+            for indice in operaciones:
+                conn.execute(text(f"DROP INDEX IF EXISTS {indice.name}"))
+    aplicar_migraciones()
+    with SessionLocal() as sesion:
+        yield sesion
+    Base.metadata.drop_all(bind=engine)
+
+@contextmanager
+def sentencias():
+    """Captura las sentencias SQL (con sus parámetros) que se ejecutan en el bloque"""
+    capturadas = []
+
+    def capturar(conn, cursor, sentencia, parametros, contexto, executemany):
+        capturadas.append((sentencia, parametros))
+
+    event.listen(engine, "before_cursor_execute", capturar)
+    try:
+        yield capturadas
+    finally:
+        event.remove(engine, "before_cursor_execute", capturar)
+
+def plan(capturadas: list, tabla: str) -> str:
+    """Plan de la sentencia capturada que lee la tabla (una línea por paso)"""
+    sentencia, parametros = next((s, p) for s, p in capturadas if re.search(rf"\bFROM {tabla}\b", s))
+    with engine.connect() as conn:
+        filas = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sentencia}", parametros).all()
+    return "\n".join(fila[3] for fila in filas)
+
+def usa_indice(detalle: str, tabla: str, *indices: str) -> bool:
+    return re.search(rf"SEARCH {tabla} USING (COVERING )?INDEX ({'|'.join(indices)}) ", detalle) is not None
+
+def test_migraciones_crean_los_indices(db):
+    existentes = {fila[0] for fila in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    for version in (1, 4):
+        operaciones = next(ops for v, _, ops in MIGRACIONES if v == version)
+        assert {indice.name for indice in operaciones} <= existentes
+
+def test_detalle_fiscalizacion_usa_rango_de_fecha_y_join_por_ppu(db):
+    with sentencias() as capturadas:
+        calcular_metricas._metricas_fiscalizacion(DESDE, HASTA, "MES", db)
+    detalle = plan(capturadas, "log_fiscalizacion")
+    assert usa_indice(detalle, "log_fiscalizacion", "idx_log_fiscalizacion_fecha", "idx_log_fiscalizacion_fecha_id"), detalle
+    assert "fecha>? AND fecha<?" in detalle, detalle
+    assert usa_indice(detalle, "permiso_circulacion", "idx_permiso_ppu_rut"), detalle
+
+def test_detalle_consultas_usa_rango_de_fecha_y_join_por_ppu_rut(db):
+    with sentencias() as capturadas:
+        calcular_metricas._metricas_consultas(DESDE, HASTA, "MES", db)
+    detalle = plan(capturadas, "log_consultas_propietarios")
+    assert usa_indice(detalle, "log_consultas_propietarios", "idx_log_consultas_fecha_rut", "idx_log_consultas_fecha_id"), detalle
+    assert usa_indice(detalle, "permiso_circulacion", "idx_permiso_ppu_rut"), detalle
+    assert "ppu=? AND rut=?" in detalle, detalle
+
+def test_detalle_permisos_usa_rango_de_fecha_de_emision(db):
+    with sentencias() as capturadas:
+        calcular_metricas._metricas_permisos(DESDE, HASTA, "MES", db)
+    detalle = plan(capturadas, "permiso_circulacion")
+    assert usa_indice(detalle, "permiso_circulacion", "idx_permiso_fecha_emision_valor", "idx_permiso_fecha_emision_id"), detalle
+
+@pytest.mark.parametrize("filtros, indice", [
+    ({"from_date": "2024-01-01", "to_date": "2024-01-31"}, "idx_log_fiscalizacion_fecha_id"),
+    ({"ppu": "AB1234"}, "idx_log_fiscalizacion_ppu_fecha"),
+    ({"rut_fiscalizador": "12345678-9"}, "idx_log_fiscalizacion_fiscalizador_fecha"),
+])
+def test_navegador_fiscalizacion(db, filtros, indice):
+    with sentencias() as capturadas:
+        consultar_logs_fiscalizacion(**dict(FILTROS_FISCALIZACION, **filtros), db=db)
+    detalle = plan(capturadas, "log_fiscalizacion")
+    assert usa_indice(detalle, "log_fiscalizacion", indice), detalle
+    assert "TEMP B-TREE" not in detalle, detalle
+
+@pytest.mark.parametrize("filtros, indice", [
+    ({"from_date": "2024-01-01", "to_date": "2024-01-31"}, "idx_log_consultas_fecha_id"),
+    ({"rut": "12345678-9"}, "idx_log_consultas_rut_fecha"),
+    ({"ppu": "AB1234"}, "idx_log_consultas_ppu_fecha"),
+])
+def test_navegador_consultas(db, filtros, indice):
+    with sentencias() as capturadas:
+        consultar_logs_consultas_realizadas(**dict(FILTROS_CONSULTAS, **filtros), db=db)
+    detalle = plan(capturadas, "log_consultas_propietarios")
+    assert usa_indice(detalle, "log_consultas_propietarios", indice), detalle
+    assert "TEMP B-TREE" not in detalle, detalle
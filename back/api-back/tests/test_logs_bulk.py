@@ -0,0 +1,81 @@
+# Verifica el corte de la carga masiva /logs_fiscalizacion/bulk: cuando se deja de
+# leer el cuerpo (máximo de filas o JSON inválido a mitad de la carga) las filas ya
+# insertadas se informan con 207 y el resumen indica desde qué fila reenviar.
+#
+# Ejecutar desde back/api-back:  python -m pytest -q
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config.database import Base, engine, SessionLocal, create_tables
+from config.models import LogFiscalizacion
+from routers.create_logs import create_logs
+
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+def fila(i: int, id_cliente: bool = False) -> dict:
+    datos = {"ppu": f"BBCL{i:02d}", "rut_fiscalizador": "12345678-9", "fecha": f"2024-05-{i % 28 + 1:02d}T10:00:00",
+             "vigencia_permiso": 1, "vigencia_revision": 1, "vigencia_soap": 1, "encargo_robo": 0, "multas": 0}
+    if id_cliente:
+        datos["id_cliente"] = f"disp-1-{i}"
+    return datos
+
+def ndjson(filas: list) -> str:
+    return "".join(json.dumps(f) + "\n" for f in filas)
+
+def insertadas() -> int:
+    with SessionLocal() as db:
+        return db.query(LogFiscalizacion).count()
+
+@pytest.fixture
+def cliente(monkeypatch):
+    monkeypatch.setattr(create_logs, "BULK_MAX_FILAS", 5)
+    monkeypatch.setattr(create_logs, "BULK_LOTE", 2)
+    create_tables()
+    app = FastAPI()
+    app.include_router(create_logs.router)
+    with TestClient(app) as c:
+        yield c
+    Base.metadata.drop_all(bind=engine)
+
+def test_carga_completa(cliente):
+    response = cliente.post("/logs_fiscalizacion/bulk", content=ndjson([fila(i) for i in range(4)]), headers=NDJSON)
+    assert response.status_code == 200
+    assert response.json() == {"recibidas": 4, "aceptadas": 4, "duplicadas": 0, "rechazadas": 0, "completa": True, "filas": []}
+
+@pytest.mark.parametrize("ndjson_o_arreglo", ["ndjson", "arreglo"])
+def test_maximo_de_filas_responde_207_con_lo_insertado(cliente, ndjson_o_arreglo):
+    filas = [fila(i, id_cliente=True) for i in range(8)]
+    if ndjson_o_arreglo == "ndjson":
+        response = cliente.post("/logs_fiscalizacion/bulk", content=ndjson(filas), headers=NDJSON)
+    else:
+        response = cliente.post("/logs_fiscalizacion/bulk", json=filas)
+    assert response.status_code == 207
+    resumen = response.json()
+    assert (resumen["recibidas"], resumen["aceptadas"], resumen["completa"]) == (5, 5, False)
+    assert resumen["filas"] == [{"fila": 6, "estado": "rechazada", "error": resumen["filas"][0]["error"]}]
+    assert insertadas() == 5
+
+    # El dispositivo reenvía desde la fila indicada: la carga queda completa sin duplicados
+    desde = resumen["filas"][0]["fila"] - 1
+    response = cliente.post("/logs_fiscalizacion/bulk", content=ndjson(filas[desde:]), headers=NDJSON)
+    assert response.status_code == 200
+    assert response.json()["aceptadas"] == 3
+    assert insertadas() == 8
+
+def test_json_invalido_a_mitad_de_la_carga_responde_207(cliente):
+    cuerpo = ndjson([fila(i) for i in range(3)]) + "{" + "x" * (create_logs.BULK_MAX_BYTES_FILA + 1)
+    response = cliente.post("/logs_fiscalizacion/bulk", content=cuerpo, headers=NDJSON)
+    assert response.status_code == 207
+    resumen = response.json()
+    assert (resumen["aceptadas"], resumen["completa"]) == (3, False)
+    assert resumen["filas"][-1]["fila"] == 4
+    assert insertadas() == 3
+
+def test_cuerpo_invalido_desde_el_inicio_responde_400(cliente):
+    response = cliente.post("/logs_fiscalizacion/bulk", content=b'{"no": "es un arreglo"}', headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert insertadas() == 0
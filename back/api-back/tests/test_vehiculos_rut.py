@@ -0,0 +1,73 @@
+# Verifica /vehiculos_rut/{rut} cuando la consulta masiva a TGR falla (consultas en
+# paralelo por vehículo) y en modo ?stream=true (NDJSON). Las agencias se simulan
+# con httpx.MockTransport, así se ejecuta el cliente real (caché, agrupación,
+# compartimentos y resiliencia).
+#
+# Ejecutar desde back/api-back:  python -m pytest -q
+
+import json
+from datetime import date, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from config.cache import cache_respuestas
+from config.http_client import ClientesHTTP, get_clientes_http
+from routers.obtener_vehiculos_rut.obtener_vehiculos_rut import router
+
+PADRON = [
+    {"ppu": "BBCL10", "marca": "Toyota", "modelo": "Yaris"},
+    {"ppu": "BBCL11", "marca": "Kia", "modelo": "Rio"},
+    {"ppu": "BBCL12", "marca": "Fiat", "modelo": "Uno"},
+]
+EXPIRACION = {
+    "BBCL10": date.today() + timedelta(days=200),   # vigente
+    "BBCL11": date.today() + timedelta(days=30),    # habilitado para renovar
+}
+ESPERADOS = {"BBCL10": "vigente", "BBCL11": "habilitado", "BBCL12": "sin_permiso"}
+
+def agencias(solicitudes: list):
+    """Simula SRCEI (padrón) y TGR (consulta masiva caída, permisos por PPU)"""
+    def responder(request: httpx.Request) -> httpx.Response:
+        solicitudes.append((request.method, request.url.path))
+        ruta = request.url.path
+        if "/padron/" in ruta:
+            return httpx.Response(200, json=PADRON)
+        if request.method == "POST":
+            return httpx.Response(404, json={"detail": "Not Found"})
+        ppu = ruta.rsplit("/", 1)[-1]
+        if ppu not in EXPIRACION:
+            return httpx.Response(404, json={"detail": "Permiso no encontrado"})
+        return httpx.Response(200, json={"ppu": ppu, "fecha_expiracion": EXPIRACION[ppu].isoformat()})
+    return responder
+
+@pytest.fixture
+def cliente():
+    solicitudes = []
+    clientes = ClientesHTTP()
+    clientes._crear_cliente = lambda nombre: httpx.AsyncClient(transport=httpx.MockTransport(agencias(solicitudes)))
+    cache_respuestas.limpiar()
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_clientes_http] = lambda: clientes
+    with TestClient(app) as c:
+        yield c, solicitudes
+    cache_respuestas.limpiar()
+
+def test_consultas_por_vehiculo_si_falla_la_consulta_masiva(cliente):
+    c, solicitudes = cliente
+    response = c.get("/vehiculos_rut/12345678-9")
+    assert response.status_code == 200
+    assert {v["ppu"]: v["estado"] for v in response.json()} == ESPERADOS
+    assert any(metodo == "POST" and ruta.endswith("/consultar_permisos") for metodo, ruta in solicitudes)
+    assert sum(1 for metodo, ruta in solicitudes if metodo == "GET" and "/consultar_permiso/" in ruta) == len(PADRON)
+
+def test_stream_ndjson(cliente):
+    c, _ = cliente
+    response = c.get("/vehiculos_rut/12345678-9", params={"stream": "true"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    vehiculos = [json.loads(linea) for linea in response.text.splitlines()]
+    assert {v["ppu"]: v["estado"] for v in vehiculos} == ESPERADOS
@@ -0,0 +1,3 @@
+# Paquete compartido por el backend y las APIs de las agencias
+# Se instala en cada imagen (pip install comun/) y cada servicio lo importa como
+# "from comun.<modulo> import ...", de modo que una corrección se hace en un solo lugar.
@@ -0,0 +1,174 @@
+# Verificación de credenciales compartida por los endpoints de inicio de sesión
+# (login_admin en el backend, clave única en api-sgd y credenciales/tarjetas en
+# api-tgr).
+#
+# - El usuario se busca solo por RUT normalizado (columna indexada) y la
+#   contraseña se verifica fuera de la base de datos.
+# - bcrypt es costoso a propósito (decenas de ms por verificación). Se ejecuta en
+#   un pool de hilos propio y acotado (bcrypt libera el GIL, así que los hilos
+#   corren en paralelo), para que un peak de inicios de sesión (ej: el primer día
+#   de la renovación de marzo) no ocupe el event loop ni el threadpool compartido
+#   de los endpoints. Si la cola de verificaciones está llena se rechaza el
+#   inicio de sesión (AutenticacionSaturadaError -> 503) en vez de acumularlo.
+# - Migración transparente: si la contraseña guardada está en texto plano, o su
+#   hash usa un costo distinto de AUTH_BCRYPT_ROUNDS, al iniciar sesión
+#   correctamente se genera el hash nuevo para guardarlo.
+# - Si el RUT no existe se verifica igual la contraseña contra un hash ficticio
+#   (verificar_inexistente), así la respuesta tarda lo mismo que con un RUT
+#   registrado y el tiempo no revela qué RUT existen.
+#
+# Se usa el paquete bcrypt directamente: passlib 1.7 no es compatible con
+# bcrypt >= 4.1 (falla al verificar). Los hashes son los mismos ($2b$).
+
+import os
+import re
+import hmac
+import time
+import secrets
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+AUTH_BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))                  # Costo de los hashes nuevos (4 a 31)
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))  # Hilos del pool de bcrypt
+AUTH_HASH_MAX_EN_COLA = int(os.getenv("AUTH_HASH_MAX_EN_COLA", "64"))            # Verificaciones esperando hilo
+AUTH_REHASH_ENABLED = os.getenv("AUTH_REHASH_ENABLED", "true").lower() == "true"
+
+# bcrypt solo considera los primeros 72 bytes de la contraseña
+BCRYPT_MAX_BYTES = 72
+HASH_BCRYPT = re.compile(r"^\$2[abxy]\$(\d{2})\$[./A-Za-z0-9]{53}$")
+
+class AutenticacionSaturadaError(Exception):
+    """No hay capacidad para verificar la contraseña (contrapresión)"""
+
+def normalizar_rut(rut: str) -> str:
+    """RUT en formato canónico: sin puntos ni espacios, con guión y dígito verificador en mayúscula (12345678-K)"""
+    rut = re.sub(r"[\s.]", "", rut or "").upper()
+    if rut and "-" not in rut and len(rut) > 1:
+        rut = f"{rut[:-1]}-{rut[-1]}"
+    return rut
+
+def es_hash(valor: str) -> bool:
+    return bool(valor) and HASH_BCRYPT.match(valor) is not None
+
+def _bytes(contrasena: str) -> bytes:
+    return contrasena.encode("utf-8")[:BCRYPT_MAX_BYTES]
+
+def _hash(contrasena: str) -> str:
+    return bcrypt.hashpw(_bytes(contrasena), bcrypt.gensalt(rounds=AUTH_BCRYPT_ROUNDS)).decode()
+
+def _verificar_hash(contrasena: str, almacenada: str) -> bool:
+    try:
+        return bcrypt.checkpw(_bytes(contrasena), almacenada.encode())
+    except ValueError:
+        return False
+
+class VerificadorContrasenas:
+    """Verifica y genera hashes bcrypt en un pool de hilos acotado"""
+
+    def __init__(self, workers: int = AUTH_HASH_WORKERS, max_en_cola: int = AUTH_HASH_MAX_EN_COLA):
+        self.workers = workers
+        self.max_en_cola = max_en_cola
+        self._pool = None
+        self.pendientes = 0
+        self.verificaciones = 0
+        self.fallidas = 0
+        self.texto_plano = 0
+        self.rehash = 0
+        self.rechazadas = 0
+        self._verificacion_total_ms = 0.0
+        self._hash_ficticio = None
+
+    def _ejecutor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._pool
+
+    async def _ejecutar(self, funcion, *args):
+        """Ejecuta la función en el pool o rechaza si ya hay demasiadas en espera"""
+        if self.pendientes >= self.workers + self.max_en_cola:
+            self.rechazadas += 1
+            raise AutenticacionSaturadaError()
+        self.pendientes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._ejecutor(), funcion, *args)
+        finally:
+            self.pendientes -= 1
+
+    async def hash(self, contrasena: str) -> str:
+        return await self._ejecutar(_hash, contrasena)
+
+    def requiere_rehash(self, almacenada: str) -> bool:
+        """True si la contraseña guardada no es un hash bcrypt con el costo configurado"""
+        coincidencia = HASH_BCRYPT.match(almacenada or "")
+        return coincidencia is None or int(coincidencia.group(1)) != AUTH_BCRYPT_ROUNDS
+
+    async def verificar(self, contrasena: str, almacenada: str) -> tuple:
+        """
+        Retorna (válida, hash nuevo). El hash nuevo es None salvo que la contraseña
+        sea válida y la guardada deba migrarse (texto plano o costo distinto).
+        """
+        inicio = time.perf_counter()
+        if es_hash(almacenada):
+            valida = await self._ejecutar(_verificar_hash, contrasena, almacenada)
+        else:
+            # Contraseña heredada en texto plano: comparación en tiempo constante
+            self.texto_plano += 1
+            valida = hmac.compare_digest(contrasena.encode(), (almacenada or "").encode())
+        self.verificaciones += 1
+        self._verificacion_total_ms += (time.perf_counter() - inicio) * 1000
+        if not valida:
+            self.fallidas += 1
+            return False, None
+        if AUTH_REHASH_ENABLED and self.requiere_rehash(almacenada):
+            try:
+                nuevo = await self.hash(contrasena)
+            except AutenticacionSaturadaError:
+                # La migración puede esperar al próximo inicio de sesión
+                return True, None
+            self.rehash += 1
+            return True, nuevo
+        return True, None
+
+    async def verificar_inexistente(self, contrasena: str) -> bool:
+        """
+        Verificación para un usuario que no existe: bcrypt contra un hash ficticio
+        con el mismo costo, para que el rechazo tarde lo mismo que con un usuario
+        registrado. Siempre retorna False.
+        """
+        if self._hash_ficticio is None:
+            # La primera vez se genera el hash ficticio (cuesta lo mismo que verificarlo)
+            inicio = time.perf_counter()
+            self._hash_ficticio = await self.hash(secrets.token_urlsafe(16))
+            self._verificacion_total_ms += (time.perf_counter() - inicio) * 1000
+            self.verificaciones += 1
+            self.fallidas += 1
+            return False
+        await self.verificar(contrasena, self._hash_ficticio)
+        return False
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def estadisticas(self) -> dict:
+        return {
+            "bcrypt_rounds": AUTH_BCRYPT_ROUNDS,
+            "workers": self.workers,
+            "max_en_cola": self.max_en_cola,
+            "pendientes": self.pendientes,
+            "verificaciones": self.verificaciones,
+            "fallidas": self.fallidas,
+            "texto_plano": self.texto_plano,
+            "rehash": self.rehash,
+            "rechazadas": self.rechazadas,
+            "verificacion_promedio_ms": round(self._verificacion_total_ms / self.verificaciones, 1) if self.verificaciones else 0.0,
+        }
+
+# Instancia única para toda la aplicación
+verificador_contrasenas = VerificadorContrasenas()
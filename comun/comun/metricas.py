@@ -0,0 +1,322 @@
+# Métricas de rendimiento en formato Prometheus (GET /metrics)
+# Módulo del paquete comun que usan el backend y las APIs de las agencias. No
+# depende de prometheus_client: las métricas se guardan en memoria y se escriben
+# en el formato de texto de Prometheus (0.0.4) al consultar /metrics.
+#
+# - MetricasMiddleware (ASGI): por cada solicitud registra la latencia por ruta
+#   (plantilla de la ruta, ej: /consultar_patente/{ppu}, para no crear una serie
+#   por patente), las solicitudes en curso y los códigos de estado.
+# - instrumentar_engine(engine): duración de cada consulta SQL, consultas y tiempo
+#   de base de datos por solicitud, y conexiones del pool en uso y en overflow.
+# - registrar_llamada_saliente(destino, status, segundos): latencia de las
+#   llamadas a otros servicios (en el backend, las llamadas a cada agencia).
+#
+# El costo por solicitud es de unos pocos microsegundos (un contador por bucket,
+# sin locks en el camino de la solicitud). Para medirlo:
+#     python -m comun.metricas
+
+import os
+import time
+import bisect
+import contextvars
+from typing import Callable
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+METRICAS_ENABLED = os.getenv("METRICAS_ENABLED", "true").lower() == "true"
+METRICAS_RUTA = os.getenv("METRICAS_RUTA", "/metrics")
+
+# Límites de los buckets (segundos o cantidad de consultas)
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTA_SQL = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+BUCKETS_CONSULTAS_POR_SOLICITUD = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# ============================================================
+# TIPOS DE MÉTRICAS
+# ============================================================
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _formatear_etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+def _formatear_valor(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+class Contador:
+    """Valor que solo aumenta (ej: solicitudes por código de estado)"""
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self._valores = {}
+
+    def inc(self, *valores, cantidad: float = 1):
+        # Las sumas sobre un dict se hacen con el GIL tomado; en el peor caso con
+        # hilos se pierde un incremento, lo que es aceptable para métricas
+        self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def muestras(self):
+        for valores, valor in list(self._valores.items()):
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, valores)} {_formatear_valor(valor)}"
+
+class Indicador(Contador):
+    """Valor que sube y baja (ej: solicitudes en curso)"""
+    tipo = "gauge"
+
+    def dec(self, *valores, cantidad: float = 1):
+        self.inc(*valores, cantidad=-cantidad)
+
+    def fijar(self, *valores, valor: float):
+        self._valores[valores] = valor
+
+class IndicadorCalculado:
+    """Indicador cuyo valor se obtiene al consultar /metrics (ej: conexiones del pool en uso)"""
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self._funciones = {}
+
+    def fijar_funcion(self, *valores, funcion: Callable[[], float]):
+        self._funciones[valores] = funcion
+
+    def muestras(self):
+        for valores, funcion in list(self._funciones.items()):
+            try:
+                valor = funcion()
+            except Exception:
+                continue
+            yield f"{self.nombre}{_formatear_etiquetas(self.etiquetas, valores)} {_formatear_valor(valor)}"
+
+class Histograma:
+    """Distribución de valores en buckets acumulativos (ej: latencia por ruta)"""
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_LATENCIA):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # valores de etiquetas -> [conteo por bucket..., +Inf, suma]
+
+    def observar(self, *valores, valor: float):
+        serie = self._series.get(valores)
+        if serie is None:
+            serie = self._series.setdefault(valores, [0] * (len(self.buckets) + 1) + [0.0])
+        # Se cuenta solo en el bucket que corresponde; los acumulados se calculan al exponer
+        serie[bisect.bisect_left(self.buckets, valor)] += 1
+        serie[-1] += valor
+
+    def muestras(self):
+        for valores, serie in list(self._series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ("+Inf",), serie[:-1]):
+                acumulado += conteo
+                le = 'le="%s"' % (limite if limite == "+Inf" else _formatear_valor(limite))
+                yield f"{self.nombre}_bucket{_formatear_etiquetas(self.etiquetas, valores, le)} {acumulado}"
+            yield f"{self.nombre}_sum{_formatear_etiquetas(self.etiquetas, valores)} {_formatear_valor(serie[-1])}"
+            yield f"{self.nombre}_count{_formatear_etiquetas(self.etiquetas, valores)} {acumulado}"
+
+class RegistroMetricas:
+    """Conjunto de métricas del proceso y su exposición en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metricas = {}
+
+    def registrar(self, metrica):
+        return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self._metricas.values():
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.muestras())
+        return "\n".join(lineas) + "\n"
+
+# Instancia única para toda la aplicación
+registro_metricas = RegistroMetricas()
+
+# ============================================================
+# MÉTRICAS DEL SERVICIO
+# ============================================================
+solicitudes_duracion = registro_metricas.registrar(Histograma(
+    "http_request_duration_seconds", "Latencia de las solicitudes HTTP por ruta", ("method", "route")))
+solicitudes_total = registro_metricas.registrar(Contador(
+    "http_requests_total", "Solicitudes HTTP por ruta y código de estado", ("method", "route", "status")))
+solicitudes_en_curso = registro_metricas.registrar(Indicador(
+    "http_requests_in_flight", "Solicitudes HTTP en curso", ("method",)))
+llamadas_salientes_duracion = registro_metricas.registrar(Histograma(
+    "http_client_request_duration_seconds", "Latencia de las llamadas a otros servicios", ("destino", "status")))
+consultas_sql_duracion = registro_metricas.registrar(Histograma(
+    "db_query_duration_seconds", "Duración de cada consulta SQL", ("engine",), BUCKETS_CONSULTA_SQL))
+consultas_por_solicitud = registro_metricas.registrar(Histograma(
+    "db_queries_per_request", "Consultas SQL ejecutadas por solicitud", ("route",), BUCKETS_CONSULTAS_POR_SOLICITUD))
+tiempo_db_por_solicitud = registro_metricas.registrar(Histograma(
+    "db_time_per_request_seconds", "Tiempo total en consultas SQL por solicitud", ("route",), BUCKETS_CONSULTA_SQL))
+pool_en_uso = registro_metricas.registrar(IndicadorCalculado(
+    "db_pool_checked_out_connections", "Conexiones del pool entregadas a una sesión", ("engine",)))
+pool_overflow = registro_metricas.registrar(IndicadorCalculado(
+    "db_pool_overflow_connections", "Conexiones abiertas sobre el tamaño del pool", ("engine",)))
+pool_tamano = registro_metricas.registrar(IndicadorCalculado(
+    "db_pool_size_connections", "Tamaño configurado del pool", ("engine",)))
+
+def registrar_llamada_saliente(destino: str, status, segundos: float):
+    """Registra una llamada a otro servicio (status: código HTTP o nombre del error)"""
+    clase = status if isinstance(status, str) else f"{status // 100}xx"
+    llamadas_salientes_duracion.observar(destino, clase, valor=segundos)
+
+# ============================================================
+# CONSULTAS SQL
+# ============================================================
+# Consultas y tiempo de base de datos de la solicitud en curso. El middleware
+# crea el acumulador y los endpoints síncronos lo ven porque el threadpool copia
+# el contexto de la solicitud.
+_consultas_solicitud = contextvars.ContextVar("consultas_solicitud", default=None)
+_engines_instrumentados = set()
+
+def instrumentar_engine(engine, nombre: str = "principal"):
+    """Registra la duración de las consultas del engine y expone el uso de su pool"""
+    from sqlalchemy import event
+
+    # Un mismo engine puede aparecer con dos nombres (ej: en SQLite el analítico es el principal)
+    if not METRICAS_ENABLED or id(engine) in _engines_instrumentados:
+        return
+    _engines_instrumentados.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get("metricas_inicio")
+        if not inicios:
+            return
+        duracion = time.perf_counter() - inicios.pop()
+        consultas_sql_duracion.observar(nombre, valor=duracion)
+        acumulado = _consultas_solicitud.get()
+        if acumulado is not None:
+            acumulado[0] += 1
+            acumulado[1] += duracion
+
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto):
+        conexion = contexto.connection
+        if conexion is not None and conexion.info.get("metricas_inicio"):
+            conexion.info["metricas_inicio"].pop()
+
+    pool = engine.pool
+    if callable(getattr(pool, "checkedout", None)):   # Pools sin límite (ej: SQLite en memoria) no tienen estos valores
+        pool_en_uso.fijar_funcion(nombre, funcion=pool.checkedout)
+        pool_tamano.fijar_funcion(nombre, funcion=pool.size)
+        # overflow() es negativo mientras el pool no ha abierto todas sus conexiones
+        pool_overflow.fijar_funcion(nombre, funcion=lambda: max(0, pool.overflow()))
+
+# ============================================================
+# MIDDLEWARE
+# ============================================================
+def _ruta(scope) -> str:
+    """Plantilla de la ruta atendida (las rutas inexistentes se agrupan en sin_ruta)"""
+    ruta = getattr(scope.get("route"), "path", None)
+    if ruta:
+        return ruta
+    if "endpoint" in scope:
+        # Rutas sin parámetros que no son de la API (ej: /docs, /openapi.json)
+        ruta = scope["path"]
+        root_path = scope.get("root_path", "")
+        return ruta[len(root_path):] if root_path and ruta.startswith(root_path) else ruta
+    return "sin_ruta"
+
+class MetricasMiddleware:
+    """Middleware ASGI que mide cada solicitud HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not METRICAS_ENABLED or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        metodo = scope["method"]
+        estado = [500]   # Si la app falla sin responder, se cuenta como 500
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+            await send(mensaje)
+
+        acumulado = [0, 0.0]
+        token = _consultas_solicitud.set(acumulado)
+        solicitudes_en_curso.inc(metodo)
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            solicitudes_en_curso.dec(metodo)
+            _consultas_solicitud.reset(token)
+            ruta = _ruta(scope)
+            if ruta != METRICAS_RUTA:
+                solicitudes_duracion.observar(metodo, ruta, valor=duracion)
+                solicitudes_total.inc(metodo, ruta, estado[0])
+                if acumulado[0]:
+                    consultas_por_solicitud.observar(ruta, valor=acumulado[0])
+                    tiempo_db_por_solicitud.observar(ruta, valor=acumulado[1])
+
+def instalar_metricas(app, engines: dict = None):
+    """Agrega el middleware, instrumenta los engines (nombre -> engine) y publica GET /metrics"""
+    from fastapi.responses import PlainTextResponse
+
+    if not METRICAS_ENABLED:
+        return
+    for nombre, engine in (engines or {}).items():
+        instrumentar_engine(engine, nombre)
+    app.add_middleware(MetricasMiddleware)
+
+    @app.get(METRICAS_RUTA, include_in_schema=False)
+    async def metricas():
+        return PlainTextResponse(registro_metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ============================================================
+# MICROBENCHMARK DEL COSTO DEL MIDDLEWARE
+# ============================================================
+def _medir_sobrecosto(solicitudes: int = 50000):
+    import asyncio
+
+    class _Ruta:
+        path = "/consultar_patente/{ppu}"
+
+    async def app_minima(scope, receive, send):
+        scope["route"] = _Ruta
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def recibir():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def enviar(mensaje):
+        pass
+
+    async def medir(app) -> float:
+        inicio = time.perf_counter()
+        for _ in range(solicitudes):
+            await app({"type": "http", "method": "GET", "path": "/consultar_patente/AB1234"}, recibir, enviar)
+        return (time.perf_counter() - inicio) / solicitudes * 1e6
+
+    async def principal():
+        instrumentada = MetricasMiddleware(app_minima)
+        await medir(app_minima)
+        await medir(instrumentada)   # Calentamiento
+        base = min([await medir(app_minima) for _ in range(3)])
+        con_metricas = min([await medir(instrumentada) for _ in range(3)])
+        print(f"Sin métricas: {base:.2f} µs/solicitud")
+        print(f"Con métricas: {con_metricas:.2f} µs/solicitud")
+        print(f"Sobrecosto:   {con_metricas - base:.2f} µs/solicitud")
+
+    asyncio.run(principal())
+
+if __name__ == "__main__":
+    _medir_sobrecosto()
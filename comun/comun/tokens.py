@@ -0,0 +1,163 @@
+# Tokens de acceso (JWT) compartidos por las réplicas de un servicio
+# Antes cada proceso generaba su propia SECRET_KEY al iniciar, así que un token
+# solo era válido en la réplica (y el worker de uvicorn) que lo emitió. Aquí las
+# llaves de firma vienen de la configuración y cada token lleva en su cabecera el
+# identificador (kid) de la llave con que se firmó: cualquier réplica lo verifica
+# sin consultar la base de datos. Lo usan el backend, api-sgd y api-tgr.
+#
+# Llaves:
+# - JWT_KEYS="kid1:secreto1,kid2:secreto2": la primera firma los tokens nuevos y
+#   todas verifican. Para rotar se agrega la llave nueva al final, luego se pasa
+#   al inicio y, cuando expiran los tokens antiguos (ACCESS_TOKEN_EXPIRE_MINUTES),
+#   se elimina la anterior; cada paso es un despliegue normal sin cortar sesiones.
+# - JWT_SECRET: una sola llave (el kid se deriva del secreto).
+# - Sin configuración se genera una llave aleatoria por proceso (solo desarrollo).
+#
+# usuario_autenticado es una dependencia de FastAPI que valida el header
+# "Authorization: Bearer". Los tokens ya verificados quedan en una caché LRU
+# hasta su expiración, así las solicitudes repetidas no vuelven a verificar la firma.
+
+import os
+import time
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+ALGORITHM = "HS256"
+JWT_LEEWAY = int(os.getenv("JWT_LEEWAY", "30"))                        # Tolerancia de reloj entre réplicas (segundos)
+TOKENS_CACHE_MAX = int(os.getenv("TOKENS_CACHE_MAX", "10000"))         # Tokens verificados en caché
+
+def _kid(secreto: str) -> str:
+    return hashlib.sha256(secreto.encode()).hexdigest()[:8]
+
+def _cargar_llaves() -> OrderedDict:
+    """Llaves de firma en orden (la primera es la activa)"""
+    llaves = OrderedDict()
+    for entrada in filter(None, (e.strip() for e in os.getenv("JWT_KEYS", "").split(","))):
+        kid, separador, secreto = entrada.partition(":")
+        if not separador or not kid or not secreto:
+            raise ValueError("JWT_KEYS debe tener el formato kid:secreto[,kid:secreto...]")
+        llaves[kid] = secreto
+    if not llaves and os.getenv("JWT_SECRET"):
+        llaves[_kid(os.getenv("JWT_SECRET"))] = os.getenv("JWT_SECRET")
+    if not llaves:
+        logger.warning("JWT_KEYS/JWT_SECRET no configuradas: se usa una llave aleatoria y los tokens solo son válidos en este proceso")
+        secreto = secrets.token_urlsafe(32)
+        llaves[_kid(secreto)] = secreto
+    return llaves
+
+class GestorTokens:
+    """Emisión y verificación de tokens con llaves identificadas por kid y caché de tokens verificados"""
+
+    def __init__(self, llaves: OrderedDict = None, max_entradas: int = TOKENS_CACHE_MAX):
+        self.llaves = llaves if llaves is not None else _cargar_llaves()
+        self.kid_activo = next(iter(self.llaves))
+        self.max_entradas = max_entradas
+        self._verificados = OrderedDict()   # token -> (expiración, kid, payload)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.verificaciones = 0
+        self.invalidos = 0
+
+    def crear(self, data: dict, expires_delta: Optional[timedelta] = None) -> str:
+        to_encode = data.copy()
+        expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
+        to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+        return jwt.encode(to_encode, self.llaves[self.kid_activo], algorithm=ALGORITHM, headers={"kid": self.kid_activo})
+
+    def _desde_cache(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entrada = self._verificados.get(token)
+            if entrada is None:
+                return None
+            expiracion, kid, payload = entrada
+            # Un token deja de ser válido si expira o si su llave se retiró
+            if expiracion + JWT_LEEWAY <= time.time() or kid not in self.llaves:
+                del self._verificados[token]
+                return None
+            self._verificados.move_to_end(token)
+            self.aciertos += 1
+            return payload
+
+    def _guardar(self, token: str, kid: str, payload: dict):
+        with self._lock:
+            self._verificados[token] = (payload["exp"], kid, payload)
+            while len(self._verificados) > self.max_entradas:
+                self._verificados.popitem(last=False)
+
+    def verificar(self, token: str) -> dict:
+        """Retorna el payload del token o lanza JWTError"""
+        payload = self._desde_cache(token)
+        if payload is not None:
+            return payload
+        self.verificaciones += 1
+        try:
+            # Tokens sin kid (emitidos antes de las llaves configuradas) se prueban con la llave activa
+            kid = jwt.get_unverified_header(token).get("kid") or self.kid_activo
+            if kid not in self.llaves:
+                raise JWTError("Llave de firma desconocida")
+            payload = jwt.decode(token, self.llaves[kid], algorithms=[ALGORITHM], options={"leeway": JWT_LEEWAY})
+            if payload.get("sub") is None or payload.get("exp") is None:
+                raise JWTError("Token sin sujeto o sin expiración")
+        except JWTError:
+            self.invalidos += 1
+            raise
+        self._guardar(token, kid, payload)
+        return payload
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            consultas = self.aciertos + self.verificaciones
+            return {
+                "kid_activo": self.kid_activo,
+                "llaves": list(self.llaves),
+                "entradas_cache": len(self._verificados),
+                "max_entradas": self.max_entradas,
+                "aciertos": self.aciertos,
+                "verificaciones": self.verificaciones,
+                "invalidos": self.invalidos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+            }
+
+# Instancia única para toda la aplicación
+gestor_tokens = GestorTokens()
+
+# Función para crear el token JWT
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    return gestor_tokens.crear(data, expires_delta)
+
+# Función para verificar el token JWT
+def verify_token(token: str, credentials_exception):
+    try:
+        return gestor_tokens.verificar(token)["sub"]
+    except JWTError:
+        raise credentials_exception
+
+_bearer = HTTPBearer(auto_error=False)
+
+async def usuario_autenticado(credenciales: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> dict:
+    """Dependencia que exige un token válido y retorna su payload (sub = RUT del usuario)"""
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="Token inválido o expirado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    if credenciales is None:
+        raise credentials_exception
+    try:
+        return gestor_tokens.verificar(credenciales.credentials)
+    except JWTError:
+        raise credentials_exception
@@ -0,0 +1,481 @@
+# Trazas distribuidas entre el backend y las APIs de las agencias
+# Módulo del paquete comun que usan el backend y las APIs de las agencias.
+#
+# Cada solicitud que llega a un servicio abre un span de servidor. Si la solicitud
+# trae el header W3C "traceparent" (lo envía el backend en cada llamada a una
+# agencia) el span continúa esa traza; si no, se inicia una traza nueva. Dentro de
+# la solicitud se agregan spans hijos para:
+# - las consultas SQL (instrumentar_engine),
+# - las llamadas a otros servicios (span(...) + headers_propagacion(), usados por
+#   config.http_client en el backend).
+# El identificador de la traza se devuelve en el header X-Request-ID: con él se
+# reconstruye la cascada completa de la solicitud, con la duración de cada salto.
+#
+# Los spans terminados se encolan (sin bloquear la solicitud) y un hilo los exporta
+# en lotes:
+# - TRAZAS_EXPORTADOR=archivo: una línea JSON por span en TRAZAS_ARCHIVO.
+# - TRAZAS_EXPORTADOR=otlp: POST en formato OTLP/HTTP JSON a TRAZAS_OTLP_URL (un
+#   collector de OpenTelemetry o el recolector de este módulo).
+#
+# Línea de comandos (python -m comun.trazas):
+#     cascada <request_id> [archivos...]   Muestra la cascada de una solicitud
+#     recolector [--puerto 4318]           Recibe OTLP/HTTP JSON y lo escribe en TRAZAS_ARCHIVO
+
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import secrets
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# CONFIGURACIÓN
+# ============================================================
+TRAZAS_ENABLED = os.getenv("TRAZAS_ENABLED", "false").lower() == "true"
+TRAZAS_MUESTREO = float(os.getenv("TRAZAS_MUESTREO", "1.0"))              # Proporción de trazas nuevas que se registran
+TRAZAS_EXPORTADOR = os.getenv("TRAZAS_EXPORTADOR", "archivo").lower()      # archivo | otlp
+TRAZAS_ARCHIVO = os.getenv("TRAZAS_ARCHIVO", "trazas.jsonl")
+TRAZAS_OTLP_URL = os.getenv("TRAZAS_OTLP_URL", "http://localhost:4318/v1/traces")
+TRAZAS_MAX_EN_COLA = int(os.getenv("TRAZAS_MAX_EN_COLA", "10000"))        # Spans pendientes de exportar
+TRAZAS_LOTE = int(os.getenv("TRAZAS_LOTE", "512"))                         # Spans por escritura o envío
+TRAZAS_INTERVALO = float(os.getenv("TRAZAS_INTERVALO", "1"))               # Segundos máximos entre exportaciones
+TRAZAS_SQL_MAX = int(os.getenv("TRAZAS_SQL_MAX", "200"))                   # Caracteres de la sentencia SQL guardados
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# ============================================================
+# SPANS
+# ============================================================
+class Span:
+    """Operación con inicio y fin dentro de una traza"""
+    __slots__ = ("trace_id", "span_id", "parent_id", "servicio", "nombre", "tipo", "inicio", "fin", "atributos", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], servicio: str, nombre: str, tipo: str, atributos: dict):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.servicio = servicio
+        self.nombre = nombre
+        self.tipo = tipo                  # servidor | cliente | interno
+        self.inicio = time.time_ns()
+        self.fin = None
+        self.atributos = atributos
+        self.error = None
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def como_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "servicio": self.servicio,
+            "nombre": self.nombre,
+            "tipo": self.tipo,
+            "inicio_ns": self.inicio,
+            "duracion_ms": round((self.fin - self.inicio) / 1e6, 3),
+            "atributos": self.atributos,
+            "error": self.error,
+        }
+
+# Span en curso de la solicitud (los endpoints síncronos lo ven porque el threadpool copia el contexto)
+_span_actual = contextvars.ContextVar("span_actual", default=None)
+_servicio = {"nombre": os.getenv("TRAZAS_SERVICIO", "servicio")}
+
+def span_actual() -> Optional[Span]:
+    return _span_actual.get()
+
+def iniciar_span(nombre: str, tipo: str = "interno", padre: Span = None, **atributos):
+    """Abre un span hijo del span en curso. Retorna (span, token) o (None, None) si no hay traza"""
+    padre = padre or _span_actual.get()
+    if padre is None:
+        return None, None
+    nuevo = Span(padre.trace_id, padre.span_id, _servicio["nombre"], nombre, tipo, atributos)
+    return nuevo, _span_actual.set(nuevo)
+
+def terminar_span(nuevo: Optional[Span], token, error: str = None):
+    if nuevo is None:
+        return
+    nuevo.fin = time.time_ns()
+    if error:
+        nuevo.error = error
+    try:
+        _span_actual.reset(token)
+    except ValueError:
+        # El span se abrió en otro contexto (ej: otro hilo); el contexto de origen ya no está activo
+        pass
+    exportador_trazas.encolar(nuevo)
+
+@contextmanager
+def span(nombre: str, tipo: str = "interno", **atributos):
+    """Span hijo del span en curso (no hace nada si la solicitud no se está trazando)"""
+    nuevo, token = iniciar_span(nombre, tipo, **atributos)
+    error = None
+    try:
+        yield nuevo
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        terminar_span(nuevo, token, error)
+
+def headers_propagacion() -> dict:
+    """Header traceparent del span en curso, para continuar la traza en otro servicio"""
+    actual = _span_actual.get()
+    return {"traceparent": actual.traceparent()} if actual is not None else {}
+
+# ============================================================
+# EXPORTACIÓN
+# ============================================================
+def _otlp(spans: list) -> dict:
+    """Spans en formato OTLP/HTTP JSON, agrupados por servicio"""
+    def valor(v):
+        if isinstance(v, bool):
+            return {"boolValue": v}
+        if isinstance(v, int):
+            return {"intValue": str(v)}
+        if isinstance(v, float):
+            return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    tipos = {"interno": 1, "servidor": 2, "cliente": 3}
+    por_servicio = {}
+    for s in spans:
+        por_servicio.setdefault(s["servicio"], []).append({
+            "traceId": s["trace_id"],
+            "spanId": s["span_id"],
+            "parentSpanId": s["parent_id"] or "",
+            "name": s["nombre"],
+            "kind": tipos.get(s["tipo"], 1),
+            "startTimeUnixNano": str(s["inicio_ns"]),
+            "endTimeUnixNano": str(s["inicio_ns"] + int(s["duracion_ms"] * 1e6)),
+            "attributes": [{"key": k, "value": valor(v)} for k, v in s["atributos"].items()],
+            "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+        })
+    return {"resourceSpans": [
+        {
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": servicio}}]},
+            "scopeSpans": [{"scope": {"name": "trazas"}, "spans": lista}],
+        }
+        for servicio, lista in por_servicio.items()
+    ]}
+
+def _desde_otlp(cuerpo: dict) -> list:
+    """Convierte un envío OTLP/HTTP JSON a las líneas del archivo de trazas"""
+    tipos = {1: "interno", 2: "servidor", 3: "cliente"}
+    spans = []
+    for recurso in cuerpo.get("resourceSpans", []):
+        servicio = next((a["value"].get("stringValue") for a in recurso.get("resource", {}).get("attributes", [])
+                         if a.get("key") == "service.name"), "desconocido")
+        for alcance in recurso.get("scopeSpans", []):
+            for s in alcance.get("spans", []):
+                inicio, fin = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+                spans.append({
+                    "trace_id": s["traceId"],
+                    "span_id": s["spanId"],
+                    "parent_id": s.get("parentSpanId") or None,
+                    "servicio": servicio,
+                    "nombre": s.get("name", ""),
+                    "tipo": tipos.get(s.get("kind"), "interno"),
+                    "inicio_ns": inicio,
+                    "duracion_ms": round((fin - inicio) / 1e6, 3),
+                    "atributos": {a["key"]: next(iter(a["value"].values()), None) for a in s.get("attributes", [])},
+                    "error": s.get("status", {}).get("message") if s.get("status", {}).get("code") == 2 else None,
+                })
+    return spans
+
+def _escribir(archivo: str, spans: list):
+    with open(archivo, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(s, ensure_ascii=False) + "\n" for s in spans))
+
+class ExportadorTrazas:
+    """Cola acotada de spans terminados y un hilo que los exporta en lotes"""
+
+    def __init__(self, max_en_cola: int = TRAZAS_MAX_EN_COLA):
+        self._cola = queue.Queue(maxsize=max_en_cola)
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self.exportados = 0
+        self.descartados = 0
+        self.errores = 0
+
+    def encolar(self, terminado: Span):
+        if self._hilo is None:
+            self._iniciar()
+        try:
+            self._cola.put_nowait(terminado)
+        except queue.Full:
+            # Nunca se bloquea la solicitud por las trazas
+            self.descartados += 1
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._ejecutar, name="exportador-trazas", daemon=True)
+                self._hilo.start()
+                atexit.register(self.detener)
+
+    def _lote(self, espera: float) -> list:
+        lote = []
+        try:
+            lote.append(self._cola.get(timeout=espera))
+            while len(lote) < TRAZAS_LOTE:
+                lote.append(self._cola.get_nowait())
+        except queue.Empty:
+            pass
+        return lote
+
+    def _exportar(self, lote: list):
+        spans = [s.como_dict() for s in lote]
+        try:
+            if TRAZAS_EXPORTADOR == "otlp":
+                solicitud = urllib.request.Request(
+                    TRAZAS_OTLP_URL, data=json.dumps(_otlp(spans)).encode(),
+                    headers={"Content-Type": "application/json"}, method="POST",
+                )
+                urllib.request.urlopen(solicitud, timeout=5).close()
+            else:
+                _escribir(TRAZAS_ARCHIVO, spans)
+            self.exportados += len(spans)
+        except Exception as e:
+            self.errores += 1
+            self.descartados += len(spans)
+            logger.warning(f"No se pudieron exportar {len(spans)} spans: {e}")
+
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            lote = self._lote(TRAZAS_INTERVALO)
+            if lote:
+                self._exportar(lote)
+
+    def detener(self):
+        """Exporta los spans pendientes (se llama al detener la app)"""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout=TRAZAS_INTERVALO + 1)
+        self._hilo = None
+        while True:
+            lote = self._lote(0)
+            if not lote:
+                break
+            self._exportar(lote)
+        self._detener.clear()
+
+    def estadisticas(self) -> dict:
+        return {
+            "habilitadas": TRAZAS_ENABLED,
+            "servicio": _servicio["nombre"],
+            "muestreo": TRAZAS_MUESTREO,
+            "exportador": TRAZAS_EXPORTADOR,
+            "destino": TRAZAS_OTLP_URL if TRAZAS_EXPORTADOR == "otlp" else TRAZAS_ARCHIVO,
+            "en_cola": self._cola.qsize(),
+            "exportados": self.exportados,
+            "descartados": self.descartados,
+            "errores": self.errores,
+        }
+
+# Instancia única para toda la aplicación
+exportador_trazas = ExportadorTrazas()
+
+# ============================================================
+# INSTRUMENTACIÓN
+# ============================================================
+_engines_instrumentados = set()
+
+def instrumentar_engine(engine):
+    """Agrega un span por cada consulta SQL ejecutada dentro de una solicitud trazada"""
+    from sqlalchemy import event
+
+    if id(engine) in _engines_instrumentados:
+        return
+    _engines_instrumentados.add(id(engine))
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if _span_actual.get() is None:
+            return
+        operacion = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        conn.info.setdefault("trazas_spans", []).append(
+            iniciar_span(f"SQL {operacion}", "cliente", **{"db.statement": statement[:TRAZAS_SQL_MAX]}))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        pendientes = conn.info.get("trazas_spans")
+        if pendientes:
+            terminar_span(*pendientes.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(contexto):
+        conexion = contexto.connection
+        pendientes = conexion.info.get("trazas_spans") if conexion is not None else None
+        if pendientes:
+            terminar_span(*pendientes.pop(), error=type(contexto.original_exception).__name__)
+
+def _ruta(scope) -> str:
+    """Plantilla de la ruta atendida (o la ruta tal cual si el router no la asignó)"""
+    ruta = getattr(scope.get("route"), "path", None)
+    if ruta:
+        return ruta
+    ruta = scope["path"]
+    root_path = scope.get("root_path", "")
+    return ruta[len(root_path):] if root_path and ruta.startswith(root_path) else ruta
+
+class TrazasMiddleware:
+    """Middleware ASGI que abre el span de servidor de cada solicitud HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        padre = None
+        for nombre, valor in scope.get("headers", ()):
+            if nombre == b"traceparent":
+                padre = TRACEPARENT.match(valor.decode("latin-1").strip())
+                break
+        if padre is not None:
+            # Se continúa la traza del servicio que llama si él la está registrando
+            trace_id, parent_id, registrada = padre.group(1), padre.group(2), padre.group(3) == "01"
+        else:
+            trace_id, parent_id, registrada = secrets.token_hex(16), None, random.random() < TRAZAS_MUESTREO
+        if not registrada:
+            return await self.app(scope, receive, send)
+
+        raiz = Span(trace_id, parent_id, _servicio["nombre"], scope["method"], "servidor",
+                    {"http.method": scope["method"], "http.target": scope["path"]})
+        token = _span_actual.set(raiz)
+        estado = [500]
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado[0] = mensaje["status"]
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [(b"x-request-id", trace_id.encode())]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        except BaseException as e:
+            raiz.error = type(e).__name__
+            raise
+        finally:
+            _span_actual.reset(token)
+            raiz.nombre = f"{scope['method']} {_ruta(scope)}"
+            raiz.atributos["http.status_code"] = estado[0]
+            if estado[0] >= 500 and raiz.error is None:
+                raiz.error = f"HTTP {estado[0]}"
+            raiz.fin = time.time_ns()
+            exportador_trazas.encolar(raiz)
+
+def instalar_trazas(app, servicio: str, engines: list = ()):
+    """Agrega el middleware de trazas e instrumenta las consultas SQL de los engines"""
+    if not TRAZAS_ENABLED:
+        return
+    _servicio["nombre"] = os.getenv("TRAZAS_SERVICIO", servicio)
+    for engine in engines:
+        instrumentar_engine(engine)
+    app.add_middleware(TrazasMiddleware)
+
+# ============================================================
+# LÍNEA DE COMANDOS
+# ============================================================
+def _leer_spans(archivos: list, trace_id: str) -> list:
+    spans = []
+    for archivo in archivos:
+        if not os.path.exists(archivo):
+            # Un servicio que no recibió solicitudes aún no crea su archivo
+            continue
+        with open(archivo, encoding="utf-8") as f:
+            for linea in f:
+                if trace_id in linea:
+                    s = json.loads(linea)
+                    if s["trace_id"] == trace_id:
+                        spans.append(s)
+    return spans
+
+def cascada(trace_id: str, archivos: list, ancho: int = 40) -> str:
+    """Cascada de una solicitud: un span por línea, anidado por padre, con su barra de tiempo"""
+    spans = _leer_spans(archivos, trace_id)
+    if not spans:
+        return f"No se encontraron spans de la solicitud {trace_id}"
+    ids = {s["span_id"] for s in spans}
+    hijos = {}
+    for s in spans:
+        padre = s["parent_id"] if s["parent_id"] in ids else None
+        hijos.setdefault(padre, []).append(s)
+    for lista in hijos.values():
+        lista.sort(key=lambda s: s["inicio_ns"])
+    inicio = min(s["inicio_ns"] for s in spans)
+    fin = max(s["inicio_ns"] + s["duracion_ms"] * 1e6 for s in spans)
+    total_ms = max((fin - inicio) / 1e6, 0.001)
+
+    lineas = [f"Solicitud {trace_id}: {len(spans)} spans, {total_ms:.1f} ms", ""]
+
+    def agregar(s, nivel):
+        desde = int((s["inicio_ns"] - inicio) / 1e6 / total_ms * ancho)
+        largo = max(1, round(s["duracion_ms"] / total_ms * ancho))
+        barra = " " * desde + "█" * min(largo, ancho - desde)
+        nombre = ("  " * nivel + s["nombre"])[:48]
+        error = f"  [{s['error']}]" if s.get("error") else ""
+        lineas.append(f"{s['servicio'][:12]:<12} {nombre:<48} {s['duracion_ms']:>9.1f} ms |{barra:<{ancho}}|{error}")
+        for hijo in hijos.get(s["span_id"], []):
+            agregar(hijo, nivel + 1)
+
+    for raiz in hijos.get(None, []):
+        agregar(raiz, 0)
+    return "\n".join(lineas)
+
+def recolector(puerto: int):
+    """Recibe spans en OTLP/HTTP JSON (POST /v1/traces) y los agrega a TRAZAS_ARCHIVO"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                cuerpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                spans = _desde_otlp(cuerpo)
+            except (ValueError, KeyError, TypeError):
+                self.send_response(400)
+                self.end_headers()
+                return
+            with lock:
+                _escribir(TRAZAS_ARCHIVO, spans)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Recolector de trazas en el puerto {puerto}, escribiendo en {TRAZAS_ARCHIVO}")
+    ThreadingHTTPServer(("0.0.0.0", puerto), Manejador).serve_forever()
+
+def _principal(argumentos: list):
+    if len(argumentos) >= 2 and argumentos[0] == "cascada":
+        print(cascada(argumentos[1], argumentos[2:] or [TRAZAS_ARCHIVO]))
+    elif argumentos and argumentos[0] == "recolector":
+        puerto = int(argumentos[argumentos.index("--puerto") + 1]) if "--puerto" in argumentos else 4318
+        recolector(puerto)
+    else:
+        print("Uso: cascada <request_id> [archivos...] | recolector [--puerto 4318]")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    _principal(sys.argv[1:])
@@ -45,6 +45,13 @@ export default function Chatbot() {
   const [inputValue, setInputValue] = useState('');
   const [cargando, setCargando] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Identificador de la conversación para que el backend recuerde los mensajes anteriores
+  // (crypto.randomUUID solo existe en contextos seguros: HTTPS o localhost)
+  const sesionId = useRef<string>(
+    typeof crypto !== 'undefined' && crypto.randomUUID
+      ? crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+  );
 
   // Auto-scroll al último mensaje
   useEffect(() => {
@@ -98,6 +105,7 @@ export default function Chatbot() {
         body: JSON.stringify({
           mensaje: mensajeEnviado,
           contexto_adicional: contextoAdicional,
+          sesion_id: sesionId.current,
         }),
       });
 
@@ -9,7 +9,8 @@ CREATE TABLE IF NOT EXISTS sgd (
     rut VARCHAR(12) NOT NULL,
     contrasena VARCHAR(255) NOT NULL,
     nombre VARCHAR(100) NOT NULL,
-    email VARCHAR(100) NOT NULL UNIQUE
+    email VARCHAR(100) NOT NULL UNIQUE,
+    INDEX idx_sgd_rut (rut)
 );
 
 INSERT INTO sgd (rut, contrasena, nombre, email) VALUES
@@ -9,5 +9,6 @@ CREATE TABLE IF NOT EXISTS SGD (
     rut VARCHAR(12) NOT NULL,
     contrasena VARCHAR(255) NOT NULL,
     nombre VARCHAR(100) NOT NULL,
-    email VARCHAR(100) NOT NULL UNIQUE
+    email VARCHAR(100) NOT NULL UNIQUE,
+    INDEX idx_sgd_rut (rut)
 );
@@ -28,7 +28,8 @@ CREATE TABLE IF NOT EXISTS permiso_circulacion (
     ast INT NOT NULL,
     equipamiento VARCHAR(100) NOT NULL,
     codigo_sii VARCHAR(20) NOT NULL,
-    tasacion INT NOT NULL
+    tasacion INT NOT NULL,
+    INDEX idx_permiso_ppu_fecha (ppu, fecha_emision)
 );
 
 CREATE TABLE IF NOT EXISTS credenciales (
@@ -36,7 +37,8 @@ CREATE TABLE IF NOT EXISTS credenciales (
     rut VARCHAR(12) NOT NULL,
     nombre VARCHAR(100) NOT NULL,
     contrasena VARCHAR(255) NOT NULL,
-    rol VARCHAR(50) NOT NULL
+    rol VARCHAR(50) NOT NULL,
+    INDEX idx_credenciales_rut (rut)
 );
 
 -- Tabla para almacenar información de tarjetas de debito y credito de ejemplo
@@ -50,5 +52,6 @@ CREATE TABLE IF NOT EXISTS tarjetas (
     tipo_tarjeta VARCHAR(50) NOT NULL,
     banco VARCHAR(100) NOT NULL,
     cvv INT NOT NULL,
-    saldo DECIMAL(10, 2) NOT NULL
+    saldo DECIMAL(10, 2) NOT NULL,
+    INDEX idx_tarjetas_rut (rut)
 );
\ No newline at end of file
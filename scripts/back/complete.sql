@@ -12,7 +12,13 @@ CREATE TABLE IF NOT EXISTS log_fiscalizacion(
     vigencia_revision BOOLEAN NOT NULL,
     vigencia_soap BOOLEAN NOT NULL,
     encargo_robo BOOLEAN NOT NULL,
-    multas BOOLEAN NOT NULL
+    multas BOOLEAN NOT NULL,
+    id_cliente VARCHAR(36) NULL,
+    INDEX idx_log_fiscalizacion_fecha (fecha, vigencia_permiso, vigencia_revision, vigencia_soap, encargo_robo),
+    UNIQUE INDEX uq_log_fiscalizacion_id_cliente (id_cliente),
+    INDEX idx_log_fiscalizacion_fecha_id (fecha, id),
+    INDEX idx_log_fiscalizacion_ppu_fecha (ppu, fecha, id),
+    INDEX idx_log_fiscalizacion_fiscalizador_fecha (rut_fiscalizador, fecha, id)
 );
 
 -- Log consultas propietarios
@@ -20,7 +26,13 @@ CREATE TABLE IF NOT EXISTS log_consultas_propietarios (
     id INT AUTO_INCREMENT PRIMARY KEY,
     rut VARCHAR(12) NOT NULL,
     ppu VARCHAR(10) NOT NULL,
-    fecha DATETIME NOT NULL
+    fecha DATETIME NOT NULL,
+    id_cliente VARCHAR(36) NULL,
+    INDEX idx_log_consultas_fecha_rut (fecha, rut),
+    UNIQUE INDEX uq_log_consultas_id_cliente (id_cliente),
+    INDEX idx_log_consultas_fecha_id (fecha, id),
+    INDEX idx_log_consultas_rut_fecha (rut, fecha, id),
+    INDEX idx_log_consultas_ppu_fecha (ppu, fecha, id)
 );
 
 -- Permiso de circulación
@@ -48,7 +60,11 @@ CREATE TABLE IF NOT EXISTS permiso_circulacion (
     ast INT NOT NULL,
     equipamiento VARCHAR(100) NOT NULL,
     codigo_sii VARCHAR(20) NOT NULL,
-    tasacion INT NOT NULL
+    tasacion INT NOT NULL,
+    INDEX idx_permiso_fecha_emision_valor (fecha_emision, valor_permiso),
+    INDEX idx_permiso_ppu_rut (ppu, rut),
+    INDEX idx_permiso_rut (rut),
+    INDEX idx_permiso_fecha_emision_id (fecha_emision, id)
 );
 
 -- Usuarios administradores
@@ -82,6 +98,39 @@ CREATE TABLE IF NOT EXISTS mis_permisos_emitidos (
     cuota_pagada INT NOT NULL
 );
 
+-- Rollups del panel de decisiones (contadores por período: DIA, MES, AÑO)
+CREATE TABLE IF NOT EXISTS rollup_fiscalizacion (
+    tipo_periodo VARCHAR(4) NOT NULL,
+    periodo VARCHAR(10) NOT NULL,
+    total INT NOT NULL DEFAULT 0,
+    al_dia INT NOT NULL DEFAULT 0,
+    con_problemas INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tipo_periodo, periodo)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_consultas (
+    tipo_periodo VARCHAR(4) NOT NULL,
+    periodo VARCHAR(10) NOT NULL,
+    consultas INT NOT NULL DEFAULT 0,
+    usuarios_unicos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tipo_periodo, periodo)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_consultas_rut (
+    tipo_periodo VARCHAR(4) NOT NULL,
+    periodo VARCHAR(10) NOT NULL,
+    rut VARCHAR(12) NOT NULL,
+    PRIMARY KEY (tipo_periodo, periodo, rut)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_permisos (
+    tipo_periodo VARCHAR(4) NOT NULL,
+    periodo VARCHAR(10) NOT NULL,
+    total INT NOT NULL DEFAULT 0,
+    recaudacion BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tipo_periodo, periodo)
+);
+
 USE back_db;
 
 INSERT INTO usuarios_admin (rut, nombre, email, password) VALUES